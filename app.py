@@ -2,19 +2,35 @@
 Main module of the server file
 """
 
+# Imported first, to time the whole startup
+import startup_timing
+
 # 3rd party moudles
-from flask import render_template
+from flask import Response, render_template
 
 # local modules
 import app_config
+import queries
+import request_metrics
+import prefork
+import request_validation
+import slow_query_log
+import spec_cache
+
+startup_timing.mark("imports")
 
 
 # Get the application instance
 connex_app = app_config.connex_app
 
-# Read the swagger.yml file to configure the endpoints
-connex_app.add_api("swagger.yaml", strict_validation=True,
-                   pythonic_params=True)
+# Read the swagger.yml file to configure the endpoints, parsed & validated
+# once per version of the file, see spec_cache.py.
+# The request bodies are checked by validators compiled from their schemas
+spec = spec_cache.load_spec(connex_app, "swagger.yaml")
+startup_timing.mark("load_spec")
+spec_cache.add_api(connex_app, spec, strict_validation=True,
+                   pythonic_params=True, validator_map=request_validation.VALIDATOR_MAP)
+startup_timing.mark("add_api")
 
 
 # create a URL route in our application for "/"
@@ -29,5 +45,32 @@ def home():
     return render_template("home.html")
 
 
+# create a URL route in our application for "/metrics"
+@connex_app.route("/metrics")
+def metrics():
+    """
+    This function responds with the request metrics of every operation,
+    in the Prometheus text format, see request_metrics.py
+
+    :return:        the metrics as text
+    """
+    return Response(request_metrics.render(), content_type=request_metrics.CONTENT_TYPE)
+
+
+# Record the requests of every route above
+request_metrics.init_app(connex_app.app)
+slow_query_log.init_app(connex_app.app)
+startup_timing.mark("init_app")
+
+# Compile the hot lookups & open the pooled connections before the first request,
+# in each worker once forked when served by uWSGI or gunicorn, see prefork.py
+queries.warm_up(connex_app.app)
+prefork.init_app(connex_app.app)
+startup_timing.mark("warm_up")
+
+# Log the time of each phase above, & later of the first request
+startup_timing.init_app(connex_app.app)
+
+
 if __name__ == "__main__":
     connex_app.run(debug=True)
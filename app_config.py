@@ -1,7 +1,11 @@
 import connexion
+import sqlite3
 from pathlib import Path
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite.aiosqlite import AsyncAdapt_aiosqlite_connection
+from sqlalchemy.engine import Engine
 from flask_sqlalchemy import SQLAlchemy
-from flask_marshmallow import Marshmallow
+import config_profiles
 
 BASE_DIR = Path.cwd()
 
@@ -11,17 +15,36 @@ connex_app = connexion.App(__name__, specification_dir=BASE_DIR)
 # Get the underlying Flask app instance
 app = connex_app.app
 
-# Build the Sqlite URL for SqlAlchemy
-# Build the Sqlite URL for SqlAlchemy
-sqlite_url = "sqlite:///" + str(Path(BASE_DIR / "db/team_project_planner.db"))
+# Configure the app from the profile picked by PLANNER_PROFILE (dev, test or prod),
+# see config_profiles.py for the SqlAlchemy, SQLite, export & cache settings.
+# A DATABASE_URL in the environment, eg. of PostgreSQL, replaces the profile's SQLite DB
+PROFILE, profile_config = config_profiles.selected_profile()
+app.config.from_object(profile_config)
+app.config.update(config_profiles.database_settings(profile_config))
 
-# Configure the SqlAlchemy part of the app instance
-app.config["SQLALCHEMY_ECHO"] = True
-app.config["SQLALCHEMY_DATABASE_URI"] = sqlite_url
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-# Create the SqlAlchemy db instance
-db = SQLAlchemy(app)
+# Apply the profile's PRAGMAs to every new SQLite connection, of sqlite3 or of aiosqlite in the async mode
+@event.listens_for(Engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, (sqlite3.Connection, AsyncAdapt_aiosqlite_connection)) \
+            and app.config["SQLITE_PRAGMAS"]:
+        cursor = dbapi_connection.cursor()
+        for name, value in app.config["SQLITE_PRAGMAS"].items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+"""
+The SqlAlchemy extension, whose engine runs on an async driver in the async serving mode,
+see async_serving.py.
+"""
+class PlannerSQLAlchemy(SQLAlchemy):
+    def create_engine(self, sa_url, engine_opts):
+        if app.config["SQLALCHEMY_ASYNC"]:
+            import async_serving
+            return async_serving.create_engine(sa_url, engine_opts)
+        return super().create_engine(sa_url, engine_opts)
 
-# Initialize Marshmallow
-ma = Marshmallow(app)
+
+# Create the SqlAlchemy db instance
+db = PlannerSQLAlchemy(app)
@@ -0,0 +1,15 @@
+"""
+The entry point of the async serving mode, see async_serving.py:
+    $ uvicorn asgi:app
+
+The app is loaded at the startup of the server, on its event loop.
+"""
+
+import os
+
+# The prod config profile, unless PLANNER_PROFILE is set already
+os.environ.setdefault("PLANNER_PROFILE", "prod")
+
+import async_serving
+
+app = async_serving.ASGIApp("app:connex_app")
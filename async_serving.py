@@ -0,0 +1,189 @@
+"""
+The async serving mode: the app served by an ASGI server, on an async DB driver.
+
+    $ uvicorn asgi:app
+
+Each request is handled in a greenlet of its own, on the event loop of the
+server, by the same connexion & Flask app as the sync serving. Its DB engine
+runs on the async driver (aiosqlite): whenever a request waits on the DB,
+eg. for a write lock held by another request, its greenlet hands the loop
+back, and the other requests go on meanwhile. This is the bridge SQLAlchemy's
+AsyncSession itself is built on, so the resource functions & the queries are
+shared, unchanged, by both modes. The background exports of export_jobs.py
+run as tasks of the loop, rather than in a thread pool.
+
+A single process, on one thread, thus keeps many requests in flight: one
+slow export or a write waiting on SQLite's lock no longer holds up a worker.
+
+The sync serving, by uWSGI or gunicorn (see prefork.py), is unchanged.
+"""
+
+import asyncio
+import importlib
+import io
+import sys
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.util import await_only, greenlet_spawn
+from app_config import app, db
+
+# The async driver replacing the sync one, per database
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+}
+
+# The background tasks in progress, kept from being garbage collected before they end
+_tasks = set()
+
+
+"""
+A method to create the DB engine of the async mode, used by app_config.db.
+The engine runs on the async driver, behind the sync API of SQLAlchemy: it must
+be used from a greenlet run by greenlet_spawn, as the requests & background tasks are.
+:raises: ValueError for a database without an async driver here
+"""
+def create_engine(sa_url, engine_opts):
+    if sa_url.drivername not in ASYNC_DRIVERS:
+        raise ValueError(f'The async serving mode supports {", ".join(ASYNC_DRIVERS)}, '
+                         f'not {sa_url.drivername}.')
+    options = dict(engine_opts)
+    # The async drivers need a pool whose waits hand the event loop back
+    if options.get("poolclass") is QueuePool:
+        options["poolclass"] = AsyncAdaptedQueuePool
+    return create_async_engine(sa_url.set(drivername=ASYNC_DRIVERS[sa_url.drivername]), **options).sync_engine
+
+
+"""
+A method to tell whether the caller runs on the event loop of the async mode.
+"""
+def in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+"""
+A method to run `function(*args)` in the background, as a task of the event loop.
+Note: Call it on the event loop, see in_event_loop.
+"""
+def start_task(function, *args):
+    task = asyncio.get_running_loop().create_task(greenlet_spawn(function, *args))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+"""
+A helper method to build the WSGI environ of an ASGI HTTP request.
+"""
+def wsgi_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f'HTTP/{scope["http_version"]}',
+        "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name, value = name.decode("latin-1").upper().replace("-", "_"), value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    return environ
+
+
+"""
+An ASGI app serving a WSGI app in the async mode.
+The WSGI app is loaded at the startup of the server, on its event loop, from
+`target` given as "module:attribute".
+"""
+class ASGIApp:
+    def __init__(self, target):
+        self.target = target
+        self.wsgi_app = None
+
+    """
+    A helper method to import the WSGI app, in a greenlet since its startup uses the DB.
+    """
+    async def load(self):
+        if self.wsgi_app is None:
+            app.config["SQLALCHEMY_ASYNC"] = True
+            module_name, _, attribute = self.target.partition(":")
+            module = await greenlet_spawn(importlib.import_module, module_name)
+            self.wsgi_app = getattr(module, attribute)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.load()
+            body = bytearray()
+            while True:
+                message = await receive()
+                body += message.get("body", b"")
+                if not message.get("more_body"):
+                    break
+            await greenlet_spawn(self.handle, wsgi_environ(scope, bytes(body)), send)
+
+    """
+    A helper method to load the WSGI app at the startup, & close the DB connections
+    at the shutdown: the threads of aiosqlite would keep the process alive.
+    """
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.load()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    raise
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.gather(*_tasks, return_exceptions=True)
+                with app.app_context():
+                    await greenlet_spawn(db.engine.dispose)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    """
+    A helper method to run the WSGI app for a request, in a greenlet, & send its response.
+    """
+    def handle(self, environ, send):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                   for name, value in headers]
+            return lambda data: send_body(data)
+
+        def send_body(data):
+            if "sent" not in response:
+                response["sent"] = True
+                await_only(send({"type": "http.response.start", "status": response["status"],
+                                 "headers": response["headers"]}))
+            if data:
+                await_only(send({"type": "http.response.body", "body": data, "more_body": True}))
+
+        chunks = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in chunks:
+                send_body(chunk)
+            send_body(b"")
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+        await_only(send({"type": "http.response.body", "body": b""}))
@@ -0,0 +1,132 @@
+"""
+Benchmark of the sync & async serving modes, at equal memory, under lock-contended writes.
+
+A scratch SQLite DB is seeded with a synthetic dataset, then served by the
+sync mode (uWSGI or gunicorn, `--threads` per worker) & by the async mode
+(uvicorn, see async_serving.py), each with `--workers` processes, so both
+hold about the same memory: it is measured & reported along. Each one gets
+`--concurrency` client threads, half of them reading (`--read`), half of them
+writing (`--write`), while the benchmark itself holds SQLite's write lock
+for `--hold-ms` out of every `--period-ms`, as a batch job or a slow export
+of another process would.
+
+A sync worker has a thread per request in flight: once its threads all wait
+on the lock, its reads wait too. The async mode keeps reading meanwhile.
+Reported per mode: the throughput & the p95 latency of the reads & of the
+writes, the statuses, and the memory of the server's processes (RSS & PSS,
+read from /proc, on Linux).
+
+Usage (from the project root):
+    $ python -m benchmarks.concurrency [--sync-server gunicorn] [--workers 1] [--threads 2] [--concurrency 32]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+
+from benchmarks.harness import scratch_app
+from benchmarks import scaling, suite
+
+
+"""
+A helper method to hold the write lock of a SQLite DB, `hold_ms` out of every `period_ms`, until `stop` is set.
+"""
+def hold_write_lock(db_file, hold_ms, period_ms, stop):
+    connection = sqlite3.connect(db_file, timeout=30, isolation_level=None)
+    try:
+        while not stop.is_set():
+            connection.execute("BEGIN IMMEDIATE")
+            time.sleep(hold_ms / 1000)
+            connection.execute("ROLLBACK")
+            stop.wait(max(period_ms - hold_ms, 0) / 1000)
+    finally:
+        connection.close()
+
+
+"""
+A helper method to benchmark one server.
+:return: The measures of the reads & the writes, & the memory of the server
+"""
+def run_server(server, work_dir, database_url, fx, args):
+    process, port = suite.start_server(server, work_dir, database_url, args.workers, args.threads)
+    stop = threading.Event()
+    try:
+        transport = suite.HttpTransport(port)
+        transport.request("get", "/api/user/list_users?limit=1", None)      # Warms up a worker
+        holder = threading.Thread(target=hold_write_lock,
+                                  args=(make_url(database_url).database, args.hold_ms, args.period_ms, stop))
+        holder.start()
+        results = {}
+
+        def measure(operation_id):
+            results[operation_id] = suite.measure_operation(operation_id, transport, fx, args.requests,
+                                                            max(args.concurrency // 2, 1), None)
+
+        clients = [threading.Thread(target=measure, args=(operation_id,)) for operation_id in (args.read, args.write)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        used = scaling.memory(scaling.process_tree(process.pid))
+    finally:
+        stop.set()
+        process.terminate()
+        process.wait(timeout=30)
+    return results, used
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="The sync & async serving modes at equal memory, "
+                                                 "under lock-contended writes.")
+    parser.add_argument("--sync-server", choices=("uwsgi", "gunicorn"), default="uwsgi", help="the sync server")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes of either server")
+    parser.add_argument("--threads", type=int, default=2, help="threads per worker of the sync server")
+    parser.add_argument("--concurrency", type=int, default=32, help="client threads, half reading, half writing")
+    parser.add_argument("--requests", type=int, default=500, help="requests of the reads, & of the writes")
+    parser.add_argument("--read", choices=list(suite.REQUESTS), default="describe_team", help="the read operation")
+    parser.add_argument("--write", choices=list(suite.REQUESTS), default="update_task_status",
+                        help="the write operation")
+    parser.add_argument("--hold-ms", type=int, default=100, help="ms the write lock is held, 0 for never")
+    parser.add_argument("--period-ms", type=int, default=500, help="ms between two holds of the write lock")
+    parser.add_argument("--scale", choices=[scale for scale in suite.SCALES if scale != "sample"], default="small",
+                        help="the synthetic dataset")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the dataset & the requests")
+    args = parser.parse_args(argv)
+    if os.environ.get("DATABASE_URL"):
+        parser.error("The async mode serves SQLite only, unset DATABASE_URL.")
+
+    # The prod profile, unless PLANNER_PROFILE is set already, as with the servers
+    os.environ.setdefault("PLANNER_PROFILE", "prod")
+    flask_app, work_dir = scratch_app(seed=False)
+    from app_config import db
+    with flask_app.app_context():
+        import db_initializer
+        import synthetic_data
+        dataset = synthetic_data.SyntheticDataset(seed=args.seed, **suite.SCALES[args.scale])
+        db_initializer.bulk_load(dataset.tables())
+        fx = suite.Fixtures(0, args.seed)
+        database_url = str(db.engine.url)
+        db.session.remove()
+        db.engine.dispose()
+
+    print(f'{args.workers} worker(s), {args.concurrency} clients, the write lock held '
+          f'{args.hold_ms} ms every {args.period_ms} ms\n')
+    print(f'{"server":<22} {"operation":<20} {"req/s":>8} {"p95 ms":>9} {"RSS MB":>8} {"PSS MB":>8}  statuses')
+    for server, label in ((args.sync_server, f'{args.sync_server} ({args.threads} threads)'),
+                          ("uvicorn", "uvicorn (async)")):
+        results, used = run_server(server, work_dir, database_url, fx, args)
+        for operation_id in (args.read, args.write):
+            result = results[operation_id]
+            print(f'{label:<22} {operation_id:<20} {result["throughput"]:>8.1f} {result["p95_ms"]:>9.2f} '
+                  f'{used["rss_mb"] if used else "-":>8} {used["pss_mb"] if used else "-":>8}  '
+                  + " ".join(f'{status}x{count}' for status, count in sorted(result["statuses"].items())))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
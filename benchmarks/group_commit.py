@@ -0,0 +1,83 @@
+"""
+Benchmark of the group commit of the task status updates (see write_coalescer.py).
+
+A scratch DB is seeded with a synthetic dataset, then `update_task_status` is
+called `--requests` times from `--concurrency` client threads, in-process
+through the Flask test client, as by the threads of a server worker. The
+run is repeated without coalescing, then with each window of `--windows`
+(in ms, "off" for none) & the max batch size `--max-batch`.
+
+Reported per setting: the throughput, the p50 & p95 latency, the statuses,
+the commits made & the mean updates per commit. The board status counters
+are checked against the tasks after each run, a mismatch failing the run.
+
+Usage (from the project root):
+    $ python -m benchmarks.group_commit [--concurrency 16] [--windows off,0,1,5] [--max-batch 64]
+"""
+
+import argparse
+import os
+import sys
+
+from benchmarks.harness import scratch_app
+from benchmarks import suite
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput & latency of update_task_status, "
+                                                 "with & without the group commit.")
+    parser.add_argument("--windows", default="off,0,1,5", help='comma separated windows in ms, "off" for none')
+    parser.add_argument("--max-batch", type=int, default=64, help="most updates per commit")
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads")
+    parser.add_argument("--requests", type=int, default=2000, help="updates per setting")
+    parser.add_argument("--scale", choices=[scale for scale in suite.SCALES if scale != "sample"], default="small",
+                        help="the synthetic dataset")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the dataset & the requests")
+    args = parser.parse_args(argv)
+
+    # The prod profile, unless PLANNER_PROFILE is set already, as with the servers
+    os.environ.setdefault("PLANNER_PROFILE", "prod")
+    flask_app, work_dir = scratch_app(seed=False)
+    from app_config import db
+    from resources import project_board_resource
+    with flask_app.app_context():
+        import db_initializer
+        import synthetic_data
+        dataset = synthetic_data.SyntheticDataset(seed=args.seed, **suite.SCALES[args.scale])
+        db_initializer.bulk_load(dataset.tables())
+        fx = suite.Fixtures(0, args.seed)
+        db.session.remove()
+
+    transport = suite.InProcessTransport(flask_app)
+    coalescer = project_board_resource.task_status_writes
+    failed = False
+    print(f'{args.concurrency} clients, {args.requests} updates, max batch {args.max_batch}\n')
+    print(f'{"window ms":>9} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"commits":>8} {"per commit":>11}  statuses')
+    for window in args.windows.split(","):
+        flask_app.config["TASK_STATUS_COALESCE_WINDOW_MS"] = None if window == "off" else float(window)
+        flask_app.config["TASK_STATUS_COALESCE_MAX_BATCH"] = args.max_batch
+        before = coalescer.stats()
+        result = suite.measure_operation("update_task_status", transport, fx, args.requests,
+                                         args.concurrency, None)
+        after = coalescer.stats()
+
+        if window == "off":
+            commits, per_commit = args.requests, 1.0
+        else:
+            commits = after["batches"] - before["batches"]
+            per_commit = (after["writes"] - before["writes"]) / max(commits, 1)
+        print(f'{window:>9} {result["throughput"]:>9.1f} {result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f} '
+              f'{commits:>8} {per_commit:>11.2f}  '
+              + " ".join(f'{status}x{count}' for status, count in sorted(result["statuses"].items())))
+
+        with flask_app.app_context():
+            mismatches = project_board_resource.rebuild_board_counters(rebuild=False)
+            db.session.remove()
+        if mismatches:
+            print(f'\tERROR: {len(mismatches)} board(s) with wrong status counters.')
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
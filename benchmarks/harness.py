@@ -0,0 +1,107 @@
+"""
+Shared helpers of the benchmark scripts: a scratch copy of the app
+seeded with the sample data, and a SQL statement counter.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from sqlalchemy import event
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+DATA_FILES = PROJECT_DIR / "data_files"
+
+
+"""
+A method to import the app against a scratch SQLite DB under `work_dir`,
+or against the DATABASE_URL if set, whose tables are then dropped first.
+The app is configured from `profile` (see config_profiles.py), else from
+PLANNER_PROFILE, with the statements echoed only if `echo` is set.
+The connexion app finds swagger.yaml from the current directory, so the app
+is imported from the project root; the scratch dir then becomes the current
+directory, for the out/ folder of the exports.
+
+:return: (flask app, work_dir)
+"""
+def scratch_app(work_dir=None, seed=True, profile=None, echo=False):
+    work_dir = Path(work_dir or tempfile.mkdtemp(prefix="planner_bench_"))
+    (work_dir / "db").mkdir(parents=True, exist_ok=True)
+    os.chdir(PROJECT_DIR)
+    if str(PROJECT_DIR) not in sys.path:
+        sys.path.insert(0, str(PROJECT_DIR))
+
+    if profile is not None:
+        os.environ["PLANNER_PROFILE"] = profile
+    import app_config
+    if not os.environ.get("DATABASE_URL"):
+        app_config.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + str(work_dir / "db" / "team_project_planner.db")
+    if not echo:
+        app_config.app.config["SQLALCHEMY_ECHO"] = False
+    # The files shared by the worker processes, eg. of the prod profile
+    app_config.app.config["ENTITY_CACHE_SHARED_FILE"] = str(work_dir / "db" / "entity_cache.versions")
+    app_config.app.config["METRICS_SHARED_FILE"] = str(work_dir / "db" / "request_metrics.bin")
+    app_config.app.config["SPEC_CACHE_DIR"] = str(work_dir / "db" / "spec_cache")
+    import app
+    import migrations
+    os.chdir(work_dir)
+
+    with app_config.app.app_context():
+        if os.environ.get("DATABASE_URL"):
+            app_config.db.drop_all()
+        migrations.upgrade()
+        if seed:
+            seed_sample_data()
+    return app.connex_app.app, work_dir
+
+
+"""
+A method to load data_files/*.json through the resource functions,
+in the same order as db_initializer.
+"""
+def seed_sample_data():
+    from resources import user_resource, team_resource, project_board_resource
+
+    def load(file_name):
+        with open(DATA_FILES / file_name) as json_file:
+            return json.load(json_file)
+
+    for user in load("users.json"):
+        user_resource.create_user(user)
+    for team in load("teams.json"):
+        team_resource.create_team(team)
+    for board in load("boards.json"):
+        project_board_resource.create_board(board)
+    for team_users in load("addUsers.json"):
+        team_resource.add_users_to_team(team_users)
+    for task in load("tasks.json"):
+        project_board_resource.add_task(task)
+
+
+"""
+A counter of the SQL statements the current thread sends to the engine.
+Statements of other threads, eg. background export jobs, are left out.
+"""
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+        self.thread_id = threading.get_ident()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self.thread_id:
+            self.count += 1
+            self.statements.append(statement)
+
+
+@contextmanager
+def count_statements(engine):
+    counter = StatementCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
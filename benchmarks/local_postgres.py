@@ -0,0 +1,90 @@
+"""
+A throwaway local PostgreSQL server, without Docker, to run the benchmark
+scripts against: a new cluster is created in a temporary directory, the
+command is run with DATABASE_URL pointing to it, then the server is stopped
+& its directory removed.
+
+The server binaries come from the `pgserver` package if installed
+(`pip install pgserver`), else `initdb` & `pg_ctl` must be on the PATH.
+
+Usage (from the project root):
+    $ python -m benchmarks.local_postgres -- python -m benchmarks.query_counts
+"""
+
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import pgserver
+except ImportError:     # The binaries on the PATH are used instead
+    pgserver = None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+"""
+A context manager running a PostgreSQL server on the binaries of the PATH.
+:return: The URL of its database
+"""
+@contextmanager
+def path_server(data_dir):
+    if shutil.which("initdb") is None or shutil.which("pg_ctl") is None:
+        raise RuntimeError("PostgreSQL not found: pip install pgserver, or put initdb & pg_ctl on the PATH.")
+    port = free_port()
+    subprocess.run(["initdb", "-D", data_dir, "-U", "postgres", "--auth=trust", "-E", "UTF8"],
+                   check=True, stdout=subprocess.DEVNULL)
+    subprocess.run(["pg_ctl", "-D", data_dir, "-l", os.path.join(data_dir, "server.log"), "-w",
+                    "-o", f'-p {port} -k {data_dir} -c listen_addresses=127.0.0.1', "start"],
+                   check=True, stdout=subprocess.DEVNULL)
+    try:
+        yield f'postgresql://postgres@127.0.0.1:{port}/postgres'
+    finally:
+        subprocess.run(["pg_ctl", "-D", data_dir, "-w", "-m", "fast", "stop"], stdout=subprocess.DEVNULL)
+
+
+"""
+A context manager running a throwaway PostgreSQL server.
+:return: The URL of its database, for DATABASE_URL
+"""
+@contextmanager
+def local_postgres():
+    data_dir = tempfile.mkdtemp(prefix="planner_pg_")
+    try:
+        if pgserver is not None:
+            server = pgserver.get_server(data_dir, cleanup_mode="stop")
+            try:
+                yield server.get_uri()
+            finally:
+                server.cleanup()
+        else:
+            with path_server(data_dir) as url:
+                yield url
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a command against a throwaway local PostgreSQL.")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="the command to run, after --")
+    args = parser.parse_args(argv)
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not command:
+        parser.error("a command is required")
+
+    with local_postgres() as url:
+        print(f'DATABASE_URL={url}', file=sys.stderr)
+        return subprocess.run(command, env=dict(os.environ, DATABASE_URL=url)).returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Benchmark of the read & write throughput of each config profile
+(see config_profiles.py), on a scratch DB seeded with the sample data.
+
+Each profile runs in its own process, as the profile is picked at import.
+Reader threads list the users & a team's users, while writer threads flip
+task statuses, for the same number of seconds under every profile.
+The dev profile echoes every statement, to a discarded stderr.
+
+Usage (from the project root):
+    $ python -m benchmarks.profiles [--readers 4] [--writers 2] [--seconds 5]
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.harness import PROJECT_DIR, scratch_app
+
+
+"""
+A helper method to run `operation` in a loop until `deadline`, each call in its
+own app context as in a request. Failures, eg. `database is locked`, are counted.
+"""
+def run_loop(flask_app, operation, deadline, counts, key):
+    from sqlalchemy.exc import OperationalError
+    done = failed = 0
+    while time.monotonic() < deadline:
+        with flask_app.app_context():
+            try:
+                operation()
+                done += 1
+            except OperationalError:
+                failed += 1
+    counts[key].append((done, failed))
+
+
+"""
+A method to measure one profile, in the current process.
+:return: A dict with the operations per second & the failures
+"""
+def measure_profile(profile, readers, writers, seconds):
+    import config_profiles
+    flask_app, work_dir = scratch_app(profile=profile, echo=config_profiles.PROFILES[profile].SQLALCHEMY_ECHO)
+    from app_config import db
+    from models import Task
+    from resources import user_resource, team_resource, project_board_resource
+
+    with flask_app.app_context():
+        task_ids = [task_id for (task_id,) in db.session.query(Task.id)]
+        journal_mode = db.session.execute("PRAGMA journal_mode").scalar()
+
+    def read():
+        user_resource.list_users()
+        team_resource.list_team_users({"id": 1})
+
+    def write():
+        status = random.choice(["OPEN", "IN_PROGRESS", "COMPLETE"])
+        project_board_resource.update_task_status({"id": random.choice(task_ids), "status": status})
+
+    counts = {"read": [], "write": []}
+    deadline = time.monotonic() + seconds
+    threads = [threading.Thread(target=run_loop, args=(flask_app, read, deadline, counts, "read"))
+               for _ in range(readers)]
+    threads += [threading.Thread(target=run_loop, args=(flask_app, write, deadline, counts, "write"))
+                for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {"profile": profile, "journal_mode": journal_mode,
+            "reads_per_sec": sum(x[0] for x in counts["read"]) / seconds,
+            "writes_per_sec": sum(x[0] for x in counts["write"]) / seconds,
+            "failed": sum(x[1] for x in counts["read"] + counts["write"])}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the read/write throughput of the config profiles.")
+    parser.add_argument("--profiles", default="dev,test,prod", help="comma separated profiles")
+    parser.add_argument("--readers", type=int, default=4, help="reader threads")
+    parser.add_argument("--writers", type=int, default=2, help="writer threads")
+    parser.add_argument("--seconds", type=float, default=5, help="run time of each profile")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure_profile(args.child, args.readers, args.writers, args.seconds)))
+        return 0
+
+    print(f'{"profile":<8} {"journal":>8} {"reads/s":>10} {"writes/s":>10} {"failed":>7}')
+    for profile in args.profiles.split(","):
+        output = subprocess.run([sys.executable, "-m", "benchmarks.profiles", "--child", profile,
+                                 "--readers", str(args.readers), "--writers", str(args.writers),
+                                 "--seconds", str(args.seconds)],
+                                cwd=PROJECT_DIR, env=dict(os.environ), check=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f'{result["profile"]:<8} {result["journal_mode"]:>8} {result["reads_per_sec"]:>10.1f} '
+              f'{result["writes_per_sec"]:>10.1f} {result["failed"]:>7}')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
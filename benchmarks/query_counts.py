@@ -0,0 +1,149 @@
+"""
+Check of the number of SQL statements each swagger operation issues.
+
+Every operation is called once, in order (list_users twice, the second time
+conditional on its ETag), against a scratch DB seeded with
+the sample data, and the statements it sends are counted. A count away from
+the EXPECTED one fails the run, so an N+1 query or a relationship loaded
+eagerly by accident shows up as soon as it is introduced.
+
+Usage (from the project root):
+    $ python -m benchmarks.query_counts [--verbose]
+"""
+
+import argparse
+import sys
+import time
+
+from benchmarks.harness import count_statements, scratch_app
+
+# (operationId, method, path, request body or query string[, request headers])
+# A callable body or headers are given the responses of the earlier operations.
+OPERATIONS = [
+    ("create_user", "post", "/api/user/create_user",
+        {"name": "qc_user", "display_name": "QC User", "description": "Query count"}),
+    ("create_users", "post", "/api/user/create_users",
+        [{"name": "qc_user_1", "display_name": "QC 1", "description": "Query count"},
+         {"name": "qc_user_2", "display_name": "QC 2", "description": "Query count"}]),
+    ("list_users", "get", "/api/user/list_users?limit=3", None),
+    ("list_users (not modified)", "get", "/api/user/list_users?limit=3", None,
+        lambda responses: {"If-None-Match": responses["list_users"].headers["ETag"]}),
+    ("describe_user", "post", "/api/user/describe_user", {"id": 1}),
+    ("update_user", "post", "/api/user/update_user",
+        {"id": 1, "user": {"display_name": "Flossi", "description": "Account Executive"}}),
+    ("get_user_teams", "post", "/api/user/get_user_teams", {"id": 5}),
+    ("create_team", "post", "/api/team/create_team", {"name": "QC Team", "description": "Query count", "admin": 1}),
+    ("list_teams", "get", "/api/team/list_teams", None),
+    ("describe_team", "post", "/api/team/describe_team", {"id": 1}),
+    ("update_team", "post", "/api/team/update_team",
+        {"id": 1, "team": {"name": "Two-Way Stretch", "description": "R&D", "admin": 1}}),
+    ("add_users_to_team", "post", "/api/team/add_users", {"id": 2, "users": [1, 2]}),
+    ("remove_users_from_team", "post", "/api/team/remove_users", {"id": 2, "users": [1]}),
+    ("list_team_users", "post", "/api/team/list_users", {"id": 1}),
+    ("create_board", "post", "/api/board/create_board", {"name": "QC Board", "description": "Query count", "team_id": 1}),
+    ("create_boards", "post", "/api/board/create_boards",
+        [{"name": "QC Board 1", "description": "Query count", "team_id": 1},
+         {"name": "QC Board 2", "description": "Query count", "team_id": 2}]),
+    ("add_task", "post", "/api/board/add_task", {"title": "QC Task", "description": "Query count", "board_id": 1, "user_id": 2}),
+    ("add_tasks", "post", "/api/board/add_tasks",
+        [{"title": "QC Task 1", "description": "Query count", "board_id": 1, "user_id": 2},
+         {"title": "QC Task 2", "description": "Query count", "board_id": 4, "user_id": 6}]),
+    ("update_task_status", "post", "/api/board/update_task_status", {"id": 1, "status": "COMPLETE"}),
+    ("update_task_statuses", "post", "/api/board/update_task_statuses", [{"id": 4, "status": "COMPLETE"}]),
+    ("board_summary", "post", "/api/board/board_summary", {"id": 2}),
+    ("close_board", "post", "/api/board/close_board", {"id": 2}),
+    ("list_boards", "post", "/api/board/list_boards", {"id": 1}),
+    ("export_board", "post", "/api/board/export_board", {"id": 1}),
+    ("export_board_async", "post", "/api/board/export_board_async", {"id": 3}),
+    ("export_team_boards", "post", "/api/board/export_team_boards", {"id": 2}),
+    ("export_status", "post", "/api/board/export_status",
+        lambda responses: {"job_id": responses["export_board_async"].get_json()["job_id"]}),
+    ("export_result", "post", "/api/board/export_result",
+        lambda responses: {"job_id": responses["export_board_async"].get_json()["job_id"]}),
+]
+
+EXPECTED = {
+    "create_user": 2,
+    "create_users": 4,
+    "list_users": 2,
+    "list_users (not modified)": 1,
+    "describe_user": 2,             # User 1 was cached by a lookup at no table version, see entity_cache.py
+    "update_user": 3,
+    "get_user_teams": 2,
+    "create_team": 4,
+    "list_teams": 2,
+    "describe_team": 2,
+    "update_team": 4,
+    "add_users_to_team": 5,
+    "remove_users_from_team": 4,
+    "list_team_users": 2,
+    "create_board": 2,
+    "create_boards": 5,
+    "add_task": 5,
+    "add_tasks": 7,
+    "update_task_status": 4,
+    "update_task_statuses": 4,
+    "board_summary": 2,
+    "close_board": 2,
+    "list_boards": 2,
+    "export_board": 2,
+    "export_board_async": 1,
+    "export_team_boards": 2,
+    "export_status": 0,
+    "export_result": 0,
+}
+
+# PostgreSQL gives back the ids of the batch inserts with RETURNING, see db_backend.py
+EXPECTED_POSTGRESQL = dict(EXPECTED, create_users=3, create_boards=4, add_tasks=6)
+
+
+"""
+A method to call every operation once & count its statements.
+:return: A list of (operationId, status code, statements, expected)
+"""
+def run_operations(flask_app, verbose=False):
+    from app_config import db
+    client = flask_app.test_client()
+    responses = {}
+    results = []
+    with flask_app.app_context():
+        engine = db.engine
+    expected = EXPECTED_POSTGRESQL if engine.dialect.name == "postgresql" else EXPECTED
+    for operation_id, method, path, body, *headers in OPERATIONS:
+        headers = headers[0] if headers else {}
+        if callable(body):
+            body = body(responses)
+        if callable(headers):
+            headers = headers(responses)
+        if operation_id == "export_result":
+            time.sleep(0.5)     # Lets the background job finish
+        with count_statements(engine) as counter:
+            if body is None:
+                response = getattr(client, method)(path, headers=headers)
+            else:
+                response = getattr(client, method)(path, json=body, headers=headers)
+        responses[operation_id] = response
+        results.append((operation_id, response.status_code, counter.count, expected.get(operation_id)))
+        if verbose:
+            for statement in counter.statements:
+                print(f'\t\t{operation_id}: {" ".join(statement.split())[:150]}')
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the SQL statements issued by each swagger operation.")
+    parser.add_argument("--verbose", action="store_true", help="print each statement")
+    args = parser.parse_args(argv)
+
+    flask_app, work_dir = scratch_app()
+    failed = False
+    print(f'{"operationId":<28} {"status":>6} {"statements":>10} {"expected":>8}')
+    for operation_id, status, count, expected in run_operations(flask_app, args.verbose):
+        mark = "" if count == expected else "  <-- FAIL"
+        failed = failed or count != expected or status >= 500
+        print(f'{operation_id:<28} {status:>6} {count:>10} {str(expected):>8}{mark}')
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
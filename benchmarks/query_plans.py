@@ -0,0 +1,130 @@
+"""
+Check that the hot queries use an index, with SQLite's EXPLAIN QUERY PLAN.
+
+Every swagger operation of benchmarks.query_counts is called once against a
+scratch DB seeded with the sample data, the SELECT statements it sends are
+recorded, then explained. A statement reading the task, board or teams_users
+table by a full scan, rather than searching an index, fails the run.
+
+With --without-indexes, the indexes of migration 4 (see migrations.py) are
+dropped first, to see the full scans they remove.
+
+Usage (from the project root):
+    $ python -m benchmarks.query_plans [--verbose] [--without-indexes]
+"""
+
+import argparse
+import re
+import sys
+import threading
+
+from sqlalchemy import event
+
+from benchmarks.harness import scratch_app
+from benchmarks.query_counts import OPERATIONS
+
+# The tables whose full scans grow with the data of every team
+HOT_TABLES = ("task", "board", "teams_users")
+
+# Eg. "SCAN task" but not "SCAN task USING COVERING INDEX ix_task_task_user_id"
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)\b(?! USING)')
+
+
+"""
+A recorder of the SELECT statements the current thread sends to the engine,
+each kept once with the parameters of its first run.
+"""
+class SelectRecorder:
+    def __init__(self):
+        self.operation_id = None
+        self.statements = {}
+        self.thread_id = threading.get_ident()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self.thread_id and statement.lstrip().upper().startswith("SELECT"):
+            self.statements.setdefault(statement, (self.operation_id, parameters))
+
+
+"""
+A method to call every operation of benchmarks.query_counts once.
+:return: A dict {statement: (operationId, parameters)}
+"""
+def record_selects(flask_app):
+    from app_config import db
+    client = flask_app.test_client()
+    responses = {}
+    recorder = SelectRecorder()
+    with flask_app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", recorder)
+    try:
+        for operation_id, method, path, body, *headers in OPERATIONS:
+            headers = headers[0] if headers else {}
+            if callable(body):
+                body = body(responses)
+            if callable(headers):
+                headers = headers(responses)
+            recorder.operation_id = operation_id
+            if body is None:
+                responses[operation_id] = getattr(client, method)(path, headers=headers)
+            else:
+                responses[operation_id] = getattr(client, method)(path, json=body, headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", recorder)
+    return recorder.statements
+
+
+"""
+A method to explain the recorded statements.
+:return: A list of (operationId, statement, plan details, full scans of the hot tables)
+"""
+def explain(statements):
+    from app_config import db
+    plans = []
+    with db.engine.connect() as connection:
+        for statement, (operation_id, parameters) in statements.items():
+            details = [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+            scans = [match.group(1) for match in map(FULL_SCAN.match, details)
+                     if match and match.group(1) in HOT_TABLES]
+            plans.append((operation_id, statement, details, scans))
+    return plans
+
+
+def drop_hot_path_indexes():
+    from app_config import db
+    import migrations
+    with db.engine.begin() as connection:
+        for name in migrations.HOT_PATH_INDEXES:
+            connection.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the hot queries use an index.")
+    parser.add_argument("--verbose", action="store_true", help="print the plan of every statement")
+    parser.add_argument("--without-indexes", action="store_true", help="drop the hot path indexes first")
+    args = parser.parse_args(argv)
+
+    flask_app, work_dir = scratch_app()
+    with flask_app.app_context():
+        from app_config import db
+        if db.engine.dialect.name != "sqlite":
+            print(f'\tINFO: EXPLAIN QUERY PLAN is SQLite only, not {db.engine.dialect.name}.')
+            return 0
+        if args.without_indexes:
+            drop_hot_path_indexes()
+        plans = explain(record_selects(flask_app))
+
+    failed = 0
+    for operation_id, statement, details, scans in plans:
+        if scans or args.verbose:
+            mark = f'  <-- FAIL, full scan of {", ".join(scans)}' if scans else ""
+            print(f'{operation_id}:{mark}\n\t{" ".join(statement.split())[:150]}')
+            for detail in details:
+                print(f'\t\t{detail}')
+        failed += bool(scans)
+    print(f'\n{len(plans)} statements explained, {failed} with a full scan of {"/".join(HOT_TABLES)}.')
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Benchmark of the read path: whole ORM objects against the column-only
+rows of read_models, for the list endpoints & the export of a board.
+
+Each listing is read & serialized both ways, and the time taken & the
+memory allocated (tracemalloc peak) are reported per row.
+
+Usage (from the project root):
+    $ python -m benchmarks.read_path [--rows 20000] [--repeat 5]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.harness import scratch_app
+
+
+def fill_tables(rows):
+    from app_config import db
+    from models import Board, Task, Team, User, teams_m2m_users
+
+    db.session.execute(User.__table__.insert(),
+                       [{"user_name": f'rp_user_{i}', "user_disp_name": f'RP User {i}',
+                         "user_desc": "Read path"} for i in range(rows)])
+    db.session.execute(Team.__table__.insert(),
+                       [{"team_name": f'rp_team_{i}', "team_desc": "Read path", "team_admin": 1}
+                        for i in range(rows)])
+    team_id = db.session.query(Team.id).filter(Team.team_name == "rp_team_0").scalar()
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.user_name.like("rp_user_%"))]
+    db.session.execute(teams_m2m_users.insert(), [{"team_id": team_id, "user_id": x} for x in user_ids])
+    db.session.execute(Board.__table__.insert(),
+                       [{"board_name": f'rp_board_{i}', "board_desc": "Read path", "board_team_id": team_id}
+                        for i in range(rows)])
+    board_id = db.session.query(Board.id).filter(Board.board_name == "rp_board_0").scalar()
+    db.session.execute(Task.__table__.insert(),
+                       [{"task_title": f'rp_task_{i}', "task_desc": "Read path", "task_board_id": board_id,
+                         "task_user_id": 1} for i in range(rows)])
+    db.session.commit()
+    return team_id, board_id
+
+
+"""
+A helper method to run `read` in a fresh session, once timed & once tracing its allocations
+(the tracing slows the run down, so the two are kept apart).
+:return: (seconds, peak bytes allocated, rows read)
+"""
+def measure(read):
+    from app_config import db
+    db.session.remove()
+    start = time.perf_counter()
+    count = len(read())
+    elapsed = time.perf_counter() - start
+    db.session.remove()
+
+    tracemalloc.start()
+    read()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.session.remove()
+    return elapsed, peak, count
+
+
+def listings(team_id, board_id):
+    from app_config import db
+    from models import Board, Task, Team, User, teams_m2m_users
+    from resources import user_resource, team_resource, project_board_resource
+    import board_export
+    import read_models
+
+    return [
+        ("list_users",
+            lambda: user_resource.serialize_objects_list(db.session.query(User).order_by(User.id).all()),
+            lambda: user_resource.serialize_objects_list(read_models.users_query().order_by(User.id).all())),
+        ("list_teams",
+            lambda: team_resource.serialize_objects_list(db.session.query(Team).order_by(Team.id).all()),
+            lambda: team_resource.serialize_objects_list(read_models.teams_query().order_by(Team.id).all())),
+        ("list_team_users",
+            lambda: user_resource.serialize_objects_list(
+                User.query.join(teams_m2m_users).filter(teams_m2m_users.c.team_id == team_id).all()),
+            lambda: user_resource.serialize_objects_list(
+                read_models.users_query().join(teams_m2m_users, teams_m2m_users.c.user_id == User.id)
+                                         .filter(teams_m2m_users.c.team_id == team_id).all())),
+        ("list_boards",
+            lambda: project_board_resource.serialize_objects_list(
+                Board.query.filter(Board.board_team_id == team_id).all()),
+            lambda: project_board_resource.serialize_objects_list(
+                read_models.boards_query().filter(Board.board_team_id == team_id).all())),
+        ("export_board tasks",
+            lambda: [board_export.task_record(x) for x in
+                     db.session.query(Task).filter(Task.task_board_id == board_id).yield_per(board_export.CHUNK_SIZE)],
+            lambda: list(board_export.iter_board_tasks(board_id))),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare ORM objects against column rows on the read path.")
+    parser.add_argument("--rows", type=int, default=20000, help="rows per table")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each listing, the best one is kept")
+    args = parser.parse_args(argv)
+
+    flask_app, work_dir = scratch_app(seed=False)
+    print(f'{"listing":<20} {"rows":>7} {"orm us/row":>11} {"rows us/row":>12} {"orm B/row":>10} {"rows B/row":>11}')
+    with flask_app.app_context():
+        team_id, board_id = fill_tables(args.rows)
+        for name, orm_read, rows_read in listings(team_id, board_id):
+            orm_runs = [measure(orm_read) for _ in range(args.repeat)]
+            rows_runs = [measure(rows_read) for _ in range(args.repeat)]
+            count = orm_runs[0][2]
+            orm_time, rows_time = min(x[0] for x in orm_runs), min(x[0] for x in rows_runs)
+            orm_peak, rows_peak = min(x[1] for x in orm_runs), min(x[1] for x in rows_runs)
+            print(f'{name:<20} {count:>7} {orm_time / count * 1e6:>11.2f} {rows_time / count * 1e6:>12.2f} '
+                  f'{orm_peak // count:>10} {rows_peak // count:>11}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark of the prefork serving: throughput from 1 to N worker processes.
+
+A scratch DB is seeded with a synthetic dataset, then a uWSGI or gunicorn
+server (see uwsgi.ini & gunicorn.conf.py) is started with 1, 2, ... up to
+`--max-workers` workers, by default one per CPU core. Each one serves a mix
+of read operations from `--concurrency` client threads per worker.
+
+Reported per worker count: the throughput, its speedup over a single worker,
+the p95 latency, and the memory of the server's processes. Since the app is
+preloaded in the master, most of a worker's memory is shared with the others,
+copy on write: the proportional set size (PSS) grows far slower than the
+resident size (RSS) as workers are added. The memory is read from /proc, on Linux.
+
+Usage (from the project root):
+    $ python -m benchmarks.scaling [--server gunicorn] [--max-workers 4] [--threads 2]
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+from benchmarks.harness import scratch_app
+from benchmarks import suite
+
+# The read operations of the mix, see suite.REQUESTS
+OPERATIONS = ("describe_user", "list_users", "get_user_teams", "describe_team",
+              "list_team_users", "list_boards", "board_summary")
+
+
+"""
+A helper method to find the process ids of a server: the master & its workers.
+"""
+def process_tree(root_pid):
+    parents = {}
+    for stat_file in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat_file.read_text().rsplit(")", 1)[1].split()
+        except OSError:     # The process exited meanwhile
+            continue
+        parents[int(stat_file.parent.name)] = int(fields[1])
+    pids = [root_pid]
+    for pid in pids:
+        pids += [child for child, parent in parents.items() if parent == pid]
+    return pids
+
+
+"""
+A helper method to sum the memory of some processes.
+:return: {"rss_mb": ..., "pss_mb": ...}, None if /proc/<pid>/smaps_rollup is unavailable
+"""
+def memory(pids):
+    totals = {"Rss": 0, "Pss": 0}
+    for pid in pids:
+        try:
+            lines = Path(f'/proc/{pid}/smaps_rollup').read_text().splitlines()
+        except OSError:
+            return None
+        for line in lines:
+            name, _, value = line.partition(":")
+            if name in totals:
+                totals[name] += int(value.split()[0])
+    return {"rss_mb": round(totals["Rss"] / 1024, 1), "pss_mb": round(totals["Pss"] / 1024, 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput of the prefork server from 1 to N workers.")
+    parser.add_argument("--server", choices=("uwsgi", "gunicorn"), default="uwsgi", help="the prefork server")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count(), help="most worker processes")
+    parser.add_argument("--threads", type=int, default=2, help="server threads per worker")
+    parser.add_argument("--concurrency", type=int, default=4, help="client threads per worker")
+    parser.add_argument("--requests", type=int, default=200, help="requests per operation & worker")
+    parser.add_argument("--scale", choices=list(suite.SCALES), default="small", help="the dataset")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the dataset & the requests")
+    args = parser.parse_args(argv)
+
+    # The prod profile, unless PLANNER_PROFILE is set already, as with uWSGI
+    os.environ.setdefault("PLANNER_PROFILE", "prod")
+    flask_app, work_dir = scratch_app(seed=suite.SCALES[args.scale] is None)
+    from app_config import db
+    with flask_app.app_context():
+        if suite.SCALES[args.scale] is not None:
+            import db_initializer
+            import synthetic_data
+            dataset = synthetic_data.SyntheticDataset(seed=args.seed, **suite.SCALES[args.scale])
+            db_initializer.bulk_load(dataset.tables())
+        fx = suite.Fixtures(0, args.seed)
+        database_url = os.environ.get("DATABASE_URL", str(db.engine.url))
+        db.session.remove()
+        db.engine.dispose()
+
+    print(f'{args.server}, {args.threads} threads per worker, {os.cpu_count()} CPU cores\n')
+    print(f'{"workers":>7} {"req/s":>9} {"speedup":>8} {"p95 ms":>8} {"RSS MB":>8} {"PSS MB":>8}  statuses')
+    single_worker = None
+    for workers in range(1, args.max_workers + 1):
+        process, port = suite.start_server(args.server, work_dir, database_url, workers, args.threads)
+        try:
+            transport = suite.HttpTransport(port)
+            transport.request("get", "/api/user/list_users?limit=1", None)      # Warms up a worker
+            results = [suite.measure_operation(operation_id, transport, fx, args.requests * workers,
+                                               args.concurrency * workers, None)
+                       for operation_id in OPERATIONS]
+            used = memory(process_tree(process.pid))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+        throughput = sum(result["requests"] for result in results) / sum(result["seconds"] for result in results)
+        single_worker = single_worker or throughput
+        p95 = max(result["p95_ms"] for result in results)
+        statuses = {}
+        for result in results:
+            for status, count in result["statuses"].items():
+                statuses[status] = statuses.get(status, 0) + count
+        print(f'{workers:>7} {throughput:>9.1f} {throughput / single_worker:>7.2f}x {p95:>8.2f} '
+              f'{used["rss_mb"] if used else "-":>8} {used["pss_mb"] if used else "-":>8}  '
+              + " ".join(f'{status}x{count}' for status, count in sorted(statuses.items())))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Benchmark of the startup of the app, phase by phase, and of its first request.
+
+Each run starts the app in a new Python process, against a scratch DB seeded
+once with the sample data, sends it one request, and reports the timings of
+startup_timing.py. The runs are made without the cached spec (see spec_cache.py),
+as on the first start after swagger.yaml changed, then with it, as on any
+other start, eg. of a recycled uWSGI worker. The median of the runs is reported.
+
+Usage (from the project root):
+    $ python -m benchmarks.startup [--runs 5] [--path /api/user/list_users]
+"""
+
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.harness import PROJECT_DIR
+
+# Run in a new process: startup_timing is imported first, to time every import
+CHILD = """
+import json, sys
+import startup_timing
+from benchmarks.harness import scratch_app
+app, work_dir = scratch_app(work_dir=sys.argv[1], seed=sys.argv[2] == "seed")
+app.test_client().get(sys.argv[3])
+print(json.dumps(startup_timing.report()))
+"""
+
+
+"""
+A helper method to start the app in a new process.
+:return: The report of startup_timing
+"""
+def run_once(work_dir, path, seed=False):
+    result = subprocess.run([sys.executable, "-c", CHILD, str(work_dir), "seed" if seed else "", path],
+                            cwd=PROJECT_DIR, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def medians(reports):
+    timings = {phase: statistics.median(report["phases"][phase] for report in reports)
+               for phase in reports[0]["phases"]}
+    timings["total"] = statistics.median(report["total"] for report in reports)
+    timings["first request"] = statistics.median(report["first_request"]["milliseconds"] for report in reports)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the startup phases & the first request of the app.")
+    parser.add_argument("--runs", type=int, default=5, help="starts of the app, with & without the cached spec")
+    parser.add_argument("--path", default="/api/user/list_users", help="the GET request sent first")
+    args = parser.parse_args(argv)
+
+    work_dir = Path(tempfile.mkdtemp(prefix="planner_startup_"))
+    spec_cache_dir = work_dir / "db" / "spec_cache"
+    try:
+        print("\tINFO: Seeding the scratch DB")
+        run_once(work_dir, args.path, seed=True)
+
+        uncached = []
+        for _ in range(args.runs):
+            shutil.rmtree(spec_cache_dir, ignore_errors=True)
+            uncached.append(run_once(work_dir, args.path))
+        cached = [run_once(work_dir, args.path) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    uncached_ms, cached_ms = medians(uncached), medians(cached)
+    print(f'\n{"phase (median ms)":<20}{"no cached spec":>16}{"cached spec":>13}')
+    for phase in uncached_ms:
+        print(f'{phase:<20}{uncached_ms[phase]:>16.1f}{cached_ms[phase]:>13.1f}')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Concurrency stress harness for the create paths.
+
+Users, teams, boards & tasks are created from many threads and processes
+at once against a scratch database. Every returned id must be unique,
+and the row stored under that id must be the entity the caller created.
+
+Usage (from the project root):
+    $ python -m benchmarks.stress_ids --threads 8 --processes 4 --per-worker 25
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+KINDS = ("user", "team", "board", "task")
+
+
+"""
+A helper method to import the app against the scratch database in `work_dir`.
+app_config builds the SQLite URL from the current directory at import time.
+"""
+def load_app(work_dir):
+    os.chdir(work_dir)
+    import app_config
+    app_config.app.config["SQLALCHEMY_ECHO"] = False
+    return app_config
+
+
+"""
+A helper method to create the admin user, team & board the workers build upon.
+"""
+def seed(work_dir):
+    app_config = load_app(work_dir)
+    from resources import user_resource, team_resource, project_board_resource
+    import migrations
+    with app_config.app.app_context():
+        if os.environ.get("DATABASE_URL"):
+            app_config.db.drop_all()        # Another database server, see benchmarks.local_postgres
+        migrations.upgrade()
+        user_resource.create_user({"name": "admin", "display_name": "Admin", "description": "seed"})
+        team_resource.create_team({"name": "seed team", "description": "seed", "admin": 1})
+        project_board_resource.create_board({"name": "seed board", "description": "seed", "team_id": 1})
+
+
+"""
+A helper method to create a single entity through its resource function.
+:return: (kind, expected name, returned id or None, error)
+"""
+def create_one(kind, name):
+    from resources import user_resource, team_resource, project_board_resource
+    if kind == "user":
+        response = user_resource.create_user({"name": name, "display_name": name, "description": "stress"})
+    elif kind == "team":
+        response = team_resource.create_team({"name": name, "description": "stress", "admin": 1})
+    elif kind == "board":
+        response = project_board_resource.create_board({"name": name, "description": "stress", "team_id": 1})
+    else:
+        response = project_board_resource.add_task({"title": name, "description": "stress",
+                                                    "board_id": 1, "user_id": 1})
+    body, status = response[0], response[1]
+    if status == 201:
+        return kind, name, body["id"], None
+    return kind, name, None, str(body)
+
+
+"""
+A helper method to run one thread's share of the work inside an app context.
+"""
+def thread_worker(app_config, worker_name, per_worker):
+    results = []
+    with app_config.app.app_context():
+        for index in range(per_worker):
+            kind = KINDS[index % len(KINDS)]
+            try:
+                results.append(create_one(kind, f'{worker_name}-{kind}-{index}'))
+            except Exception as e:
+                app_config.db.session.rollback()
+                results.append((kind, f'{worker_name}-{kind}-{index}', None, repr(e)))
+        app_config.db.session.remove()
+    return results
+
+
+"""
+The entry point of a worker process, which runs its own pool of threads.
+"""
+def process_worker(work_dir, process_name, threads, per_worker):
+    app_config = load_app(work_dir)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(thread_worker, app_config, f'{process_name}t{x}', per_worker)
+                   for x in range(threads)]
+        return [result for future in futures for result in future.result()]
+
+
+"""
+A method to check that every returned id is unique & points at the expected row.
+:return: A list of problems found, empty when all is well
+"""
+def verify(work_dir, results):
+    app_config = load_app(work_dir)
+    from models import User, Team, Board, Task
+    name_columns = {"user": (User, User.user_name), "team": (Team, Team.team_name),
+                    "board": (Board, Board.board_name), "task": (Task, Task.task_title)}
+    problems = []
+    with app_config.app.app_context():
+        for kind, (model, name_column) in name_columns.items():
+            returned = [(name, new_id) for (k, name, new_id, error) in results if k == kind and new_id is not None]
+            ids = [new_id for (name, new_id) in returned]
+            if len(ids) != len(set(ids)):
+                problems.append(f'{kind}: {len(ids) - len(set(ids))} duplicate ids returned')
+            stored = dict(app_config.db.session.query(model.id, name_column).filter(model.id.in_(ids)))
+            for name, new_id in returned:
+                if stored.get(new_id) != name:
+                    problems.append(f'{kind}: id {new_id} returned for {name!r} but holds {stored.get(new_id)!r}')
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8, help="threads per process")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--per-worker", type=int, default=25, help="entities created by each thread")
+    args = parser.parse_args(argv)
+
+    project_dir = Path(__file__).resolve().parent.parent
+    sys.path.insert(0, str(project_dir))
+    work_dir = tempfile.mkdtemp(prefix="stress_ids_")
+    (Path(work_dir) / "db").mkdir()
+    seed(work_dir)
+
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(args.processes) as pool:
+        per_process = pool.starmap(process_worker, [(work_dir, f'p{x}', args.threads, args.per_worker)
+                                                   for x in range(args.processes)])
+    results = [result for process_results in per_process for result in process_results]
+
+    errors = [result for result in results if result[3] is not None]
+    problems = verify(work_dir, results)
+    print(f'Created {len(results) - len(errors)} of {len(results)} entities in {work_dir}')
+    for kind, name, new_id, error in errors[:10]:
+        print(f'\tERROR: {kind} {name}: {error}')
+    for problem in problems:
+        print(f'\tFAIL: {problem}')
+    if not problems:
+        print("\tINFO: Every returned id is unique & correct.")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,486 @@
+"""
+End-to-end benchmark of every swagger operation, at several dataset scales.
+
+For each scale, a scratch DB is seeded (the sample data of data_files/, or a
+synthetic dataset bulk loaded as by `db_initializer.py synthetic`), then every
+operationId of swagger.yaml is called `--requests` times, from `--concurrency`
+client threads. The requests go to the app in-process through the Flask test
+client, or over HTTP to a real uWSGI or gunicorn server started on the scratch DB,
+or to uvicorn serving the async mode (see async_serving.py).
+
+Reported per operation: throughput, p50/p95/p99 latency, SQL statements per
+request (in-process only) & the response statuses, a failed connection counting as "error". The results are written to
+a JSON file; given a baseline file of an earlier run, a regression beyond the
+tolerance fails the run:
+* a p95 latency or a throughput worse by more than --tolerance (25% by default)
+* half a SQL statement per request more, or beyond: the mean varies a little
+  between runs (eg. with the entity cache hits), a new statement adds 1
+
+Each scale runs in its own process, as the app binds its DB at import.
+
+Usage (from the project root):
+    $ python -m benchmarks.suite --scales sample,small --output bench.json
+    $ python -m benchmarks.suite --scales sample,small --baseline bench.json
+    $ python -m benchmarks.suite --scales small --server uwsgi --workers 2
+    $ python -m benchmarks.suite --scales small --server uvicorn
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import yaml
+
+from benchmarks.harness import PROJECT_DIR, scratch_app
+
+# The synthetic datasets by scale, see synthetic_data.SyntheticDataset. "sample" is data_files/
+SCALES = {
+    "sample": None,
+    "small": dict(users=1000, teams=100, boards_per_team=5, tasks_per_board=20),
+    "medium": dict(users=20000, teams=2000, boards_per_team=5, tasks_per_board=20),
+    "large": dict(users=100000, teams=20000, boards_per_team=5, tasks_per_board=20),
+}
+
+SERVERS = ("inprocess", "uwsgi", "gunicorn", "uvicorn")
+
+# The ids sampled from the dataset, the requests pick from them
+SAMPLE_SIZE = 1000
+
+# The mean SQL statements per request varying between runs (eg. the entity cache hits)
+# not counted as a regression: an extra statement adds 1 per request
+STATEMENTS_SLACK = 0.5
+
+
+"""
+The ids the requests pick from: a sample of the dataset's, plus teams & boards
+made for the writes that need their own, eg. a board to close per request.
+"""
+class Fixtures:
+    def __init__(self, requests, seed):
+        from sqlalchemy import func
+        from app_config import db
+        from models import User, Team, Board, Task, teams_m2m_users
+        from resources import team_resource, project_board_resource
+
+        rng = random.Random(seed)
+
+        def sample(column):
+            max_id = db.session.query(func.max(column)).scalar() or 0
+            return rng.sample(range(1, max_id + 1), min(SAMPLE_SIZE, max_id))
+
+        self.user_ids = sample(User.id)
+        self.team_ids = sample(Team.id)
+        self.board_ids = sample(Board.id)
+        self.task_ids = sample(Task.id)
+        # (board id, a member of its team), for the new tasks
+        self.board_members = db.session.query(Board.id, teams_m2m_users.c.user_id) \
+                                       .join(teams_m2m_users, teams_m2m_users.c.team_id == Board.board_team_id) \
+                                       .filter(Board.id.in_(self.board_ids)).order_by(Board.id).all()
+
+        # A team per request, its admin being its only member, & a board of it to close
+        self.team_admins = []
+        for index in range(requests):
+            admin = self.user_ids[index % len(self.user_ids)]
+            response, status = team_resource.create_team({"name": f'bench_team_{index}',
+                                                          "description": "Benchmark", "admin": admin})
+            self.team_admins.append((response["id"], admin))
+        response, status = project_board_resource.create_boards(
+            [{"name": f'bench_closable_{index}', "description": "Benchmark", "team_id": team_id}
+             for index, (team_id, admin) in enumerate(self.team_admins)])
+        self.closable_board_ids = [result["id"] for result in response]
+        self.job_ids = []
+
+    def pick(self, ids, index):
+        return ids[index % len(ids)]
+
+    """
+    Two users to add to the team of request `index`, besides its admin.
+    """
+    def new_members(self, index):
+        team_id, admin = self.team_admins[index]
+        return [user_id for user_id in (self.pick(self.user_ids, index + 1), self.pick(self.user_ids, index + 2))
+                if user_id != admin]
+
+
+STATUSES = ["OPEN", "IN_PROGRESS", "COMPLETE"]
+
+
+def task_request(fx, index, suffix=""):
+    board_id, user_id = fx.pick(fx.board_members, index)
+    return {"title": f'bench_task_{index}{suffix}', "description": "Benchmark", "board_id": board_id, "user_id": user_id}
+
+
+# The request of each operationId, by index: (method, path, body or None)
+REQUESTS = {
+    "create_user": lambda fx, i: ("post", "/api/user/create_user",
+        {"name": f'bench_user_{i}', "display_name": "Bench User", "description": "Benchmark"}),
+    "create_users": lambda fx, i: ("post", "/api/user/create_users",
+        [{"name": f'bench_users_{i}_{k}', "display_name": "Bench User", "description": "Benchmark"} for k in range(2)]),
+    "list_users": lambda fx, i: ("get", f'/api/user/list_users?limit=50&after_id={fx.pick(fx.user_ids, i)}', None),
+    "describe_user": lambda fx, i: ("post", "/api/user/describe_user", {"id": fx.pick(fx.user_ids, i)}),
+    "update_user": lambda fx, i: ("post", "/api/user/update_user",
+        {"id": fx.pick(fx.user_ids, i), "user": {"display_name": f'Bench {i}', "description": "Benchmark"}}),
+    "get_user_teams": lambda fx, i: ("post", "/api/user/get_user_teams", {"id": fx.pick(fx.user_ids, i)}),
+    "create_team": lambda fx, i: ("post", "/api/team/create_team",
+        {"name": f'bench_new_team_{i}', "description": "Benchmark", "admin": fx.pick(fx.user_ids, i)}),
+    "list_teams": lambda fx, i: ("get", f'/api/team/list_teams?limit=50&after_id={fx.pick(fx.team_ids, i)}', None),
+    "describe_team": lambda fx, i: ("post", "/api/team/describe_team", {"id": fx.pick(fx.team_ids, i)}),
+    "update_team": lambda fx, i: ("post", "/api/team/update_team",
+        {"id": fx.team_admins[i][0], "team": {"name": f'bench_team_{i}_renamed', "description": "Renamed",
+                                              "admin": fx.team_admins[i][1]}}),
+    "add_users_to_team": lambda fx, i: ("post", "/api/team/add_users",
+        {"id": fx.team_admins[i][0], "users": fx.new_members(i)}),
+    "remove_users_from_team": lambda fx, i: ("post", "/api/team/remove_users",
+        {"id": fx.team_admins[i][0], "users": fx.new_members(i)}),
+    "list_team_users": lambda fx, i: ("post", "/api/team/list_users", {"id": fx.pick(fx.team_ids, i)}),
+    "create_board": lambda fx, i: ("post", "/api/board/create_board",
+        {"name": f'bench_board_{i}', "description": "Benchmark", "team_id": fx.team_admins[i][0]}),
+    "create_boards": lambda fx, i: ("post", "/api/board/create_boards",
+        [{"name": f'bench_boards_{i}_{k}', "description": "Benchmark", "team_id": fx.team_admins[i][0]}
+         for k in range(2)]),
+    "add_task": lambda fx, i: ("post", "/api/board/add_task", task_request(fx, i)),
+    "add_tasks": lambda fx, i: ("post", "/api/board/add_tasks",
+        [task_request(fx, i * 2 + k, "_batch") for k in range(2)]),
+    "update_task_status": lambda fx, i: ("post", "/api/board/update_task_status",
+        {"id": fx.pick(fx.task_ids, i), "status": STATUSES[i % 3]}),
+    "update_task_statuses": lambda fx, i: ("post", "/api/board/update_task_statuses",
+        [{"id": fx.pick(fx.task_ids, i * 2 + k), "status": STATUSES[(i + k) % 3]} for k in range(2)]),
+    "board_summary": lambda fx, i: ("post", "/api/board/board_summary", {"id": fx.pick(fx.board_ids, i)}),
+    "close_board": lambda fx, i: ("post", "/api/board/close_board", {"id": fx.closable_board_ids[i]}),
+    "list_boards": lambda fx, i: ("post", "/api/board/list_boards", {"id": fx.pick(fx.team_ids, i)}),
+    "export_board": lambda fx, i: ("post", "/api/board/export_board", {"id": fx.pick(fx.board_ids, i)}),
+    "export_board_async": lambda fx, i: ("post", "/api/board/export_board_async", {"id": fx.pick(fx.board_ids, i)}),
+    "export_team_boards": lambda fx, i: ("post", "/api/board/export_team_boards", {"id": fx.pick(fx.team_ids, i)}),
+    "export_status": lambda fx, i: ("post", "/api/board/export_status", {"job_id": fx.pick(fx.job_ids, i)}),
+    "export_result": lambda fx, i: ("post", "/api/board/export_result", {"job_id": fx.pick(fx.job_ids, i)}),
+}
+
+# The background export requests, whose job is awaited (untimed) before the next request,
+# so the pending jobs stay within EXPORT_MAX_PENDING_JOBS
+BACKGROUND_JOBS = ("export_board_async", "export_team_boards")
+
+
+def swagger_operation_ids():
+    with open(PROJECT_DIR / "swagger.yaml") as spec_file:
+        spec = yaml.safe_load(spec_file)
+    return [operation["operationId"].rsplit(".", 1)[-1]
+            for path in spec["paths"].values() for operation in path.values()
+            if isinstance(operation, dict) and "operationId" in operation]
+
+
+"""
+Transports of the requests: a Flask test client per thread, or a keep-alive HTTP connection per thread.
+Each gives back (status, JSON body or None, body size in bytes).
+"""
+class InProcessTransport:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.local = threading.local()
+
+    def request(self, method, path, body):
+        if not hasattr(self.local, "client"):
+            self.local.client = self.flask_app.test_client()
+        response = getattr(self.local.client, method)(path, json=body)
+        data = response.get_data()
+        return response.status_code, response.get_json(silent=True), len(data)
+
+
+class HttpTransport:
+    def __init__(self, port):
+        self.port = port
+        self.local = threading.local()
+
+    def request(self, method, path, body):
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        payload = json.dumps(body) if body is not None else None
+        reused = hasattr(self.local, "connection")
+        if not reused:
+            self.local.connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        try:
+            self.local.connection.request(method.upper(), path, body=payload, headers=headers)
+            response = self.local.connection.getresponse()
+        except (ConnectionError, http.client.RemoteDisconnected):
+            # The server closed the kept-alive connection, eg. uWSGI's http-socket
+            # does after each response: the request is sent again on a new one
+            self.local.connection.close()
+            del self.local.connection
+            if not reused:
+                raise
+            return self.request(method, path, body)
+        data = response.read()
+        if response.will_close:
+            self.local.connection.close()
+            del self.local.connection
+        try:
+            parsed = json.loads(data) if response.getheader("Content-Type", "").endswith("json") else None
+        except ValueError:
+            parsed = None
+        return response.status, parsed, len(data)
+
+
+"""
+A counter of the SQL statements sent by any thread, eg. by every client thread at once.
+"""
+class SharedStatementCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        with self.lock:
+            self.total += 1
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def await_job(transport, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status, body, size = transport.request("post", "/api/board/export_status", {"job_id": job_id})
+        if status != 200 or body.get("status") in ("DONE", "FAILED"):
+            return
+        time.sleep(0.01)
+
+
+"""
+A method to call one operation `requests` times from `concurrency` threads.
+:return: A dict of its measures
+"""
+def measure_operation(operation_id, transport, fx, requests, concurrency, counter):
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    indexes = itertools.count()
+
+    def worker():
+        while True:
+            index = next(indexes)
+            if index >= requests:
+                return
+            method, path, body = REQUESTS[operation_id](fx, index)
+            started = time.perf_counter()
+            try:
+                status, response_body, size = transport.request(method, path, body)
+            except (OSError, http.client.HTTPException):
+                status, response_body = "error", None
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if operation_id in BACKGROUND_JOBS and status == 202:
+                fx.job_ids.append(response_body["job_id"])
+                await_job(transport, response_body["job_id"])
+
+    statements_before = counter.total if counter else 0
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    latencies.sort()
+    statements = None
+    if counter and operation_id not in BACKGROUND_JOBS:
+        statements = round((counter.total - statements_before) / requests, 2)
+    return {"operation": operation_id, "requests": requests, "seconds": round(seconds, 3),
+            "throughput": round(requests / seconds, 1),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "statements_per_request": statements, "statuses": statuses}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+"""
+A method to start a uWSGI or gunicorn server of wsgi:app on the scratch DB, from the scratch dir
+(which links to swagger.yaml, as the app looks for it in the current directory).
+:return: (process, port)
+"""
+def start_server(server, work_dir, database_url, workers, threads):
+    port = free_port()
+    if not (work_dir / "swagger.yaml").exists():
+        (work_dir / "swagger.yaml").symlink_to(PROJECT_DIR / "swagger.yaml")
+    if server == "uwsgi":
+        command = ["uwsgi", "--ini", str(PROJECT_DIR / "uwsgi.ini"), "--pythonpath", str(PROJECT_DIR),
+                   "--processes", str(workers), "--threads", str(threads), "--disable-logging"]
+    elif server == "uvicorn":
+        command = ["uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(port), "--app-dir", str(PROJECT_DIR),
+                   "--workers", str(workers), "--no-access-log"]
+    else:
+        command = ["gunicorn", "--config", str(PROJECT_DIR / "gunicorn.conf.py"), "--bind", f'127.0.0.1:{port}',
+                   "--pythonpath", str(PROJECT_DIR), "--workers", str(workers), "--threads", str(threads), "wsgi:app"]
+    env = dict(os.environ, PORT=str(port), DATABASE_URL=database_url)
+    log_file = open(work_dir / "server.log", "w")
+    process = subprocess.Popen(command, cwd=work_dir, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{server} exited, see {work_dir / "server.log"}')
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f'{server} did not start, see {work_dir / "server.log"}')
+
+
+"""
+A method to benchmark one scale, in the current process.
+:return: A list of the operations' measures
+"""
+def run_scale(scale, args):
+    flask_app, work_dir = scratch_app(seed=SCALES[scale] is None)
+    from app_config import db
+    from sqlalchemy import event
+
+    with flask_app.app_context():
+        if SCALES[scale] is not None:
+            import db_initializer
+            import synthetic_data
+            dataset = synthetic_data.SyntheticDataset(seed=args.seed, **SCALES[scale])
+            db_initializer.bulk_load(dataset.tables())
+        fx = Fixtures(args.requests, args.seed)
+        database_url = str(db.engine.url)
+        db.session.remove()
+
+    missing = [operation_id for operation_id in swagger_operation_ids() if operation_id not in REQUESTS]
+    if missing:
+        raise RuntimeError(f'No benchmark request for the operations: {", ".join(missing)}')
+
+    process = counter = None
+    if args.server == "inprocess":
+        transport = InProcessTransport(flask_app)
+        counter = SharedStatementCounter()
+        with flask_app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", counter)
+    else:
+        with flask_app.app_context():
+            db.engine.dispose()
+        process, port = start_server(args.server, work_dir, os.environ.get("DATABASE_URL", database_url),
+                                     args.workers, args.threads)
+        transport = HttpTransport(port)
+
+    results = []
+    try:
+        transport.request("get", "/api/user/list_users?limit=1", None)      # Warms up the app
+        for operation_id in REQUESTS:
+            result = measure_operation(operation_id, transport, fx, args.requests, args.concurrency, counter)
+            result["scale"] = scale
+            results.append(result)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+    return results
+
+
+"""
+A method to compare the results against a baseline run.
+:return: A list of the regressions found, as messages
+"""
+def regressions(results, baseline, tolerance):
+    baseline_results = {(result["scale"], result["operation"]): result for result in baseline["results"]}
+    found = []
+    for result in results:
+        base = baseline_results.get((result["scale"], result["operation"]))
+        if base is None:
+            continue
+        name = f'{result["scale"]}/{result["operation"]}'
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            found.append(f'{name}: p95 {result["p95_ms"]}ms, baseline {base["p95_ms"]}ms')
+        if result["throughput"] < base["throughput"] / (1 + tolerance):
+            found.append(f'{name}: {result["throughput"]} req/s, baseline {base["throughput"]} req/s')
+        if None not in (result["statements_per_request"], base["statements_per_request"]) \
+                and result["statements_per_request"] >= base["statements_per_request"] + STATEMENTS_SLACK:
+            found.append(f'{name}: {result["statements_per_request"]} statements/request, '
+                         f'baseline {base["statements_per_request"]}')
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every swagger operation at several dataset scales.")
+    parser.add_argument("--scales", default="sample,small", help=f'comma separated, of {", ".join(SCALES)}')
+    parser.add_argument("--requests", type=int, default=200, help="requests per operation")
+    parser.add_argument("--concurrency", type=int, default=1, help="client threads")
+    parser.add_argument("--server", choices=SERVERS, default="inprocess", help="where the requests go")
+    parser.add_argument("--workers", type=int, default=2, help="server worker processes")
+    parser.add_argument("--threads", type=int, default=1, help="server threads per worker")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the datasets & the requests")
+    parser.add_argument("--output", default="benchmark_results.json", help="the results file")
+    parser.add_argument("--baseline", help="the results file of a baseline run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed latency/throughput slowdown")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_scale(args.child, args)))
+        return 0
+
+    scales = args.scales.split(",")
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown:
+        parser.error(f'unknown scale(s): {", ".join(unknown)}')
+
+    # The prod profile, unless PLANNER_PROFILE is set already, as with uWSGI
+    profile = os.environ.get("PLANNER_PROFILE", "prod")
+    results = []
+    for scale in scales:
+        output = subprocess.run([sys.executable, "-m", "benchmarks.suite", "--child", scale,
+                                 "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+                                 "--server", args.server, "--workers", str(args.workers),
+                                 "--threads", str(args.threads), "--seed", str(args.seed)],
+                                cwd=PROJECT_DIR, env=dict(os.environ, PLANNER_PROFILE=profile),
+                                check=True, stdout=subprocess.PIPE, text=True).stdout
+        scale_results = json.loads(output.strip().splitlines()[-1])
+        results += scale_results
+
+        print(f'\n{scale} ({args.server}, concurrency {args.concurrency})')
+        print(f'{"operationId":<24} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"SQL/req":>8}  statuses')
+        for result in scale_results:
+            statuses = " ".join(f'{status}x{count}' for status, count in sorted(result["statuses"].items()))
+            print(f'{result["operation"]:<24} {result["throughput"]:>8.1f} {result["p50_ms"]:>8.2f} '
+                  f'{result["p95_ms"]:>8.2f} {result["p99_ms"]:>8.2f} {str(result["statements_per_request"]):>8}  {statuses}')
+
+    run = {"created": datetime.utcnow().isoformat(timespec="seconds"), "server": args.server,
+           "requests": args.requests, "concurrency": args.concurrency, "seed": args.seed,
+           "profile": profile, "results": results}
+    with open(args.output, "w") as output_file:
+        json.dump(run, output_file, indent=2)
+    print(f'\n\tINFO: Results written to {args.output}.')
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            found = regressions(results, json.load(baseline_file), args.tolerance)
+        for message in found:
+            print(f'\tREGRESSION: {message}')
+        if found:
+            return 1
+        print("\tINFO: No regression against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Benchmark of the request body validation: connexion's jsonschema validator
+against the validators compiled by request_validation.py.
+
+A body is made up for every operation of swagger.yaml from the examples of
+its schema, a batch one with --items items, then checked both ways. The
+time per request is reported, and the made up bodies are checked to pass both.
+
+Usage (from the project root):
+    $ python -m benchmarks.validation [--items 1000] [--repeat 2000]
+"""
+
+import argparse
+import copy
+import sys
+import time
+
+from benchmarks.harness import PROJECT_DIR
+
+EXAMPLES = {"integer": 1, "number": 1.5, "boolean": True, "string": "text", "object": {}}
+
+
+"""
+A helper method to make up a value of a schema, from its examples & enums.
+"""
+def example_of(schema, items):
+    if "allOf" in schema:
+        value = {}
+        for sub_schema in schema["allOf"]:
+            value.update(example_of(sub_schema, items))
+        return value
+    if "properties" in schema:
+        return {name: example_of(sub_schema, items) for name, sub_schema in schema["properties"].items()}
+    if schema.get("type") == "array":
+        count = min(items, schema.get("maxItems", items))
+        return [example_of(schema.get("items", {}), items) for _ in range(count)]
+    if "enum" in schema:
+        return schema["enum"][0]
+    return schema.get("example", EXAMPLES.get(schema.get("type"), "text"))
+
+
+def body_schemas():
+    from connexion.spec import Specification
+    spec = Specification.load(PROJECT_DIR / "swagger.yaml")
+    for path, methods in spec["paths"].items():
+        for method, operation in methods.items():
+            for parameter in operation.get("parameters", []):
+                if parameter.get("in") == "body":
+                    yield operation["operationId"].rsplit(".", 1)[-1], parameter["schema"]
+
+
+def time_per_call(check, body, repeat):
+    bodies = [copy.deepcopy(body) for _ in range(repeat)]
+    started = time.perf_counter()
+    for each_body in bodies:
+        check(each_body)
+    return (time.perf_counter() - started) / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the body validation of connexion & of request_validation.")
+    parser.add_argument("--items", type=int, default=1000, help="items in the body of a batch operation")
+    parser.add_argument("--repeat", type=int, default=2000, help="bodies checked per operation & validator")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(PROJECT_DIR))
+    from connexion.json_schema import Draft4RequestValidator
+    from jsonschema import draft4_format_checker
+    import request_validation
+
+    print(f'{"operation":<26}{"jsonschema us":>15}{"compiled us":>13}{"speedup":>9}')
+    total_stock = total_compiled = 0.0
+    for operation_id, schema in body_schemas():
+        body = example_of(schema, args.items)
+        stock = Draft4RequestValidator(schema, format_checker=draft4_format_checker)
+        compiled = request_validation.compile_schema(schema)
+        stock.validate(body)
+        compiled(copy.deepcopy(body), ())
+
+        is_batch = isinstance(body, list)
+        repeat = max(1, args.repeat // args.items) if is_batch else args.repeat
+        stock_seconds = time_per_call(stock.validate, body, repeat)
+        compiled_seconds = time_per_call(lambda each_body: compiled(each_body, ()), body, repeat)
+        total_stock += stock_seconds
+        total_compiled += compiled_seconds
+        print(f'{operation_id:<26}{stock_seconds * 1e6:>15.1f}{compiled_seconds * 1e6:>13.1f}'
+              f'{stock_seconds / compiled_seconds:>8.1f}x')
+    print(f'\n{"all operations":<26}{total_stock * 1e6:>15.1f}{total_compiled * 1e6:>13.1f}'
+          f'{total_stock / total_compiled:>8.1f}x')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""
+A one-shot command to verify or rebuild the per-board task status counters
+(board_open_tasks, board_in_progress_tasks, board_complete_tasks)
+from the task table.
+
+    $ python3 board_counters.py --verify
+    $ python3 board_counters.py --rebuild
+"""
+import argparse
+import sys
+from app_config import app
+from resources import project_board_resource
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify or rebuild the board task status counters.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--verify", action="store_true", help="only report the mismatching boards (default)")
+    mode.add_argument("--rebuild", action="store_true", help="overwrite the mismatching counters")
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        mismatches = project_board_resource.rebuild_board_counters(rebuild=args.rebuild)
+
+    for mismatch in mismatches:
+        print(f'\tBoardId {mismatch["id"]}: stored {mismatch["stored"]}, actual {mismatch["actual"]}')
+    if not mismatches:
+        print("\tINFO: All board counters are correct.")
+    elif args.rebuild:
+        print(f'\tINFO: Rebuilt the counters of {len(mismatches)} board(s).')
+    # A verify run with mismatches fails, so it can gate a deploy
+    return 1 if mismatches and not args.rebuild else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
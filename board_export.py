@@ -0,0 +1,242 @@
+"""
+Streaming export of a board & its tasks.
+
+The tasks are read from the DB in chunks (yield_per), as plain column rows,
+& rendered record by record, so the memory used does not grow with the board size.
+The same renderers feed both the files written under `out/`
+and the streamed HTTP responses.
+
+Formats:
+    json  - The board with a "tasks" list (the original export layout)
+    jsonl - The board on the first line, followed by one task per line
+    csv   - One row per task
+    txt   - A human readable board, with the tasks grouped by status
+"""
+
+import csv
+import gzip
+import io
+import json
+import uuid
+import zlib
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import case
+from models import Task, TASK_STATUSES
+import read_models
+
+# Tasks fetched from the DB per round trip
+CHUNK_SIZE = 500
+
+# Text chunks are grouped up to this many characters before a write/yield
+FLUSH_SIZE = 64 * 1024
+
+CSV_COLUMNS = ["boardId", "taskId", "taskTitle", "taskDescription", "taskUserId", "taskStatus", "taskCreated"]
+
+# Format name: (file extension, mimetype)
+FORMATS = {
+    "json": ("json", "application/json"),
+    "jsonl": ("jsonl", "application/x-ndjson"),
+    "csv": ("csv", "text/csv"),
+    "txt": ("txt", "text/plain"),
+}
+
+
+"""
+A helper method to serialize a board into a JSON compatible dict, without its tasks.
+"""
+def board_record(board_obj):
+    board_dict = {}
+    board_dict["boardId"] = board_obj.id
+    board_dict["boardName"] = board_obj.board_name
+    board_dict["boardDescription"] = board_obj.board_desc
+    board_dict["boardTeamId"] = board_obj.board_team_id
+    board_dict["boardStatus"] = board_obj.board_status
+    board_dict["boardCreatedTime"] = str(board_obj.board_creation_time)
+    board_dict["boardClosedTime"] = str(board_obj.board_end_time)
+    return board_dict
+
+
+"""
+A helper method to serialize a task into a JSON compatible dict.
+"""
+def task_record(task_obj):
+    task_dict = {}
+    task_dict["taskId"] = task_obj.id
+    task_dict["taskTitle"] = task_obj.task_title
+    task_dict["taskDescription"] = task_obj.task_desc
+    task_dict["taskUserId"] = task_obj.task_user_id
+    task_dict["taskStatus"] = task_obj.task_status
+    task_dict["taskCreated"] = str(task_obj.task_creation_time)
+    return task_dict
+
+
+"""
+A generator of the tasks of a board, fetched CHUNK_SIZE rows at a time.
+:by_status: Order the tasks by status first, for the grouped text layout
+"""
+def iter_board_tasks(board_id, by_status=False):
+    tasks_query = read_models.tasks_query().filter(Task.task_board_id == board_id)
+    if by_status:
+        status_order = case({status: index for index, status in enumerate(TASK_STATUSES)},
+                            value=Task.task_status, else_=len(TASK_STATUSES))
+        tasks_query = tasks_query.order_by(status_order, Task.id)
+    else:
+        tasks_query = tasks_query.order_by(Task.id)
+    for task_obj in tasks_query.yield_per(CHUNK_SIZE):
+        yield task_record(task_obj)
+
+
+"""
+Renderers, each a generator of the text chunks of one format.
+"""
+def render_json(board_dict, tasks):
+    header = json.dumps(board_dict, indent=6)
+    yield header[:-2] + ',\n      "tasks": ['
+    separator = "\n"
+    for task_dict in tasks:
+        yield separator + "            " + json.dumps(task_dict)
+        separator = ",\n"
+    yield "\n      ]\n}\n"
+
+
+def render_jsonl(board_dict, tasks):
+    yield json.dumps(board_dict) + "\n"
+    for task_dict in tasks:
+        yield json.dumps(task_dict) + "\n"
+
+
+def render_csv(board_dict, tasks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for task_dict in tasks:
+        task_dict["boardId"] = board_dict["boardId"]
+        writer.writerow([task_dict[column] for column in CSV_COLUMNS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def render_txt(board_dict, tasks, status_counts=None):
+    width = 78
+    closed_time = board_dict["boardClosedTime"] if board_dict["boardClosedTime"] != "None" else "-"
+    title = f'Board #{board_dict["boardId"]}: {board_dict["boardName"]}'
+    status = f'[{board_dict["boardStatus"]}]'
+    yield "+" + "-" * (width - 2) + "+\n"
+    yield "| " + title.ljust(width - 5 - len(status)) + " " + status + " |\n"
+    yield "| " + (board_dict["boardDescription"] or "").ljust(width - 4) + " |\n"
+    yield "| " + f'Team #{board_dict["boardTeamId"]}'.ljust(width - 4) + " |\n"
+    yield "| " + f'Created {board_dict["boardCreatedTime"]}'.ljust(width - 4) + " |\n"
+    yield "| " + f'Closed  {closed_time}'.ljust(width - 4) + " |\n"
+    yield "+" + "-" * (width - 2) + "+\n"
+
+    # The tasks arrive ordered by status, a section header is written on each change
+    current_status = None
+    for task_dict in tasks:
+        if task_dict["taskStatus"] != current_status:
+            current_status = task_dict["taskStatus"]
+            count = f' ({status_counts[current_status]})' if status_counts and current_status in status_counts else ""
+            yield f'\n{current_status}{count}\n' + "=" * len(f'{current_status}{count}') + "\n"
+        yield f'  #{task_dict["taskId"]:<6} {task_dict["taskTitle"][:40]:<40} user #{task_dict["taskUserId"]:<6}\n'
+        if task_dict["taskDescription"]:
+            yield f'          {task_dict["taskDescription"]}\n'
+        yield f'          created {task_dict["taskCreated"]}\n'
+    if current_status is None:
+        yield "\n  (No tasks on this board)\n"
+
+
+"""
+A generator passing the tasks through, while reporting how many went by.
+"""
+def count_progress(tasks, progress):
+    done = 0
+    for task_dict in tasks:
+        yield task_dict
+        done += 1
+        if done % CHUNK_SIZE == 0:
+            progress(done)
+    progress(done)
+
+
+"""
+A generator of the text chunks of a board export, in the given format.
+Small pieces are grouped up to FLUSH_SIZE characters.
+:progress: Optional callable, given the number of tasks exported so far
+"""
+def render_board(board_obj, export_format, progress=None):
+    board_dict = board_record(board_obj)
+    tasks = iter_board_tasks(board_obj.id, by_status=(export_format == "txt"))
+    if progress is not None:
+        tasks = count_progress(tasks, progress)
+
+    if export_format == "txt":
+        status_counts = {"OPEN": board_obj.board_open_tasks,
+                         "IN_PROGRESS": board_obj.board_in_progress_tasks,
+                         "COMPLETE": board_obj.board_complete_tasks}
+        chunks = render_txt(board_dict, tasks, status_counts)
+    else:
+        renderer = {"json": render_json, "jsonl": render_jsonl, "csv": render_csv}[export_format]
+        chunks = renderer(board_dict, tasks)
+
+    pending = []
+    pending_size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= FLUSH_SIZE:
+            yield "".join(pending)
+            pending = []
+            pending_size = 0
+    if pending:
+        yield "".join(pending)
+
+
+"""
+A helper method to build a collision free name for an export file.
+"""
+def export_file_name(board_id, export_format, compress=False):
+    extension = FORMATS[export_format][0]
+    timestamp = datetime.now().strftime("%Y_%m_%d-%H_%M_%S_%f")
+    file_name = f'export_board_{board_id}_{timestamp}_{uuid.uuid4().hex[:8]}.{extension}'
+    return file_name + ".gz" if compress else file_name
+
+
+"""
+A method to export a board into a new file under `out_dir`, written chunk by chunk.
+:return: The name of the file created
+"""
+def write_board_export(board_obj, export_format="json", compress=False, out_dir=None, progress=None):
+    out_dir = Path(out_dir) if out_dir is not None else Path.cwd() / "out"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    file_name = export_file_name(board_obj.id, export_format, compress)
+
+    # The "x" mode refuses to overwrite, should a name ever repeat
+    opener = gzip.open if compress else open
+    with opener(out_dir / file_name, "xt", encoding="utf-8", newline="") as outfile:
+        for chunk in render_board(board_obj, export_format, progress):
+            outfile.write(chunk)
+    return file_name
+
+
+"""
+A generator of the bytes of a board export, for a streamed HTTP response.
+"""
+def stream_board_export(board_obj, export_format="json", compress=False):
+    compressor = zlib.compressobj(wbits=31) if compress else None   # wbits=31 writes the gzip container
+    for chunk in render_board(board_obj, export_format):
+        data = chunk.encode("utf-8")
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor is not None:
+        yield compressor.flush()
+
+
+"""
+A helper method to give the mimetype of an export.
+"""
+def export_mimetype(export_format, compress=False):
+    return "application/gzip" if compress else FORMATS[export_format][1]
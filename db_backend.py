@@ -0,0 +1,100 @@
+"""
+Backend specific fast paths of the write queries.
+
+The models & queries run unchanged on SQLite & PostgreSQL (picked with the
+DATABASE_URL environment variable, see config_profiles.py). Where a backend
+can do better, the helpers below use it:
+
+* PostgreSQL gives back the ids of a multi-row INSERT with RETURNING,
+  instead of a second query reading them back.
+* Both backends skip duplicate rows with INSERT ... ON CONFLICT DO NOTHING,
+  so two requests adding the same team member at once do not fail.
+* The bulk loader hands its rows straight to the driver, skipping the per row
+  parameter processing of SQLAlchemy, as multi-row VALUES lists on PostgreSQL.
+* PostgreSQL ids come from a sequence per table, which rows inserted with
+  their own ids, eg. by the bulk loader, leave behind.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql, sqlite
+from app_config import db
+
+# Rows per multi-row INSERT, well within the bound parameters' cap
+RETURNING_BATCH_SIZE = 500
+
+
+def dialect_name():
+    return db.engine.dialect.name
+
+
+"""
+A method to insert rows & give back the id of each, within the caller's transaction.
+:key_column: A unique column of the rows, the ids are keyed by its values
+:return: A dict {key: id}
+"""
+def insert_returning_ids(table, rows, key_column):
+    if dialect_name() == "postgresql":
+        new_ids = {}
+        for start in range(0, len(rows), RETURNING_BATCH_SIZE):
+            batch = rows[start:start + RETURNING_BATCH_SIZE]
+            result = db.session.execute(table.insert().values(batch).returning(table.c[key_column], table.c.id))
+            new_ids.update(result.all())
+        return new_ids
+
+    db.session.execute(table.insert(), rows)
+    keys = [row[key_column] for row in rows]
+    return dict(db.session.query(table.c[key_column], table.c.id).filter(table.c[key_column].in_(keys)))
+
+
+"""
+A method to insert rows, silently skipping the ones clashing with an existing row,
+within the caller's transaction.
+"""
+def insert_ignoring_duplicates(table, rows):
+    dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(dialect_name())
+    if dialect is None:
+        db.session.execute(table.insert(), rows)
+    else:
+        db.session.execute(dialect.insert(table).on_conflict_do_nothing(), rows)
+
+
+# The placeholder of a positional parameter, by DBAPI paramstyle
+PLACEHOLDERS = {"qmark": "?", "format": "%s", "pyformat": "%s"}
+
+
+"""
+A method to insert many rows with the driver's own executemany, within the caller's transaction.
+The rows are tuples of the driver's values for `columns`, eg. strings for SQLite dates
+(see TypeEngine.bind_processor). The columns left out get their server defaults,
+not their Python ones.
+"""
+def insert_many(table, columns, rows):
+    dialect = db.engine.dialect
+    preparer = dialect.identifier_preparer
+    statement = f'INSERT INTO {preparer.format_table(table)} ' \
+                f'({", ".join(preparer.quote(column) for column in columns)}) VALUES '
+    if dialect.name == "postgresql":
+        # psycopg2 sends the rows as multi-row VALUES lists, a round trip per page
+        from psycopg2.extras import execute_values
+        cursor = db.session.connection().connection.cursor()
+        execute_values(cursor, statement + "%s", rows, page_size=RETURNING_BATCH_SIZE)
+        cursor.close()
+    else:
+        placeholder = PLACEHOLDERS[dialect.paramstyle]
+        db.session.connection().exec_driver_sql(statement + f'({", ".join([placeholder] * len(columns))})', rows)
+
+
+"""
+A method to move the id sequences of the tables past their largest id,
+after rows were inserted with their own ids. Only PostgreSQL needs it,
+SQLite goes on from the largest id by itself.
+Note: The caller is responsible for the commit.
+"""
+def reset_id_sequences(tables):
+    if dialect_name() != "postgresql":
+        return
+    for table in tables:
+        table_name = db.engine.dialect.identifier_preparer.format_table(table)
+        db.session.execute(text(f"SELECT setval(pg_get_serial_sequence(:table_name, 'id'), "
+                                f"COALESCE(MAX(id), 0) + 1, false) FROM {table_name}"),
+                           {"table_name": table_name})
@@ -1,9 +1,18 @@
+import argparse
 import json
+import sys
+import time
 from pathlib import Path
-from app_config import db
+from sqlalchemy.engine import make_url
+from app_config import app, db
 from datetime import date
-from models import User, Team
+from models import User, Team, Board, Task, TASK_STATUSES, teams_m2m_users
 from resources import user_resource, team_resource, project_board_resource
+import db_backend
+import export_cache
+import migrations
+import synthetic_data
+import table_versions
 
 CURRENT_DIR = Path.cwd()
 
@@ -15,16 +24,28 @@ OUT_DIR = CURRENT_DIR / 'out'
 DB_DIR.mkdir(parents=True, exist_ok=True)
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-SQLITE_DB_FILE = DB_DIR / 'team_project_planner.db'
+# The DB of the selected config profile, a SQLite file unless DATABASE_URL points elsewhere
+DB_URL = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+SQLITE_DB_FILE = Path(DB_URL.database) if DB_URL.get_backend_name() == "sqlite" else None
 DATA_FILES = CURRENT_DIR / 'data_files/'
 
 
 def db_remove_old():
-    # Delete database file if it exists currently
-    SQLITE_DB_FILE.unlink(missing_ok=True)
+    # Delete database file if it exists currently, with its WAL files if any
+    if SQLITE_DB_FILE is not None:
+        SQLITE_DB_FILE.unlink(missing_ok=True)
+        for suffix in ("-wal", "-shm"):
+            Path(str(SQLITE_DB_FILE) + suffix).unlink(missing_ok=True)
+    else:
+        # Another database server, its tables are dropped instead
+        db.drop_all()
 
-    # Create the database
-    db.create_all()
+    # The cached exports belong to the old database
+    (OUT_DIR / export_cache.INDEX_FILE_NAME).unlink(missing_ok=True)
+
+    # Create the database at the latest schema.
+    # An existing DB is upgraded in place by `python3 migrations.py` instead.
+    migrations.upgrade()
 
 
 # ----------------ADDING NEW USERS------------------------------------------
@@ -123,4 +144,158 @@ def db_initialize():
     print("\tINFO: Successful DB initialization")
 
 
-db_initialize()
+#---------------------BULK LOADING-----------------------------------------------------------
+# The rows per executemany, each table being loaded in one transaction
+BULK_BATCH_SIZE = 20000
+
+# The table & the columns of the records' fields, of each table of a dataset (see synthetic_data.py)
+BULK_TABLES = {
+    "users": (User.__table__, {"id": "id", "name": "user_name", "display_name": "user_disp_name",
+                               "description": "user_desc"}),
+    "teams": (Team.__table__, {"id": "id", "name": "team_name", "description": "team_desc",
+                               "admin": "team_admin"}),
+    "team_users": (teams_m2m_users, {"team_id": "team_id", "user_id": "user_id"}),
+    "boards": (Board.__table__, {"id": "id", "name": "board_name", "description": "board_desc",
+                                 "team_id": "board_team_id"}),
+    "tasks": (Task.__table__, {"id": "id", "title": "task_title", "description": "task_desc",
+                               "board_id": "task_board_id", "user_id": "task_user_id", "status": "task_status"}),
+}
+
+"""
+A helper method to give the values of the columns of `table` left out of `columns`
+that have a Python default, eg. a creation time, computed once for the whole load.
+:return: A dict {column: value as the driver takes it}
+"""
+def default_values(table, columns):
+    dialect = db.engine.dialect
+    values = {}
+    for column in table.columns:
+        default = column.default
+        if column.name in columns or default is None or not (default.is_scalar or default.is_callable):
+            continue
+        value = default.arg(None) if default.is_callable else default.arg
+        processor = column.type.dialect_impl(dialect).bind_processor(dialect)
+        values[column.name] = processor(value) if processor else value
+    return values
+
+
+def batches(records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+"""
+A method to bulk insert the tables of a dataset into the empty DB, with the driver's
+executemany per `batch_size` records & a transaction per table. The hot path indexes
+are built once the rows are in, then the board counters & the table versions are set.
+
+:tables: A list of (table name, iterator of its records),
+    eg. from synthetic_data.SyntheticDataset.tables() or synthetic_data.read_jsonl()
+:return: A dict {table name: rows inserted}
+"""
+def bulk_load(tables, batch_size=BULK_BATCH_SIZE):
+    indexes = migrations.hot_path_indexes()
+    for index in indexes:
+        index.drop(bind=db.session.connection(), checkfirst=True)
+    db.session.commit()
+
+    counts = {}
+    for name, records in tables:
+        table, columns = BULK_TABLES[name]
+        fields = list(columns)
+        defaults = default_values(table, columns.values())
+        insert_columns = list(columns.values()) + list(defaults)
+        default_row = tuple(defaults.values())
+        started = time.perf_counter()
+        count = 0
+        for batch in batches(records, batch_size):
+            rows = [tuple([record.get(field) for field in fields]) + default_row for record in batch]
+            db_backend.insert_many(table, insert_columns, rows)
+            count += len(rows)
+        db.session.commit()
+        counts[name] = count
+        elapsed = time.perf_counter() - started
+        print(f'\tINFO: {count} {name} loaded in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} rows/s).')
+
+    started = time.perf_counter()
+    for index in indexes:
+        index.create(bind=db.session.connection(), checkfirst=True)
+    db.session.commit()
+    print(f'\tINFO: Indexes built in {time.perf_counter() - started:.1f}s.')
+
+    db_backend.reset_id_sequences([BULK_TABLES[name][0] for name in ("users", "teams", "boards", "tasks")])
+    table_versions.bump(*table_versions.TABLES)
+    db.session.commit()
+    project_board_resource.rebuild_board_counters(rebuild=True)
+    return counts
+
+
+"""
+A helper method to parse a status mix, eg. "OPEN=50,IN_PROGRESS=30,COMPLETE=20".
+"""
+def status_mix(text):
+    mix = {}
+    for part in text.split(","):
+        status, _, weight = part.partition("=")
+        status = status.strip().upper()
+        if status not in TASK_STATUSES or not weight.strip().isdigit():
+            raise argparse.ArgumentTypeError(f'expected STATUS=WEIGHT pairs of {", ".join(TASK_STATUSES)}')
+        mix[status] = int(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create the DB & load it with data.")
+    sources = parser.add_subparsers(dest="source", metavar="{sample,synthetic,jsonl}")
+    sources.add_parser("sample", help="the sample data of data_files/, through the resource functions (default)")
+
+    synthetic = sources.add_parser("synthetic", help="a generated dataset, bulk loaded")
+    synthetic.add_argument("--users", type=int, default=1000, help="users")
+    synthetic.add_argument("--teams", type=int, default=100, help="teams")
+    synthetic.add_argument("--team-size", type=int, default=synthetic_data.MAX_TEAM_SIZE, help="users per team")
+    synthetic.add_argument("--boards-per-team", type=int, default=5, help="boards per team")
+    synthetic.add_argument("--tasks-per-board", type=int, default=20, help="tasks per board")
+    synthetic.add_argument("--status-mix", type=status_mix, default=synthetic_data.DEFAULT_STATUS_MIX,
+                           help="weights of the task statuses, eg. OPEN=50,IN_PROGRESS=30,COMPLETE=20")
+    synthetic.add_argument("--seed", type=int, default=0, help="the same seed gives the same dataset")
+    synthetic.add_argument("--write-jsonl", metavar="DIR", help="write the dataset to DIR/*.jsonl instead of loading it")
+
+    jsonl = sources.add_parser("jsonl", help="a dataset of DIR/<table>.jsonl files, eg. from --write-jsonl, bulk loaded")
+    jsonl.add_argument("directory", metavar="DIR")
+    for source in (synthetic, jsonl):
+        source.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="rows per executemany")
+    args = parser.parse_args(argv)
+
+    if args.source in (None, "sample"):
+        db_initialize()
+        return 0
+
+    if args.source == "synthetic":
+        try:
+            dataset = synthetic_data.SyntheticDataset(args.users, args.teams, args.team_size, args.boards_per_team,
+                                                      args.tasks_per_board, args.status_mix, args.seed)
+        except ValueError as ve:
+            parser.error(str(ve))
+        if args.write_jsonl:
+            counts = synthetic_data.write_jsonl(dataset.tables(), args.write_jsonl)
+            print(f'\tINFO: Wrote {", ".join(f"{count} {name}" for name, count in counts.items())} to {args.write_jsonl}.')
+            return 0
+        tables = dataset.tables()
+    else:
+        tables = synthetic_data.read_jsonl(args.directory)
+
+    started = time.perf_counter()
+    db_remove_old()
+    counts = bulk_load(tables, args.batch_size)
+    print(f'\tINFO: Loaded {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s.')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
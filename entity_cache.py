@@ -0,0 +1,245 @@
+"""
+Read-through cache of single entities (users & teams) looked up by id.
+
+Nearly every operation first checks that the user or team it names exists,
+often more than once per request. The cache keeps the column values of
+the recently looked up entities, per process, in an LRU capped to
+ENTITY_CACHE_SIZE entries, each living at most ENTITY_CACHE_TTL seconds.
+A hit is turned back into an ORM object of the current session without
+any SELECT, so the callers can go on reading & updating it.
+
+Every write path changing a cached entity invalidates it once committed.
+A conditional read (see table_versions.conditional) reads the version of
+the entity's table first: an entry cached at another version of its table
+is a miss then, so its body & its ETag always come from the same state.
+With several server worker processes, an invalidation has to reach all
+of them: the "shared" backend keeps a version number per entity in a
+small memory mapped file, bumped on invalidation & checked on every hit.
+
+Backends (ENTITY_CACHE_BACKEND):
+    local  - Invalidations reach this process only (a single worker)
+    shared - Invalidations reach every process on the host (uWSGI workers)
+    none   - No caching, every lookup goes to the DB
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from flask import g, has_app_context
+from sqlalchemy.orm import make_transient_to_detached
+from app_config import app, db
+import queries
+
+try:
+    import fcntl
+except ImportError:     # Windows, where only the local backend applies
+    fcntl = None
+
+
+"""
+The local backend: entity versions never move, a cached entry stays valid
+until it expires or is invalidated in this process.
+"""
+class LocalBackend:
+    def version(self, kind, key):
+        return 0
+
+    def bump(self, kind, key):
+        pass
+
+
+"""
+The shared backend: a file of `slots` 8 byte version counters, mapped in
+memory by every process. An entity hashes to a slot, so reading its version
+costs no system call. Two entities sharing a slot only cost a spurious miss.
+"""
+class SharedBackend:
+    SLOT = struct.Struct("Q")
+
+    def __init__(self, path, slots=4096):
+        self.path = path
+        self.slots = slots
+        self.pid = None
+        self.fd = None
+        self.map = None
+        self.lock = threading.Lock()
+
+    """
+    A helper method to map the file, once per process: a flock taken on a
+    file descriptor inherited over fork() would be shared with the parent.
+    """
+    def mapped(self):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                    size = self.slots * self.SLOT.size
+                    if os.fstat(fd).st_size < size:
+                        os.ftruncate(fd, size)
+                    self.fd, self.map = fd, mmap.mmap(fd, size)
+                    self.pid = os.getpid()
+        return self.map
+
+    def offset(self, kind, key):
+        return zlib.crc32(f'{kind}:{key}'.encode()) % self.slots * self.SLOT.size
+
+    def version(self, kind, key):
+        return self.SLOT.unpack_from(self.mapped(), self.offset(kind, key))[0]
+
+    def bump(self, kind, key):
+        shared_map = self.mapped()
+        offset = self.offset(kind, key)
+        with self.lock:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                version = self.SLOT.unpack_from(shared_map, offset)[0]
+                self.SLOT.pack_into(shared_map, offset, (version + 1) % 2 ** 64)
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+
+"""
+An LRU + TTL cache of the column values of one model, keyed by primary key.
+"""
+class EntityCache:
+    def __init__(self, model, backend, max_size=1024, ttl=30.0):
+        self.model = model
+        self.kind = model.__tablename__
+        self.columns = [attr.key for attr in model.__mapper__.column_attrs]
+        self.backend = backend
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()    # key: (column values, expiry time, version, table version)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    """
+    A method to look up an entity, from the cache or else from the DB.
+    :return: The ORM object, attached to the current session, None if there is no such entity
+    """
+    def get(self, entity_id):
+        try:
+            key = int(entity_id)
+        except (TypeError, ValueError):
+            return queries.by_id(self.model, entity_id)
+
+        # The version of the table read by a conditional read, None otherwise
+        table_version = g.get("table_versions", {}).get(self.kind) if has_app_context() else None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > time.monotonic() \
+                    and entry[2] == self.backend.version(self.kind, key) \
+                    and (table_version is None or entry[3] == table_version):
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                entry = None
+                self.misses += 1
+        if entry is not None:
+            return self.attach(entry[0])
+
+        # The version is read before the SELECT, so a write committed meanwhile
+        # leaves the entry stale-versioned rather than stale-valued
+        version = self.backend.version(self.kind, key)
+        entity_obj = queries.by_id(self.model, key)
+        if entity_obj is not None:
+            values = {column: getattr(entity_obj, column) for column in self.columns}
+            with self.lock:
+                self.entries[key] = (values, time.monotonic() + self.ttl, version, table_version)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+        return entity_obj
+
+    """
+    A helper method to rebuild an ORM object from cached values, merged into the
+    session as already persistent, i.e without a SELECT.
+    """
+    def attach(self, values):
+        entity_obj = self.model(**values)
+        make_transient_to_detached(entity_obj)
+        return db.session.merge(entity_obj, load=False)
+
+    """
+    A method to drop an entity, in this process & through the backend in the others.
+    Note: Call it once the change is committed.
+    """
+    def invalidate(self, entity_id):
+        key = int(entity_id)
+        self.backend.bump(self.kind, key)
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+"""
+A cache doing nothing, for ENTITY_CACHE_BACKEND = "none".
+"""
+class NoCache:
+    def __init__(self, model):
+        self.model = model
+        self.misses = 0
+
+    def get(self, entity_id):
+        self.misses += 1
+        return queries.by_id(self.model, entity_id)
+
+    def invalidate(self, entity_id):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {"size": 0, "hits": 0, "misses": self.misses}
+
+
+_caches = {}
+_backend = None
+_caches_lock = threading.Lock()
+
+
+def make_backend():
+    if app.config["ENTITY_CACHE_BACKEND"] == "shared" and fcntl is not None:
+        return SharedBackend(app.config["ENTITY_CACHE_SHARED_FILE"])
+    return LocalBackend()
+
+
+"""
+A method to give the cache of a model, created on first use from the app config.
+"""
+def cache_for(model):
+    global _backend
+    cache = _caches.get(model)
+    if cache is None:
+        with _caches_lock:
+            if model not in _caches:
+                if app.config["ENTITY_CACHE_BACKEND"] == "none":
+                    _caches[model] = NoCache(model)
+                else:
+                    if _backend is None:
+                        _backend = make_backend()
+                    _caches[model] = EntityCache(model, _backend, app.config["ENTITY_CACHE_SIZE"],
+                                                 app.config["ENTITY_CACHE_TTL"])
+            cache = _caches[model]
+    return cache
+
+
+"""
+A method to give the hit/miss counters of every cache.
+"""
+def stats():
+    return {model.__tablename__: cache.stats() for model, cache in list(_caches.items())}
@@ -0,0 +1,195 @@
+"""
+Content-addressed cache of board exports.
+
+Each export is stored once under `out/`, named after the hash of its content,
+and indexed in `out/export_cache.json` by (board id, format, compression)
+along with the board status & revision it was produced from.
+
+* A CLOSED board can no longer change, so its cached export is served
+  straight from the index, without touching the DB.
+* An OPEN board is exported again only when its revision,
+  bumped by every write to its tasks, has moved since the cached export.
+
+The artifacts are capped to EXPORT_CACHE_MAX_BYTES in total,
+the least recently used ones are evicted first.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from app_config import app
+import board_export
+
+try:
+    import fcntl
+except ImportError:     # Windows, where only the in-process lock applies
+    fcntl = None
+
+INDEX_FILE_NAME = "export_cache.json"
+LOCK_FILE_NAME = "export_cache.lock"
+
+_lock = threading.Lock()
+
+
+def out_dir():
+    return Path.cwd() / "out"
+
+
+def cache_key(board_id, export_format, compress):
+    return f'{board_id}:{export_format}:{"gz" if compress else "plain"}'
+
+
+"""
+A helper context manager holding the cache lock, across threads & server worker processes.
+"""
+@contextmanager
+def locked():
+    out_dir().mkdir(parents=True, exist_ok=True)
+    with _lock:
+        with open(out_dir() / LOCK_FILE_NAME, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load_index():
+    try:
+        with open(out_dir() / INDEX_FILE_NAME) as json_file:
+            return json.load(json_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_index(index):
+    index_file = out_dir() / INDEX_FILE_NAME
+    tmp_file = index_file.with_suffix(f'.{uuid.uuid4().hex[:8]}.tmp')
+    with open(tmp_file, "w") as outfile:
+        json.dump(index, outfile)
+    os.replace(tmp_file, index_file)
+
+
+"""
+A helper method to give the cached artifact of an index entry,
+marking it as recently used.
+:return: The file name, None if the artifact is gone
+"""
+def touch_artifact(entry):
+    try:
+        os.utime(out_dir() / entry["file"])
+        return entry["file"]
+    except FileNotFoundError:
+        return None
+
+
+"""
+A method to look up the cached export of a CLOSED board, without any DB query.
+:return: The file name under out/, None if not cached
+"""
+def lookup_closed(board_id, export_format="json", compress=False):
+    entry = load_index().get(cache_key(board_id, export_format, compress))
+    if entry is not None and entry["board_status"] == "CLOSED":
+        return touch_artifact(entry)
+    return None
+
+
+"""
+A helper method to write an export to a temporary file, hashing its content on the way.
+:progress: Optional callable, given the number of tasks exported so far, see board_export.render_board
+:return: (temporary path, hex digest of the content)
+"""
+def write_hashed(board_obj, export_format, compress, progress=None):
+    tmp_path = out_dir() / f'.export_{uuid.uuid4().hex}.tmp'
+    content_hash = hashlib.sha256()
+    # mtime=0 keeps the gzip bytes the same for the same content
+    try:
+        with open(tmp_path, "xb") as raw_file:
+            outfile = gzip.GzipFile(fileobj=raw_file, mode="wb", mtime=0) if compress else raw_file
+            try:
+                for chunk in board_export.render_board(board_obj, export_format, progress):
+                    data = chunk.encode("utf-8")
+                    content_hash.update(data)
+                    outfile.write(data)
+            finally:
+                if compress:
+                    outfile.close()
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return tmp_path, content_hash.hexdigest()
+
+
+"""
+A helper method to evict the least recently used artifacts, until the cache fits its cap.
+The artifact named `keep` (the one just served) is never evicted.
+Note: The caller must hold the cache lock.
+"""
+def evict(index, keep):
+    artifacts = {}
+    for key, entry in list(index.items()):
+        try:
+            stat = os.stat(out_dir() / entry["file"])
+        except FileNotFoundError:
+            del index[key]          # Removed by hand, forget it
+            continue
+        artifacts.setdefault(entry["file"], [stat.st_mtime, stat.st_size, []])[2].append(key)
+
+    total_bytes = sum(size for (_, size, _) in artifacts.values())
+    for file_name, (_, size, keys) in sorted(artifacts.items(), key=lambda x: x[1][0]):
+        if total_bytes <= app.config["EXPORT_CACHE_MAX_BYTES"]:
+            break
+        if file_name == keep:
+            continue
+        (out_dir() / file_name).unlink(missing_ok=True)
+        total_bytes -= size
+        for key in keys:
+            del index[key]
+
+
+"""
+A method to export a board through the cache.
+The board is exported again only if its status or revision moved since the cached export.
+
+:progress: Optional callable, given the number of tasks exported so far
+:return: The file name under out/
+"""
+def export_board(board_obj, export_format="json", compress=False, progress=None):
+    key = cache_key(board_obj.id, export_format, compress)
+    with locked():
+        entry = load_index().get(key)
+    if entry is not None and entry["board_status"] == board_obj.board_status \
+            and entry["board_revision"] == board_obj.board_revision:
+        file_name = touch_artifact(entry)
+        if file_name is not None:
+            return file_name
+
+    tmp_path, content_hash = write_hashed(board_obj, export_format, compress, progress)
+    extension = board_export.FORMATS[export_format][0] + (".gz" if compress else "")
+    file_name = f'export_board_{board_obj.id}_{content_hash[:24]}.{extension}'
+
+    with locked():
+        # The same content may be cached already, under another revision
+        if (out_dir() / file_name).exists():
+            tmp_path.unlink()
+            os.utime(out_dir() / file_name)
+        else:
+            os.replace(tmp_path, out_dir() / file_name)
+        index = load_index()
+        # The export of an older revision is dropped, unless still in use
+        replaced = index.get(key)
+        if replaced is not None and replaced["file"] != file_name \
+                and not any(x["file"] == replaced["file"] for k, x in index.items() if k != key):
+            (out_dir() / replaced["file"]).unlink(missing_ok=True)
+        index[key] = {"file": file_name, "sha256": content_hash,
+                      "board_status": board_obj.board_status, "board_revision": board_obj.board_revision}
+        evict(index, keep=file_name)
+        save_index(index)
+    return file_name
@@ -0,0 +1,375 @@
+"""
+Background export jobs.
+
+An export is submitted as a job & run by a bounded pool of threads, or by
+tasks of the event loop in the async serving mode, so the request worker
+answers right away with the job id.
+The state of each job is kept in `out/jobs/<job_id>.json`,
+which lets any server worker report the status of any job.
+
+Job status: QUEUED -> RUNNING -> DONE / FAILED
+
+A job records the process running it: a QUEUED or RUNNING job whose process
+is gone, eg. a worker recycled or crashed, is reported as FAILED. The jobs
+finished over EXPORT_JOB_TTL seconds ago are swept along with the submission
+of new ones: their state, the archive of a team job & what a failed one left.
+The board exports of the cache (see export_cache.py) are left to its own cap.
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from app_config import app
+import async_serving
+import board_export
+import export_cache
+import queries
+
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# The pool is created on first use, so each server worker process gets its own
+_pool = None
+_lock = threading.Lock()
+_pending_count = 0
+_last_sweep = None
+
+# Seconds between two sweeps of the finished jobs by a process
+SWEEP_INTERVAL = 60
+
+# State of the jobs run by this process, guarded by _lock
+_jobs = {}
+_team_parts = {}
+
+
+def out_dir():
+    return Path.cwd() / "out"
+
+
+def jobs_dir():
+    return out_dir() / "jobs"
+
+
+def now():
+    return datetime.utcnow().isoformat(timespec="seconds") + "Z"
+
+
+"""
+A helper method to give the pool of export workers of this process.
+"""
+def get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=app.config["EXPORT_WORKERS"],
+                                       thread_name_prefix="export")
+        return _pool
+
+
+"""
+A helper method to run a pool task: by the pool of this process, or as a task
+of the event loop in the async serving mode, see async_serving.py.
+"""
+def start(function, *args):
+    if async_serving.in_event_loop():
+        async_serving.start_task(function, *args)
+    else:
+        get_pool().submit(function, *args)
+
+
+"""
+A helper method to reserve room for one more job.
+:return: False when the pending jobs' cap would be exceeded
+"""
+def reserve():
+    global _pending_count
+    with _lock:
+        if _pending_count >= app.config["EXPORT_MAX_PENDING_JOBS"]:
+            return False
+        _pending_count += 1
+        return True
+
+
+def release():
+    global _pending_count
+    with _lock:
+        _pending_count -= 1
+
+
+"""
+A helper method to save the state of a job, replacing the file atomically
+so a reader never sees a half written file.
+"""
+def save_job(job):
+    jobs_dir().mkdir(parents=True, exist_ok=True)
+    job_file = jobs_dir() / f'{job["id"]}.json'
+    tmp_file = job_file.with_suffix(f'.{threading.get_ident()}.tmp')
+    with open(tmp_file, "w") as outfile:
+        json.dump(job, outfile)
+    os.replace(tmp_file, job_file)
+
+
+"""
+A helper method to update some fields of a job run by this process & save it.
+"""
+def update_job(job_id, **fields):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+            save_job(job)
+
+
+"""
+A helper method to save the final state of a job, which this process stops tracking.
+"""
+def finish_job(job_id, **fields):
+    with _lock:
+        job = _jobs.pop(job_id, None)
+        if job is not None:
+            job.update(fields, finished=now())
+            save_job(job)
+
+
+def new_job(kind, **fields):
+    job = {"id": uuid.uuid4().hex, "kind": kind, "pid": os.getpid(), "status": "QUEUED", "submitted": now(),
+           "started": None, "finished": None, "progress": None, "out_file": None, "error": None}
+    job.update(fields)
+    with _lock:
+        _jobs[job["id"]] = job
+        save_job(job)
+    return dict(job)
+
+
+"""
+A helper method to tell whether a process of this host is still running.
+"""
+def process_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":     # No signal 0 on Windows, the process is assumed running
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+"""
+A helper method to give the state of a job read from its file,
+a QUEUED or RUNNING job whose process is gone turned FAILED.
+"""
+def job_state(job):
+    if job["status"] in ("QUEUED", "RUNNING") and job.get("pid") is not None and not process_alive(job["pid"]):
+        job.update(status="FAILED", error=f'The server worker running the job (pid {job["pid"]}) stopped.')
+    return job
+
+
+def load_job(job_file):
+    try:
+        with open(job_file) as json_file:
+            return job_state(json.load(json_file))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+"""
+A method to get the state of a job, which may be run by any server worker.
+:return: The job as a dict, None if there is no such job
+"""
+def get_job(job_id):
+    if not isinstance(job_id, str) or not JOB_ID_PATTERN.match(job_id):
+        return None
+    return load_job(jobs_dir() / f'{job_id}.json')
+
+
+"""
+A method to remove the jobs finished over EXPORT_JOB_TTL seconds ago, by the time of
+their last save, with the archive of a team job, the work dir of a failed one &
+the state files left half written. None keeps them all.
+Note: Run by the submissions, at most once per SWEEP_INTERVAL in a process.
+"""
+def sweep_jobs():
+    global _last_sweep
+    ttl = app.config["EXPORT_JOB_TTL"]
+    with _lock:
+        if ttl is None or (_last_sweep is not None and time.monotonic() - _last_sweep < SWEEP_INTERVAL):
+            return
+        _last_sweep = time.monotonic()
+
+    expired = time.time() - ttl
+    for path in jobs_dir().glob("*.tmp"):
+        try:
+            if path.stat().st_mtime < expired:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+    for job_file in jobs_dir().glob("*.json"):
+        try:
+            if job_file.stat().st_mtime >= expired:
+                continue
+        except FileNotFoundError:
+            continue
+        job = load_job(job_file)
+        if job is None or job["status"] not in ("DONE", "FAILED"):
+            continue
+        if job["kind"] == "team" and job["out_file"]:
+            result_path(job).unlink(missing_ok=True)
+        shutil.rmtree(jobs_dir() / job["id"], ignore_errors=True)
+        job_file.unlink(missing_ok=True)
+
+
+"""
+A method to give the path of the file produced by a finished job.
+"""
+def result_path(job):
+    return out_dir() / job["out_file"]
+
+
+"""
+A helper method to export one board inside an app context.
+:return: The name of the file created
+"""
+def export_one_board(board_id, export_format, compress, target_dir, progress=None):
+    with app.app_context():
+        board_obj = queries.board_row(board_id)
+        if board_obj is None:
+            raise LookupError(f'BoardId {board_id} does not exits.')
+        return board_export.write_board_export(board_obj, export_format, compress, target_dir, progress)
+
+
+def run_board_job(job_id, board_id, export_format, compress, total_tasks):
+    try:
+        update_job(job_id, status="RUNNING", started=now(), progress={"done": 0, "total": total_tasks})
+        file_name = export_cache.lookup_closed(board_id, export_format, compress)
+        if file_name is None:
+            with app.app_context():
+                board_obj = queries.board_row(board_id)
+                if board_obj is None:
+                    raise LookupError(f'BoardId {board_id} does not exits.')
+                file_name = export_cache.export_board(
+                    board_obj, export_format, compress,
+                    lambda done: update_job(job_id, progress={"done": done, "total": total_tasks}))
+        update_job(job_id, progress={"done": total_tasks, "total": total_tasks})
+        finish_job(job_id, status="DONE", out_file=file_name)
+    except Exception as e:
+        finish_job(job_id, status="FAILED", error=str(e))
+    finally:
+        release()
+
+
+"""
+A method to submit the export of a board.
+:return: The job as a dict, None if too many jobs are pending already
+"""
+def submit_board_export(board_id, export_format="json", compress=False, total_tasks=None):
+    sweep_jobs()
+    if not reserve():
+        return None
+    job = new_job("board", board_id=board_id, format=export_format, compress=compress)
+    start(run_board_job, job["id"], board_id, export_format, compress, total_tasks)
+    return job
+
+
+"""
+A helper method to zip the board exports of a team job into one archive.
+"""
+def build_team_archive(job_id, team_id, work_dir, file_names):
+    archive_name = f'export_team_{team_id}_{datetime.now().strftime("%Y_%m_%d-%H_%M_%S_%f")}_{uuid.uuid4().hex[:8]}.zip'
+    with zipfile.ZipFile(out_dir() / archive_name, "x", compression=zipfile.ZIP_DEFLATED) as archive:
+        for file_name in file_names:
+            archive.write(work_dir / file_name, arcname=file_name)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return archive_name
+
+
+"""
+A pool task exporting one board of a team job, then starting the task of its next board left.
+The task finishing last builds the archive, so no pool thread sits waiting on the others.
+"""
+def run_team_board(job_id, team_id, board_id, export_format, compress, work_dir):
+    is_last = False
+    try:
+        with _lock:
+            parts = _team_parts[job_id]
+            if _jobs[job_id]["status"] == "QUEUED":
+                _jobs[job_id].update(status="RUNNING", started=now())
+        try:
+            file_name, error = export_one_board(board_id, export_format, compress, work_dir), None
+        except Exception as e:
+            file_name, error = None, f'BoardId {board_id}: {e}'
+
+        with _lock:
+            parts["remaining"] -= 1
+            if file_name is not None:
+                parts["files"].append(file_name)
+            if error is not None:
+                parts["errors"].append(error)
+            is_last = parts["remaining"] == 0
+            if is_last:
+                _team_parts.pop(job_id)
+            next_board_id = parts["boards"].pop(0) if parts["boards"] else None
+            job = _jobs[job_id]
+            job["progress"] = {"done": job["progress"]["done"] + 1, "total": job["progress"]["total"]}
+            save_job(job)
+
+        if next_board_id is not None:
+            start(run_team_board, job_id, team_id, next_board_id, export_format, compress, work_dir)
+        if is_last:
+            if parts["errors"]:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                finish_job(job_id, status="FAILED", error="; ".join(parts["errors"]))
+            else:
+                archive_name = build_team_archive(job_id, team_id, work_dir, sorted(parts["files"]))
+                finish_job(job_id, status="DONE", out_file=archive_name)
+    except Exception as e:
+        # The job ends here, unless it was ended already by another of its tasks
+        with _lock:
+            is_last = is_last or _team_parts.pop(job_id, None) is not None
+        if is_last:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            finish_job(job_id, status="FAILED", error=str(e))
+    finally:
+        if is_last:
+            release()
+
+
+"""
+A method to submit the export of every board of a team into one zip archive.
+The job counts as one pending job: its boards are exported by up to EXPORT_WORKERS
+pool tasks at once, each one starting the export of the next board when done.
+:return: The job as a dict, None if too many jobs are pending already
+"""
+def submit_team_export(team_id, board_ids, export_format="json", compress=False):
+    sweep_jobs()
+    if not reserve():
+        return None
+    job = new_job("team", team_id=team_id, format=export_format, compress=compress,
+                  progress={"done": 0, "total": len(board_ids)})
+    work_dir = jobs_dir() / job["id"]
+    work_dir.mkdir(parents=True)
+
+    if not board_ids:
+        try:
+            archive_name = build_team_archive(job["id"], team_id, work_dir, [])
+            finish_job(job["id"], status="DONE", started=now(), out_file=archive_name)
+        finally:
+            release()
+        return job
+
+    first_board_ids, next_board_ids = board_ids[:app.config["EXPORT_WORKERS"]], board_ids[app.config["EXPORT_WORKERS"]:]
+    with _lock:
+        _team_parts[job["id"]] = {"boards": list(next_board_ids), "remaining": len(board_ids), "files": [], "errors": []}
+    for board_id in first_board_ids:
+        start(run_team_board, job["id"], team_id, board_id, export_format, compress, work_dir)
+    return job
@@ -0,0 +1,25 @@
+"""
+gunicorn settings of the prefork serving, like uwsgi.ini:
+    $ gunicorn wsgi:app
+
+The app is loaded once in the master, then forked into the workers, which
+share its memory copy on write. Python's fork hooks set up by prefork.py
+empty the master's connection pool before each fork, and fill each worker's after it.
+"""
+
+import multiprocessing
+import os
+
+# The prod config profile, unless PLANNER_PROFILE is set already
+os.environ.setdefault("PLANNER_PROFILE", "prod")
+
+bind = f'0.0.0.0:{os.environ.get("PORT", "8000")}'
+preload_app = True
+
+# A worker per CPU core, each with 2 threads, unless set by WEB_CONCURRENCY & WEB_THREADS
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.environ.get("WEB_THREADS", 2))
+
+# Recycle a worker after so many requests, forking it again from the master's copy of the app
+max_requests = 10000
+max_requests_jitter = 1000
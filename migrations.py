@@ -0,0 +1,191 @@
+"""
+Schema migrations of the DB, applied in order & recorded in the schema_version table.
+
+* A new DB gets the tables of models.py at once, with every migration recorded as applied.
+* A DB created before the migrations, i.e without a schema_version table, is taken
+  to be at the original schema (version 1) & brought up to date keeping its data.
+
+Each migration checks what already exists before changing it,
+so one interrupted half-way is simply run again.
+
+    $ python3 migrations.py             # apply the pending migrations
+    $ python3 migrations.py --status    # list the applied & pending ones
+"""
+import argparse
+import sys
+from datetime import datetime
+from sqlalchemy import func, inspect, select
+from sqlalchemy.schema import CreateColumn
+from app_config import app, db
+from models import Board, Task, TableVersion
+import table_versions
+
+schema_version = db.Table(
+    'schema_version',
+    db.Column('version', db.Integer, primary_key=True, autoincrement=False),
+    db.Column('description', db.String(128), nullable=False),
+    db.Column('applied_at', db.DateTime, default=datetime.utcnow)
+)
+
+# The schema of the first release: user, team, teams_users, board & task
+BASELINE_VERSION = 1
+
+
+"""
+A helper method to add a column of models.py to its existing table.
+The column's server default fills in the existing rows.
+"""
+def add_column(connection, column):
+    table_name = connection.dialect.identifier_preparer.format_table(column.table)
+    column_ddl = CreateColumn(column).compile(dialect=connection.dialect)
+    connection.exec_driver_sql(f'ALTER TABLE {table_name} ADD COLUMN {column_ddl}')
+
+
+"""
+Migration 2: the task status counters & the revision of the boards,
+counted from the task table.
+"""
+def add_board_counters(connection):
+    board_table, task_table = Board.__table__, Task.__table__
+    counter_columns = {"OPEN": "board_open_tasks",
+                       "IN_PROGRESS": "board_in_progress_tasks",
+                       "COMPLETE": "board_complete_tasks"}
+    existing = {column["name"] for column in inspect(connection).get_columns("board")}
+    missing = [name for name in list(counter_columns.values()) + ["board_revision"] if name not in existing]
+    for name in missing:
+        add_column(connection, board_table.c[name])
+
+    if missing:
+        counts = {column: select(func.count(task_table.c.id))
+                              .where(task_table.c.task_board_id == board_table.c.id)
+                              .where(task_table.c.task_status == status)
+                              .scalar_subquery()
+                  for status, column in counter_columns.items()}
+        connection.execute(board_table.update().values(**counts))
+
+
+"""
+Migration 3: the version counters of the tables, see table_versions.py
+"""
+def add_table_versions(connection):
+    TableVersion.__table__.create(bind=connection, checkfirst=True)
+    table_versions.ensure_rows()
+
+
+# The indexes of the hot queries, declared in models.py
+HOT_PATH_INDEXES = (
+    "ix_task_task_board_id_task_status",      # the tasks of a board, close_board & board_summary
+    "ix_task_task_user_id",                   # the tasks of a user
+    "ix_board_board_team_id",                 # list_boards & export_team_boards
+    "ix_teams_users_team_id_user_id",         # list_team_users & the membership checks
+)
+
+
+def hot_path_indexes():
+    indexes = {index.name: index for table in db.metadata.sorted_tables for index in table.indexes}
+    return [indexes[name] for name in HOT_PATH_INDEXES]
+
+
+"""
+Migration 4: the indexes of the hot queries.
+"""
+def add_hot_path_indexes(connection):
+    for index in hot_path_indexes():
+        index.create(bind=connection, checkfirst=True)
+
+
+# (version, description, method), in order
+MIGRATIONS = [
+    (2, "Task status counters & revision of the boards", add_board_counters),
+    (3, "Version counters of the tables", add_table_versions),
+    (4, "Indexes of the hot queries", add_hot_path_indexes),
+]
+
+HEAD_VERSION = MIGRATIONS[-1][0]
+
+
+def applied_versions():
+    connection = db.session.connection()
+    if not inspect(connection).has_table(schema_version.name):
+        return set()
+    return {version for (version,) in connection.execute(select(schema_version.c.version))}
+
+
+def record_version(version, description):
+    db.session.execute(schema_version.insert().values(version=version, description=description))
+
+
+"""
+A method to bring the DB schema up to `target`, the latest version by default.
+Each migration is committed on its own.
+Note: Call it within an app context.
+:return: A list of the versions applied
+"""
+def upgrade(target=HEAD_VERSION):
+    connection = db.session.connection()
+    applied = applied_versions()
+    if not applied:
+        if not inspect(connection).has_table(Task.__tablename__):
+            # A new DB, created straight at the latest schema
+            db.metadata.create_all(bind=connection)
+            record_version(BASELINE_VERSION, "Initial schema")
+            for version, description, migrate in MIGRATIONS:
+                record_version(version, description)
+            table_versions.ensure_rows()
+            db.session.commit()
+            return [BASELINE_VERSION] + [version for version, description, migrate in MIGRATIONS]
+
+        schema_version.create(bind=connection, checkfirst=True)
+        record_version(BASELINE_VERSION, "Initial schema")
+        db.session.commit()
+
+    done = []
+    for version, description, migrate in MIGRATIONS:
+        if version in applied or version > target:
+            continue
+        try:
+            migrate(db.session.connection())
+            record_version(version, description)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        done.append(version)
+    return done
+
+
+"""
+A method to list the migrations with their state.
+:return: A list of (version, description, applied_at or None if pending)
+"""
+def status():
+    applied = {}
+    if applied_versions():
+        applied = dict(db.session.execute(select(schema_version.c.version, schema_version.c.applied_at)).all())
+    versions = [(BASELINE_VERSION, "Initial schema")] + [(version, description) for version, description, migrate in MIGRATIONS]
+    return [(version, description, applied.get(version)) for version, description in versions]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply the pending schema migrations of the DB.")
+    parser.add_argument("--status", action="store_true", help="only list the applied & pending migrations")
+    parser.add_argument("--target", type=int, default=HEAD_VERSION, help="the version to migrate up to")
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        if args.status:
+            for version, description, applied_at in status():
+                state = f'applied {applied_at:%Y-%m-%d %H:%M:%S}' if applied_at else "pending"
+                print(f'\t{version:>3}  {description:<50} {state}')
+            return 0
+
+        done = upgrade(args.target)
+    for version in done:
+        print(f'\tINFO: Applied migration {version}.')
+    if not done:
+        print("\tINFO: The DB schema is up to date.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
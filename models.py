@@ -21,7 +21,9 @@ class User(db.Model):
 teams_m2m_users = db.Table(
     'teams_users',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
-    db.Column('team_id', db.Integer, db.ForeignKey('team.id'), primary_key=True)
+    db.Column('team_id', db.Integer, db.ForeignKey('team.id'), primary_key=True),
+    # The primary key serves the lookups by user, this index the ones by team
+    db.Index('ix_teams_users_team_id_user_id', 'team_id', 'user_id')
 )
 
 # -------TEAM MODEL-------------------------
@@ -33,14 +35,16 @@ class Team(db.Model):
     team_admin = db.Column(db.Integer, nullable=False)
     team_creation_time = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # The collections below are never loaded implicitly (lazy='raise'),
+    # a query needing them asks for them, eg. with selectinload(Team.team_users).
+
     # defining the one to many relationship on Board
-    team_boards = db.relationship('Board', backref='team', lazy=True)
+    team_boards = db.relationship('Board', backref='team', lazy='raise')
     
     # defining the many to many relationship on User
-    team_users = db.relationship('User', secondary=teams_m2m_users, lazy='subquery', backref=db.backref('team', lazy=True))
+    team_users = db.relationship('User', secondary=teams_m2m_users, lazy='raise', backref=db.backref('team', lazy='raise'))
     
     def __repr__(self):
-        print(f'Users of Team: {self.team_users}')
         return f"[{self.id},\t{self.team_name},\t{self.team_desc},\t{self.team_admin},\t{self.team_creation_time}"
 
 
@@ -52,19 +56,33 @@ class Board(db.Model):
     board_desc = db.Column(db.String(128))
 
     # A ForeignKey from Team
-    board_team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=False)
+    board_team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=False, index=True)
 
-    # defining the one to many relationship on Task
-    board_tasks = db.relationship('Task', backref='board', lazy=True)
+    # defining the one to many relationship on Task, never loaded implicitly
+    board_tasks = db.relationship('Task', backref='board', lazy='raise')
 
     board_status = db.Column(db.String(12), default="OPEN")
     board_creation_time = db.Column(db.DateTime, default=datetime.utcnow)
-    board_end_time = db.Column(db.DateTime, onupdate=datetime.utcnow)
+    board_end_time = db.Column(db.DateTime)
+
+    # Rollup of the board's tasks by status, kept in step by every task write
+    board_open_tasks = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    board_in_progress_tasks = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    board_complete_tasks = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    # Bumped along with the counters, i.e on every change to the board's tasks
+    board_revision = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
 
 # -------TASK MODEL-------------------------
+TASK_STATUSES = ["OPEN", "IN_PROGRESS", "COMPLETE"]
+
+
 class Task(db.Model):
     __tablename__ = "task"
+    # Serves the lookups by board alone too, eg. the tasks of a board
+    __table_args__ = (db.Index('ix_task_task_board_id_task_status', 'task_board_id', 'task_status'),)
+
     id = db.Column(db.Integer, primary_key=True)
     task_title = db.Column(db.String(64), unique=True, nullable=False)
     task_desc = db.Column(db.String(128))
@@ -72,7 +90,15 @@ class Task(db.Model):
     # A ForeignKey from Board
     task_board_id = db.Column(db.Integer, db.ForeignKey('board.id'), nullable=False)
 
-    task_user_id = db.Column(db.Integer, nullable=False)
+    task_user_id = db.Column(db.Integer, nullable=False, index=True)
 
     task_status = db.Column(db.String(12), default="OPEN")
     task_creation_time = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# -------TABLE VERSION MODEL-------------------------
+# A counter per table, bumped by every write to it (see table_versions.py)
+class TableVersion(db.Model):
+    __tablename__ = "table_version"
+    table_name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
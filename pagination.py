@@ -0,0 +1,85 @@
+"""
+Keyset (cursor) pagination helpers shared by the list endpoints.
+
+A page is selected with `WHERE <id> > after_id ORDER BY <id> LIMIT n`,
+so fetching page 1000 costs the same as fetching page 1.
+The `next_cursor` handed back to clients is an opaque token
+which is passed back unchanged to fetch the following page.
+"""
+
+import base64
+import binascii
+import json
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+"""
+A helper method to encode the last seen id into an opaque cursor.
+"""
+def encode_cursor(last_id):
+    raw = json.dumps({"after_id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+"""
+A helper method to decode an opaque cursor back to the last seen id.
+:raises: ValueError if the cursor is malformed
+"""
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        after_id = json.loads(base64.urlsafe_b64decode(padded.encode())).get("after_id")
+        return int(after_id)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError,
+            AttributeError, TypeError, ValueError):
+        raise ValueError(f'Invalid cursor {cursor!r}.')
+
+
+"""
+A helper method to resolve the page window from the request.
+`cursor` takes precedence over a plain `after_id`.
+The after_id & the limit come as integers, coerced by the request validation.
+
+:return: (after_id, limit) if valid, else an error message
+"""
+def page_window(after_id=None, cursor=None, limit=None):
+    if cursor:
+        try:
+            after_id = decode_cursor(cursor)
+        except ValueError as ve:
+            return str(ve)
+    if limit is not None and limit < 1:
+        return "limit should be a positive number."
+    return after_id, limit
+
+
+"""
+A method to fetch a single page of a query using the primary key as the keyset.
+One extra row is fetched to find out whether a next page exists.
+
+:return: (rows, next_cursor), next_cursor is None on the last page
+"""
+def paginate(query, id_column, after_id=None, limit=None):
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    query = query.order_by(id_column)
+    if limit is None:
+        return query.all(), None
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1].id)
+    return rows, None
+
+
+"""
+A helper method to build the response of a paginated endpoint.
+The next cursor travels in a header, so the body stays a plain list.
+"""
+def page_response(items, next_cursor, status=200):
+    if next_cursor is None:
+        return items, status
+    return items, status, {NEXT_CURSOR_HEADER: next_cursor}
@@ -0,0 +1,72 @@
+"""
+Fork safety of the DB connections, for the prefork serving of uwsgi.ini & gunicorn.conf.py.
+
+The app is loaded once, in the master process of the server, then forked
+into the worker processes, which share its memory copy on write. A pooled
+DB connection must not cross a fork though: two processes would then talk
+over the same socket, or SQLite file handle. So:
+
+    before a fork   The master empties its pool. uWSGI forks from C, without
+                    running Python's before-fork hooks: its master empties
+                    the pool at the end of the startup instead
+    after a fork    Each worker disposes of the pool it inherited, to start
+                    with a new one, and fills it (uWSGI runs this hook with
+                    py-call-osafterfork)
+    on checkout     A connection opened by another process, should one cross
+                    a fork anyway, is dropped unclosed & replaced
+"""
+
+import os
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+from app_config import db
+
+try:
+    import uwsgi
+except ImportError:     # Not running under uWSGI
+    uwsgi = None
+
+
+"""
+A helper method to open the connections of the pool, which keeps them for the requests.
+"""
+def fill_pool(engine):
+    if isinstance(engine.pool, QueuePool):
+        connections = [engine.connect() for _ in range(engine.pool.size())]
+        for connection in connections:
+            connection.close()
+
+
+def record_pid(dbapi_connection, connection_record):
+    connection_record.info["pid"] = os.getpid()
+
+
+def check_pid(dbapi_connection, connection_record, connection_proxy):
+    pid = connection_record.info.get("pid")
+    if pid is not None and pid != os.getpid():
+        # Closing it would close the socket of the process which opened it
+        connection_record.dbapi_connection = connection_proxy.dbapi_connection = None
+        raise exc.DisconnectionError(f'Connection opened by process {pid}, checked out by process {os.getpid()}')
+
+
+def after_fork_in_child(engine):
+    engine.dispose()
+    fill_pool(engine)
+
+
+"""
+A method to make the DB connections of the Flask `app` safe to fork, once it is started.
+The pool is filled, unless the master of uWSGI is about to fork the workers.
+"""
+def init_app(app):
+    with app.app_context():
+        engine = db.engine
+    if not event.contains(engine, "checkout", check_pid):
+        event.listen(engine, "connect", record_pid)
+        event.listen(engine, "checkout", check_pid)
+        os.register_at_fork(before=engine.dispose, after_in_child=lambda: after_fork_in_child(engine))
+
+    if uwsgi is not None:
+        engine.dispose()
+    else:
+        fill_pool(engine)
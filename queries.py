@@ -0,0 +1,155 @@
+"""
+Prebuilt statements of the hot lookups, shared by the resource modules.
+
+The same few queries run on every request: a user, team, board or task by
+its id, the membership checks of a team, the teams of a user & the users
+of a team. Built with the query API, each call constructs a new statement
+& derives its cache key before the compiled SQL is found in the cache.
+The statements below are built once, with bound parameters for the values
+of each call: the cache key of a statement object is memoized, so a call
+goes straight to the compiled SQL.
+
+Note: SQLAlchemy's lambda statements (lambda_stmt) skip the building too,
+but analyzing the lambda's closure on every call made them slower than the
+plain query API on these small lookups.
+
+warm_up() runs each of them once at startup, so the first requests do not
+pay for the compiling.
+"""
+
+from sqlalchemy import bindparam, func, inspect, select
+from app_config import db
+from models import Board, Task, Team, TableVersion, User, teams_m2m_users
+import pagination
+import read_models
+
+
+ENTITY_BY_ID = {model: select(model).where(model.id == bindparam("entity_id"))
+                for model in (User, Team, Board, Task)}
+
+COUNT_TEAM_USERS = select(func.count(teams_m2m_users.c.user_id)) \
+                          .where(teams_m2m_users.c.team_id == bindparam("team_id"))
+
+# The users among a set of ids, each with the team id if a member of the team, else NULL
+TEAM_CANDIDATES = select(User.id, teams_m2m_users.c.team_id) \
+                         .outerjoin(teams_m2m_users, (teams_m2m_users.c.user_id == User.id)
+                                                     & (teams_m2m_users.c.team_id == bindparam("team_id"))) \
+                         .where(User.id.in_(bindparam("user_ids", expanding=True)))
+
+TABLE_VERSIONS = select(TableVersion.table_name, TableVersion.version) \
+                        .where(TableVersion.table_name.in_(bindparam("tables", expanding=True)))
+
+BOARD_ROW = select(*read_models.BOARD_COLUMNS).where(Board.id == bindparam("board_id"))
+
+
+"""
+A helper method to build the statements of a keyset paginated query,
+one per combination of an after_id & a limit being given, see page().
+:return: A dict {(after_id given, limit given): statement}
+"""
+def page_statements(stmt, id_column):
+    statements = {}
+    for has_after_id in (False, True):
+        for has_limit in (False, True):
+            page_stmt = stmt.where(id_column > bindparam("after_id")) if has_after_id else stmt
+            page_stmt = page_stmt.order_by(id_column)
+            if has_limit:
+                page_stmt = page_stmt.limit(bindparam("fetch"))
+            statements[(has_after_id, has_limit)] = page_stmt
+    return statements
+
+
+TEAM_USERS_PAGE = page_statements(select(*read_models.USER_COLUMNS)
+                                  .join(teams_m2m_users, teams_m2m_users.c.user_id == User.id)
+                                  .where(teams_m2m_users.c.team_id == bindparam("team_id")), User.id)
+
+USER_TEAMS_PAGE = page_statements(select(*read_models.TEAM_COLUMNS)
+                                  .join(teams_m2m_users, teams_m2m_users.c.team_id == Team.id)
+                                  .where(teams_m2m_users.c.user_id == bindparam("user_id")), Team.id)
+
+
+"""
+A method to look up an entity by its id.
+:return: The ORM object, None if there is no such entity
+"""
+def by_id(model, entity_id):
+    return db.session.execute(ENTITY_BY_ID[model], {"entity_id": entity_id}).scalar_one_or_none()
+
+
+def count_team_users(team_id):
+    return db.session.execute(COUNT_TEAM_USERS, {"team_id": team_id}).scalar()
+
+
+"""
+A method to look up a set of users along with their membership of a team.
+:return: A list of (user_id, team_id or None if not a member), for the existing users
+"""
+def team_candidates(team_id, user_ids):
+    return db.session.execute(TEAM_CANDIDATES, {"team_id": team_id, "user_ids": list(user_ids)}).all()
+
+
+"""
+A method to read the versions of some tables.
+:return: A list of (table_name, version)
+"""
+def table_version_rows(tables):
+    return db.session.execute(TABLE_VERSIONS, {"tables": list(tables)}).all()
+
+
+"""
+A method to read a single board, with the columns needed to export it.
+:return: The board row, None if there is no such board
+"""
+def board_row(board_id):
+    return db.session.execute(BOARD_ROW, {"board_id": board_id}).one_or_none()
+
+
+"""
+A method to fetch a page of the users of a team, as column-only rows.
+:return: (rows, next_cursor), next_cursor is None on the last page
+"""
+def team_users_page(team_id, after_id=None, limit=None):
+    return page(TEAM_USERS_PAGE, {"team_id": team_id}, after_id, limit)
+
+
+"""
+A method to fetch a page of the teams of a user, as column-only rows.
+:return: (rows, next_cursor), next_cursor is None on the last page
+"""
+def user_teams_page(user_id, after_id=None, limit=None):
+    return page(USER_TEAMS_PAGE, {"user_id": user_id}, after_id, limit)
+
+
+"""
+A helper method to fetch a page of one of the page_statements(), keyset
+paginated like pagination.paginate: one extra row tells whether a next page exists.
+"""
+def page(statements, params, after_id=None, limit=None):
+    params = dict(params, after_id=after_id, fetch=limit + 1 if limit is not None else None)
+    rows = db.session.execute(statements[(after_id is not None, limit is not None)], params).all()
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        return rows, pagination.encode_cursor(rows[-1].id)
+    return rows, None
+
+
+"""
+A method to compile the prebuilt statements, at startup.
+A DB without tables yet, eg. before db_initializer or the migrations ran, is left alone.
+The connection pool is filled by prefork.init_app, in each worker of a prefork server.
+"""
+def warm_up(app):
+    with app.app_context():
+        with db.engine.connect() as connection:
+            if not inspect(connection).has_table(TableVersion.__tablename__):
+                return
+        for model in ENTITY_BY_ID:
+            by_id(model, 0)
+        count_team_users(0)
+        team_candidates(0, [0])
+        table_version_rows(["user"])
+        board_row(0)
+        for after_id, limit in ((None, None), (0, None), (None, 1), (0, 1)):
+            team_users_page(0, after_id, limit)
+            user_teams_page(0, after_id, limit)
+        db.session.remove()
@@ -0,0 +1,47 @@
+"""
+Read models: column-only queries for the read endpoints.
+
+The serializers read a handful of columns of each row, so the list
+endpoints & the exports select just those columns instead of whole ORM
+objects. Such a query gives back plain rows (slotted named tuples),
+which skip the identity map, the change tracking & the instance state
+that an ORM object carries along. A row answers to the same attribute
+names as the model, eg. `row.user_name`, so the serializers take either.
+
+Note: The rows are read-only, the write paths keep using the ORM objects.
+"""
+
+from app_config import db
+from models import Board, Task, Team, User
+
+USER_COLUMNS = (User.id, User.user_name, User.user_disp_name, User.user_desc, User.user_creation_time)
+
+TEAM_COLUMNS = (Team.id, Team.team_name, Team.team_desc, Team.team_admin, Team.team_creation_time)
+
+# The columns of a board in a listing
+BOARD_LIST_COLUMNS = (Board.id, Board.board_name)
+
+# The columns of a board in an export, incl. its task counters & revision
+BOARD_COLUMNS = (Board.id, Board.board_name, Board.board_desc, Board.board_team_id, Board.board_status,
+                 Board.board_creation_time, Board.board_end_time, Board.board_open_tasks,
+                 Board.board_in_progress_tasks, Board.board_complete_tasks, Board.board_revision)
+
+TASK_COLUMNS = (Task.id, Task.task_title, Task.task_desc, Task.task_user_id, Task.task_status,
+                Task.task_creation_time)
+
+
+def users_query():
+    return db.session.query(*USER_COLUMNS)
+
+
+def teams_query():
+    return db.session.query(*TEAM_COLUMNS)
+
+
+def boards_query():
+    return db.session.query(*BOARD_LIST_COLUMNS)
+
+
+def tasks_query():
+    return db.session.query(*TASK_COLUMNS)
+
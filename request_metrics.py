@@ -0,0 +1,275 @@
+"""
+Per-request instrumentation, exposed in the Prometheus text format at /metrics.
+
+Every request is recorded under its operationId (the name of the view function,
+eg. create_user) with:
+    planner_request_duration_seconds   - wall time, histogram
+    planner_sql_statements             - SQL statements sent, histogram
+    planner_sql_duration_seconds       - time spent in those statements, histogram
+    planner_response_size_bytes        - body size, histogram (streamed bodies left out)
+    planner_responses_total            - responses, counter by status code
+
+The statements are seen through the SQLAlchemy engine events, those of the
+background export jobs are not counted as they run outside any request.
+
+The histograms are plain counters, laid out in one array per app, kept by
+a backend (METRICS_BACKEND):
+    local  - In the memory of this process (a single worker)
+    shared - In a memory mapped file, METRICS_SHARED_FILE, added to by every
+             process on the host under a flock, so /metrics served by any
+             uWSGI worker reports the requests of all of them
+    none   - No recording
+"""
+
+import mmap
+import os
+import threading
+import time
+import zlib
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import fcntl
+except ImportError:     # Windows, where only the local backend applies
+    fcntl = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+PREFIX = "planner_"
+
+# (metric name, help text, bucket upper bounds), the +Inf bucket is implied
+HISTOGRAMS = [
+    ("request_duration_seconds", "Wall time of the requests.",
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+    ("sql_statements", "SQL statements sent per request.",
+        (0, 1, 2, 3, 5, 8, 13, 21, 34)),
+    ("sql_duration_seconds", "Time spent in the SQL statements of a request.",
+        (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)),
+    ("response_size_bytes", "Size of the response bodies.",
+        (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)),
+]
+
+# The status codes counted on their own, any other one is counted as "other"
+STATUS_CODES = ("200", "201", "202", "204", "304", "400", "404", "405", "409", "410", "429", "500", "503")
+
+# The operation of the requests matching no route
+UNMATCHED = "unmatched"
+
+
+"""
+The position of every counter in the array: per operation, each histogram's
+buckets, then its sum, then the status counters.
+"""
+class Layout:
+    def __init__(self, operations):
+        self.operations = list(operations) + [UNMATCHED]
+        self.histogram_offsets = {}
+        offset = 0
+        for name, help_text, buckets in HISTOGRAMS:
+            self.histogram_offsets[name] = offset
+            offset += len(buckets) + 2      # the buckets, +Inf & the sum
+        self.status_offset = offset
+        self.operation_size = offset + len(STATUS_CODES) + 1
+        self.size = self.operation_size * len(self.operations)
+        self.operation_offsets = {operation: index * self.operation_size
+                                  for index, operation in enumerate(self.operations)}
+        # Tells apart the files laid out by another version of the app
+        self.checksum = zlib.crc32(repr((self.operations, HISTOGRAMS, STATUS_CODES)).encode())
+
+    """
+    A method to give the increments of the counters for one request.
+    :observations: A dict {histogram name: value}, a missing one is not observed
+    :return: A list of (position, amount)
+    """
+    def increments(self, operation, observations, status):
+        base = self.operation_offsets.get(operation, self.operation_offsets[UNMATCHED])
+        increments = []
+        for name, help_text, buckets in HISTOGRAMS:
+            value = observations.get(name)
+            if value is None:
+                continue
+            offset = base + self.histogram_offsets[name]
+            bucket = next((index for index, bound in enumerate(buckets) if value <= bound), len(buckets))
+            increments.append((offset + bucket, 1))
+            increments.append((offset + len(buckets) + 1, value))
+        status = str(status)
+        status_index = STATUS_CODES.index(status) if status in STATUS_CODES else len(STATUS_CODES)
+        increments.append((base + self.status_offset + status_index, 1))
+        return increments
+
+
+"""
+The local backend: the counters in a list of this process.
+"""
+class LocalStore:
+    def __init__(self, layout):
+        self.values = [0.0] * layout.size
+        self.lock = threading.Lock()
+
+    def add(self, increments):
+        with self.lock:
+            for position, amount in increments:
+                self.values[position] += amount
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.values)
+
+
+"""
+The shared backend: a file of 8 byte floats mapped in memory by every process,
+the first holding the layout's checksum. A file of another layout is reset.
+"""
+class SharedStore:
+    def __init__(self, layout, path):
+        self.layout = layout
+        self.path = path
+        self.pid = None
+        self.fd = None
+        self.values = None
+        self.lock = threading.Lock()
+
+    """
+    A helper method to map the file, once per process: a flock taken on a
+    file descriptor inherited over fork() would be shared with the parent.
+    """
+    def mapped(self):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                    size = (self.layout.size + 1) * 8
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                    try:
+                        if os.fstat(fd).st_size != size:
+                            os.ftruncate(fd, 0)
+                            os.ftruncate(fd, size)
+                        values = memoryview(mmap.mmap(fd, size)).cast("d")
+                        if values[0] != self.layout.checksum:
+                            values[:] = memoryview(bytes(size)).cast("d")
+                            values[0] = self.layout.checksum
+                    finally:
+                        fcntl.flock(fd, fcntl.LOCK_UN)
+                    self.fd, self.values = fd, values
+                    self.pid = os.getpid()
+        return self.values
+
+    def add(self, increments):
+        values = self.mapped()
+        with self.lock:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                for position, amount in increments:
+                    values[position + 1] += amount
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def snapshot(self):
+        return self.mapped()[1:].tolist()
+
+
+_layout = None
+_store = None
+
+
+"""
+A method to start recording the requests of the Flask `app`.
+Note: Call it once every route is added, the operations are taken from them.
+"""
+def init_app(app):
+    global _layout, _store
+    backend = app.config["METRICS_BACKEND"]
+    if backend == "none":
+        return
+    operations = sorted({view_function.__name__ for view_function in app.view_functions.values()})
+    _layout = Layout(operations)
+    if backend == "shared" and fcntl is not None:
+        _store = SharedStore(_layout, app.config["METRICS_SHARED_FILE"])
+    else:
+        _store = LocalStore(_layout)
+    app.before_request(start_request)
+    app.after_request(record_request)
+
+
+def start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_sql = [0, 0.0]     # statements, seconds
+
+
+def record_request(response):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return response
+    statements, sql_seconds = g.pop("metrics_sql")
+    view_function = current_view_function()
+    operation = view_function.__name__ if view_function is not None else UNMATCHED
+    observations = {"request_duration_seconds": time.perf_counter() - started,
+                    "sql_statements": statements,
+                    "sql_duration_seconds": sql_seconds}
+    if not response.is_streamed:
+        observations["response_size_bytes"] = response.calculate_content_length() or 0
+    _store.add(_layout.increments(operation, observations, response.status_code))
+    return response
+
+
+def current_view_function():
+    if request.url_rule is None:
+        return None
+    return current_app.view_functions.get(request.url_rule.endpoint)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["metrics_started"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "metrics_sql" in g:
+        g.metrics_sql[0] += 1
+        g.metrics_sql[1] += time.perf_counter() - conn.info.pop("metrics_started")
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+"""
+A method to render the counters in the Prometheus text format,
+for the operations with at least one request.
+"""
+def render():
+    if _store is None:
+        return ""
+    values = _store.snapshot()
+    recorded = []
+    for operation in _layout.operations:
+        base = _layout.operation_offsets[operation]
+        count = sum(values[base + _layout.status_offset:base + _layout.operation_size])
+        if count:
+            recorded.append((operation, base))
+
+    lines = []
+    for name, help_text, buckets in HISTOGRAMS:
+        lines.append(f'# HELP {PREFIX}{name} {help_text}')
+        lines.append(f'# TYPE {PREFIX}{name} histogram')
+        for operation, base in recorded:
+            offset = base + _layout.histogram_offsets[name]
+            cumulative = 0
+            for index, bound in enumerate(list(buckets) + ["+Inf"]):
+                cumulative += values[offset + index]
+                lines.append(f'{PREFIX}{name}_bucket{{operation="{operation}",le="{bound}"}} {format_value(cumulative)}')
+            lines.append(f'{PREFIX}{name}_sum{{operation="{operation}"}} {format_value(values[offset + len(buckets) + 1])}')
+            lines.append(f'{PREFIX}{name}_count{{operation="{operation}"}} {format_value(cumulative)}')
+
+    lines.append(f'# HELP {PREFIX}responses_total Responses by status code.')
+    lines.append(f'# TYPE {PREFIX}responses_total counter')
+    for operation, base in recorded:
+        for index, status in enumerate(list(STATUS_CODES) + ["other"]):
+            count = values[base + _layout.status_offset + index]
+            if count:
+                lines.append(f'{PREFIX}responses_total{{operation="{operation}",status="{status}"}} {format_value(count)}')
+    return "\n".join(lines) + "\n"
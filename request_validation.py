@@ -0,0 +1,237 @@
+"""
+Fast-path validation of the request bodies, with precompiled per-operation validators.
+
+connexion checks a JSON body with a generic jsonschema validator, which walks
+the schema anew for every request. Here the body schema of each operation is
+compiled once, when the API is added, into nested checks of plain Python,
+which also coerce the values to the schema's types:
+
+    integer     An int as is, an integral float (7.0) or a string of digits ("7") as an int
+    number      An int or a float as is, a numeric string as a float, unless "nan" or infinite
+    boolean     A bool as is, "true" / "false" as a bool
+
+The coerced values are written back into the request's JSON, so the resource
+functions get typed payloads & need not parse them again.
+
+The errors are reported like connexion's, eg. "'abc' is not of type 'integer' - 'users.0'".
+A schema using a keyword not compiled here falls back to connexion's validator.
+
+    connex_app.add_api("swagger.yaml", validator_map=request_validation.VALIDATOR_MAP)
+"""
+
+import logging
+import math
+import re
+from connexion.decorators.validation import RequestBodyValidator
+from connexion.exceptions import BadRequestProblem
+from connexion.utils import is_null
+
+logger = logging.getLogger("connexion.decorators.validation")
+
+INTEGER_STRING = re.compile(r'^\s*[-+]?\d+\s*$')
+
+# The keywords which only document a schema, without checking anything,
+# and the definitions connexion attaches to a body schema, whose $refs it already resolved
+ANNOTATIONS = {"description", "example", "title", "default", "readOnly", "definitions"}
+
+
+class ValidationError(Exception):
+    def __init__(self, message, path=()):
+        super().__init__(message)
+        self.message = message
+        self.path = path
+
+
+class UnsupportedSchema(Exception):
+    pass
+
+
+def type_error(value, type_name, path):
+    return ValidationError(f'{value!r} is not of type {type_name!r}', path)
+
+
+def coerce_integer(value, path):
+    if type(value) is int:
+        return value
+    if type(value) is float and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and INTEGER_STRING.match(value):
+        return int(value)
+    raise type_error(value, "integer", path)
+
+
+def coerce_number(value, path):
+    if type(value) in (int, float):
+        return value
+    if isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            pass
+        else:
+            # float() takes "nan" & "inf", which no range check would stop
+            if math.isfinite(number):
+                return number
+    raise type_error(value, "number", path)
+
+
+def coerce_boolean(value, path):
+    if type(value) is bool:
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    raise type_error(value, "boolean", path)
+
+
+def check_type(python_type, type_name):
+    def check(value, path):
+        if not isinstance(value, python_type):
+            raise type_error(value, type_name, path)
+        return value
+    return check
+
+
+TYPE_CHECKS = {
+    "integer": coerce_integer,
+    "number": coerce_number,
+    "boolean": coerce_boolean,
+    "string": check_type(str, "string"),
+}
+
+
+"""
+A method to compile a schema into a check of a value.
+:return: A function (value, path) giving back the value coerced, or raising a ValidationError
+:raises: UnsupportedSchema if the schema uses a keyword not compiled here
+"""
+def compile_schema(schema):
+    unsupported = {keyword for keyword in schema
+                   if keyword not in ANNOTATIONS and not keyword.startswith("x-")} \
+                  - {"type", "properties", "required", "items", "minItems", "maxItems", "enum",
+                     "minimum", "maximum", "allOf"}
+    if unsupported:
+        raise UnsupportedSchema(", ".join(sorted(unsupported)))
+
+    checks = []
+    schema_type = schema.get("type")
+    if schema_type == "object" or (schema_type is None and ("properties" in schema or "required" in schema)):
+        checks.append(compile_object(schema, strict_type=schema_type == "object"))
+    elif schema_type == "array" or "items" in schema:
+        checks.append(compile_array(schema, strict_type=schema_type == "array"))
+    elif schema_type in TYPE_CHECKS:
+        checks.append(TYPE_CHECKS[schema_type])
+    elif schema_type is not None:
+        raise UnsupportedSchema(f'type {schema_type}')
+
+    if "enum" in schema:
+        checks.append(compile_enum(schema["enum"]))
+    if "minimum" in schema or "maximum" in schema:
+        checks.append(compile_range(schema.get("minimum"), schema.get("maximum")))
+    for sub_schema in schema.get("allOf", ()):
+        checks.append(compile_schema(sub_schema))
+
+    nullable = schema.get("x-nullable") is True
+    if not checks:
+        return lambda value, path: value
+    if len(checks) == 1 and not nullable:
+        return checks[0]
+
+    def check(value, path):
+        if value is None and nullable:
+            return value
+        for each_check in checks:
+            value = each_check(value, path)
+        return value
+    return check
+
+
+def compile_object(schema, strict_type):
+    properties = [(name, compile_schema(sub_schema)) for name, sub_schema in schema.get("properties", {}).items()]
+    required = list(schema.get("required", ()))
+
+    def check(value, path):
+        if not isinstance(value, dict):
+            if strict_type:
+                raise type_error(value, "object", path)
+            return value
+        for name in required:
+            if name not in value:
+                raise ValidationError(f'{name!r} is a required property', path)
+        for name, property_check in properties:
+            if name in value:
+                value[name] = property_check(value[name], path + (name,))
+        return value
+    return check
+
+
+def compile_array(schema, strict_type):
+    item_check = compile_schema(schema.get("items", {}))
+    min_items, max_items = schema.get("minItems"), schema.get("maxItems")
+
+    def check(value, path):
+        if not isinstance(value, list):
+            if strict_type:
+                raise type_error(value, "array", path)
+            return value
+        if min_items is not None and len(value) < min_items:
+            raise ValidationError(f'{value!r} is too short', path)
+        if max_items is not None and len(value) > max_items:
+            raise ValidationError(f'{value!r} is too long', path)
+        for index, item in enumerate(value):
+            value[index] = item_check(item, path + (index,))
+        return value
+    return check
+
+
+def compile_enum(enum):
+    def check(value, path):
+        if value not in enum:
+            raise ValidationError(f'{value!r} is not one of {enum!r}', path)
+        return value
+    return check
+
+
+def compile_range(minimum, maximum):
+    def check(value, path):
+        if type(value) in (int, float):
+            if minimum is not None and value < minimum:
+                raise ValidationError(f'{value!r} is less than the minimum of {minimum!r}', path)
+            if maximum is not None and value > maximum:
+                raise ValidationError(f'{value!r} is greater than the maximum of {maximum!r}', path)
+        return value
+    return check
+
+
+"""
+The body validator of an operation, compiled when the API is added.
+The body is checked & coerced in place, i.e in the request's JSON read by the resource function.
+"""
+class CompiledRequestBodyValidator(RequestBodyValidator):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        try:
+            self.compiled = compile_schema(self.schema)
+        except UnsupportedSchema as unsupported:
+            logger.debug("Body schema not compiled (%s), validated by jsonschema", unsupported)
+            self.compiled = None
+
+    def validate_schema(self, data, url):
+        if self.compiled is None:
+            return super().validate_schema(data, url)
+        if self.is_null_value_valid and is_null(data):
+            return None
+
+        try:
+            self.compiled(data, ())
+        except ValidationError as exception:
+            error_path = ".".join(str(item) for item in exception.path)
+            error_path_msg = f" - '{error_path}'" if error_path else ""
+            logger.error(f'{url} validation error: {exception.message}{error_path_msg}', extra={"validator": "body"})
+            raise BadRequestProblem(detail=f'{exception.message}{error_path_msg}')
+        return None
+
+
+# The validators replacing connexion's, see connexion.App.add_api(validator_map=...)
+VALIDATOR_MAP = {
+    "body": CompiledRequestBodyValidator,
+}
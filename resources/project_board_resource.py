@@ -1,19 +1,31 @@
 """
 This is module supports all the REST actions for querying Project Board data/details.
 """
-from sqlalchemy import func
+from sqlalchemy import bindparam, func
 from app_config import db
-from models import Board, Team, Task
+from models import Board, Team, Task, TASK_STATUSES, teams_m2m_users
 from resources import team_resource
-from pathlib import Path
+from flask import Response, send_file, stream_with_context
 from datetime import datetime
-import json
+import db_backend
+import pagination
+import queries
+import read_models
+import table_versions
+import write_coalescer
 
 """
 A project board is a unit of delivery for a project.
 Each board will have a set of tasks assigned to a user.
 """
 
+# The Board column holding the task count of each status
+BOARD_COUNTER_COLUMNS = {
+    "OPEN": "board_open_tasks",
+    "IN_PROGRESS": "board_in_progress_tasks",
+    "COMPLETE": "board_complete_tasks",
+}
+
 """
 A method to serialize a objects' list into
 JSON compatible string, i.e Python dict{}
@@ -36,6 +48,31 @@ def serialize_object(board_obj):
   return board_dict
 
 
+"""
+A helper method to shift the task status counters of boards,
+within the caller's transaction. The revision of each board is bumped too.
+
+:deltas: A dict {board_id: {status: +/- count}}
+"""
+def shift_board_counters(deltas):
+    board_table = Board.__table__
+    params = []
+    for board_id, status_deltas in deltas.items():
+        param = {"b_id": board_id}
+        for status, column in BOARD_COUNTER_COLUMNS.items():
+            param["b_" + column] = status_deltas.get(status, 0)
+        if any(param[key] for key in param if key != "b_id"):
+            params.append(param)
+    if params:
+        values = {column: board_table.c[column] + bindparam("b_" + column)
+                  for column in BOARD_COUNTER_COLUMNS.values()}
+        values["board_revision"] = board_table.c.board_revision + 1
+        db.session.execute(board_table.update()
+                                      .where(board_table.c.id == bindparam("b_id"))
+                                      .values(**values),
+                           params)
+
+
 """
 A method to take in a board's details.
 from a JSON string and save to the DB.
@@ -54,10 +91,7 @@ Constraint:
         * description can be max 128 characters
 """
 def create_board(new_board_json):
-    try: 
-        team_id_from_user = int(new_board_json.get("team_id"))
-    except ValueError as ve:
-        return {"error": "TeamId should be numeric."}, 400
+    team_id_from_user = new_board_json.get("team_id")
 
     if team_id_from_user is not None:
 
@@ -71,13 +105,13 @@ def create_board(new_board_json):
                 board_team_id=team_id_from_user
             )          
             
-            # Saving the new Board to DB
+            # Saving the new Board to DB, the flush assigns its primary key
             db.session.add(board_obj)
+            db.session.flush()
+            board_id = board_obj.id
+            table_versions.bump("board")
             db.session.commit()
 
-            # Gets the new board_id
-            board_id = db.session.query(func.max(Board.id)).scalar()
-
             return { "id": board_id}, 201
         else:
             return {"error" : team_obj}, 404
@@ -85,6 +119,61 @@ def create_board(new_board_json):
         return {"error" : "TeamId must be specified."}, 400
 
 
+"""
+A method to take in a list of boards' details
+and save them to the DB in a single transaction.
+All boards are validated up front & inserted with one executemany INSERT.
+
+:request: A JSON list with the boards' details.
+    Eg. [{  "name" : "<board_name>",
+            "description" : "<description>",
+            "team_id" : "<team id>"
+        }]
+:return: A JSON list with the result of each board, in the same order
+    Eg. [{ "id" : <board_id> }, { "error" : "<why it was not created>" }]
+"""
+def create_boards(new_boards_json):
+    team_ids = {new_board_json.get("team_id") for new_board_json in new_boards_json}
+    board_names = {new_board_json.get("name") for new_board_json in new_boards_json}
+
+    existing_team_ids = {team_id for (team_id,) in db.session.query(Team.id).filter(Team.id.in_(team_ids))}
+    existing_names = {name for (name,) in db.session.query(Board.board_name)
+                                                    .filter(Board.board_name.in_(board_names))}
+
+    results = []
+    new_boards = []
+    for new_board_json in new_boards_json:
+        board_name = new_board_json.get("name")
+        team_id = new_board_json.get("team_id")
+        if team_id not in existing_team_ids:
+            results.append({"error": f'TeamId {team_id} does not exits.'})
+        elif not board_name or len(board_name) > 64:
+            results.append({"error": "Board name must be specified & can be max 64 characters."})
+        elif len(new_board_json.get("description") or "") > 128:
+            results.append({"error": "Description can be max 128 characters."})
+        elif board_name in existing_names:
+            results.append({"error": f'Board name {board_name} already exists.'})
+        else:
+            existing_names.add(board_name)
+            new_boards.append({"board_name": board_name,
+                               "board_desc": new_board_json.get("description"),
+                               "board_team_id": team_id})
+            results.append({"name": board_name})
+
+    if not new_boards:
+        return results, 400
+
+    # Saving all the new boards to DB in one transaction
+    new_board_ids = db_backend.insert_returning_ids(Board.__table__, new_boards, "board_name")
+    table_versions.bump("board")
+    db.session.commit()
+
+    for result in results:
+        if "name" in result:
+            result["id"] = new_board_ids[result.pop("name")]
+    return results, 201
+
+
 """
 A method to add a new task to a specified board.
 
@@ -108,20 +197,17 @@ def add_task(new_task_json):
     new_task_title = new_task_json.get("title")
     new_task_desc = new_task_json.get("description")
     
-    try: 
-        board_id = int(new_task_json.get("board_id"))
-    except ValueError as ve:
-        return {"error": "BoardId should be numeric."}, 400
-    try: 
-        user_id = int(new_task_json.get("user_id"))
-    except ValueError as ve:
-        return {"error": "UserId should be numeric."}, 400
-
-    board_obj = Board.query.filter(Board.id == board_id).one_or_none()
+    board_id = new_task_json.get("board_id")
+    user_id = new_task_json.get("user_id")
+
+    board_obj = queries.by_id(Board, board_id)
     if board_obj is not None:
-        team_obj = team_resource.does_team_exists(board_obj.board_team_id)
-        board_team_users_id_list = [x.id for x in team_obj.team_users]
-        if user_id in board_team_users_id_list:
+        # A closed board no longer changes, eg. its cached export is served as is
+        if board_obj.board_status == "CLOSED":
+            return {"error": f'BoardId {board_id} is closed.'}, 405
+        # Only the membership of this user is looked up, not every member of the team
+        is_team_user = team_resource.lookup_team_candidates(board_obj.board_team_id, [user_id]).get(user_id)
+        if is_team_user:
             task_obj = Task(
                 task_title=new_task_title,
                 task_desc=new_task_desc,
@@ -129,20 +215,100 @@ def add_task(new_task_json):
                 task_user_id=user_id
             )
 
+            # Saving the new Task to DB, the flush assigns its primary key
             db.session.add(task_obj)
+            db.session.flush()
+            task_id = task_obj.id
+            shift_board_counters({board_id: {"OPEN": 1}})
+            table_versions.bump("task", "board")
             db.session.commit()
-            # Gets the new task_id
-            task_id = db.session.query(func.max(Task.id)).scalar()
 
             return { "id": task_id}, 201
         else:
-            message = f'UserId {user_id} does not belong to TeamId {team_obj.id}, which owns this board.'
+            message = f'UserId {user_id} does not belong to TeamId {board_obj.board_team_id}, which owns this board.'
             return {"error" : message}, 400
     else:
         error_message = f'BoardId {board_id} does not exits.'
         return {"error": error_message}, 404
 
 
+"""
+A method to add a list of new tasks to their boards in a single transaction.
+All tasks are validated up front & inserted with one executemany INSERT.
+
+:request: A JSON list with the tasks' details.
+        Eg. [{  "title" : "<task_title>",
+                "description" : "<description>",
+                "board_id": <board_id>
+                "user_id" : "<user_id>"
+            }]
+
+:return: A JSON list with the result of each task, in the same order
+        Eg. [{ "id" : <task_id> }, { "error" : "<why it was not created>" }]
+"""
+def add_tasks(new_tasks_json):
+    board_ids = {new_task_json.get("board_id") for new_task_json in new_tasks_json}
+    user_ids = {new_task_json.get("user_id") for new_task_json in new_tasks_json}
+    task_titles = {new_task_json.get("title") for new_task_json in new_tasks_json}
+
+    # The owner team of each board, its status & the members of those teams
+    board_rows = db.session.query(Board.id, Board.board_team_id, Board.board_status).filter(Board.id.in_(board_ids))
+    board_teams, closed_boards = {}, set()
+    for board_id, team_id, board_status in board_rows:
+        board_teams[board_id] = team_id
+        if board_status == "CLOSED":
+            closed_boards.add(board_id)
+    team_members = set(db.session.query(teams_m2m_users.c.team_id, teams_m2m_users.c.user_id)
+                                 .filter(teams_m2m_users.c.team_id.in_(set(board_teams.values())))
+                                 .filter(teams_m2m_users.c.user_id.in_(user_ids)))
+    existing_titles = {title for (title,) in db.session.query(Task.task_title)
+                                                       .filter(Task.task_title.in_(task_titles))}
+
+    results = []
+    new_tasks = []
+    for new_task_json in new_tasks_json:
+        task_title = new_task_json.get("title")
+        board_id, user_id = new_task_json.get("board_id"), new_task_json.get("user_id")
+        if board_id not in board_teams:
+            results.append({"error": f'BoardId {board_id} does not exits.'})
+        elif board_id in closed_boards:
+            results.append({"error": f'BoardId {board_id} is closed.'})
+        elif (board_teams[board_id], user_id) not in team_members:
+            message = f'UserId {user_id} does not belong to TeamId {board_teams[board_id]}, which owns this board.'
+            results.append({"error": message})
+        elif not task_title or len(task_title) > 64:
+            results.append({"error": "Task title must be specified & can be max 64 characters."})
+        elif len(new_task_json.get("description") or "") > 128:
+            results.append({"error": "Description can be max 128 characters."})
+        elif task_title in existing_titles:
+            results.append({"error": f'Task title {task_title} already exists.'})
+        else:
+            existing_titles.add(task_title)
+            new_tasks.append({"task_title": task_title,
+                              "task_desc": new_task_json.get("description"),
+                              "task_board_id": board_id,
+                              "task_user_id": user_id})
+            results.append({"title": task_title})
+
+    if not new_tasks:
+        return results, 400
+
+    # Saving all the new tasks to DB in one transaction
+    new_task_ids = db_backend.insert_returning_ids(Task.__table__, new_tasks, "task_title")
+    deltas = {}
+    for new_task in new_tasks:
+        board_deltas = deltas.setdefault(new_task["task_board_id"], {})
+        board_deltas["OPEN"] = board_deltas.get("OPEN", 0) + 1
+    shift_board_counters(deltas)
+    table_versions.bump("task", "board")
+    db.session.commit()
+
+    for result in results:
+        if "title" in result:
+            result["id"] = new_task_ids[result.pop("title")]
+    return results, 201
+
+
 """
 A method to update task status.
 
@@ -154,32 +320,140 @@ A method to update task status.
 :return:
 """
 def update_task_status(task_update_json):
-
-    try: 
-        task_id = int(task_update_json.get("id"))
-    except ValueError as ve:
-        return {"error": "TaskId should be numeric."}, 400
-
     task_status = task_update_json.get("status")
-    if task_status not in ["OPEN", "IN_PROGRESS", "COMPLETE"]:
+    if task_status not in TASK_STATUSES:
         return {"error": "Status can be either OPEN, IN_PROGRESS or COMPLETE."}, 400
 
-    task_obj = Task.query.filter(Task.id == task_id).one_or_none()
-    if task_obj is not None:
-        task_obj.task_status = task_status
+    # Committed along with the updates of other requests, see write_coalescer.py
+    if task_status_writes.enabled():
+        return task_status_writes.submit(task_update_json)
 
-        db.session.add(task_obj)
+    results, statuses = apply_task_statuses([task_update_json])
+    if statuses[0] == 200:
         db.session.commit()
-        message = f'TaskId {task_id} is now {task_status}.'
-        return { "message": message}, 200
-    else:
-        error_message = f'TaskId {task_id} does not exits.'
-        return {"error": error_message}, 404
+    return results[0], statuses[0]
+
+
+"""
+A helper method to change the status of a task from `old_status`, if it still is its status.
+:return: True if changed, False if the task was changed meanwhile by a concurrent write
+"""
+def change_task_status(task_id, old_status, task_status):
+    task_table = Task.__table__
+    result = db.session.execute(task_table.update()
+                                          .where(task_table.c.id == task_id)
+                                          .where(task_table.c.task_status == old_status)
+                                          .values(task_status=task_status))
+    return result.rowcount == 1
+
+
+"""
+A helper method to apply a list of task status updates, in the current transaction.
+All updates are validated up front against the statuses read at once. Each
+status is then changed only from the status read, so the board counters are
+shifted by what actually changed: a task changed meanwhile by a concurrent write
+is read again, within the write transaction, & changed from its new status.
+The tasks of a closed board are not changed: its cached export is served as is.
+:return: The result of each update, in the same order, & the status code of each
+"""
+def apply_task_statuses(task_updates_json):
+    task_ids = {task_update_json.get("id") for task_update_json in task_updates_json}
+    # The board & the current status of each task, & the closed boards among them
+    existing_tasks = {}
+    closed_boards = set()
+    for task_id, board_id, status, board_status in db.session.query(Task.id, Task.task_board_id, Task.task_status,
+                                                                     Board.board_status) \
+                                                             .join(Board, Board.id == Task.task_board_id) \
+                                                             .filter(Task.id.in_(task_ids)):
+        existing_tasks[task_id] = [board_id, status]
+        if board_status == "CLOSED":
+            closed_boards.add(board_id)
+
+    results = []
+    statuses = []
+    changed = False
+    deltas = {}
+    for task_update_json in task_updates_json:
+        task_status = task_update_json.get("status")
+        task_id = task_update_json.get("id")
+        if task_status not in TASK_STATUSES:
+            results.append({"error": "Status can be either OPEN, IN_PROGRESS or COMPLETE."})
+            statuses.append(400)
+            continue
+        if task_id in existing_tasks and existing_tasks[task_id][0] in closed_boards:
+            results.append({"error": f'BoardId {existing_tasks[task_id][0]} of TaskId {task_id} is closed.'})
+            statuses.append(405)
+            continue
+
+        while task_id in existing_tasks:
+            board_id, old_status = existing_tasks[task_id]
+            if old_status == task_status or change_task_status(task_id, old_status, task_status):
+                break
+            row = db.session.query(Task.task_board_id, Task.task_status).filter(Task.id == task_id).one_or_none()
+            if row is None:
+                del existing_tasks[task_id]
+            else:
+                existing_tasks[task_id] = list(row)
+
+        if task_id not in existing_tasks:
+            results.append({"error": f'TaskId {task_id} does not exits.'})
+            statuses.append(404)
+            continue
+        if old_status != task_status:
+            board_deltas = deltas.setdefault(board_id, {})
+            board_deltas[old_status] = board_deltas.get(old_status, 0) - 1
+            board_deltas[task_status] = board_deltas.get(task_status, 0) + 1
+            existing_tasks[task_id][1] = task_status
+            changed = True
+        results.append({"message": f'TaskId {task_id} is now {task_status}.'})
+        statuses.append(200)
+
+    if changed:
+        shift_board_counters(deltas)
+        table_versions.bump("task", "board")
+    return results, statuses
+
+
+"""
+A helper method to apply & commit a batch of task status updates, for the group commit.
+:return: The (result, status code) of each update, in the same order
+"""
+def commit_task_statuses(task_updates_json):
+    results, statuses = apply_task_statuses(task_updates_json)
+    if 200 in statuses:
+        db.session.commit()
+    return list(zip(results, statuses))
+
+
+# The group commit of update_task_status, on when TASK_STATUS_COALESCE_WINDOW_MS is set
+task_status_writes = write_coalescer.WriteCoalescer(commit_task_statuses, "TASK_STATUS_COALESCE_WINDOW_MS",
+                                                    "TASK_STATUS_COALESCE_MAX_BATCH")
+
+
+"""
+A method to update the status of a list of tasks in a single transaction.
+
+:request: A JSON list with the task updates
+    Eg. 
+        [{  "id" : <task_id>,
+            "status" : <OPEN/IN_PROGRESS/COMPLETE>
+        }]
+:return: A JSON list with the result of each update, in the same order
+    Eg. [{ "message" : "TaskId 1 is now COMPLETE." }, { "error" : "<why it was not updated>" }]
+"""
+def update_task_statuses(task_updates_json):
+    results, statuses = apply_task_statuses(task_updates_json)
+    if 200 not in statuses:
+        return results, 400
+
+    # Saving all the updates to DB in one transaction
+    db.session.commit()
+    return results, 200
 
 
 """
 A method to change baord status to CLOSED,
-if all tasks are marked as COMPLETE.
+if all tasks are marked as COMPLETE, as per the board's status counters.
 Also, record the closing time as end_time(date:time).
 
 :request: A JSON string with the board id to close.
@@ -187,102 +461,280 @@ Also, record the closing time as end_time(date:time).
 :return:
 """
 def close_board(board_id_json):
-    try: 
-        board_id = int(board_id_json.get("id"))
-    except ValueError as ve:
-        return {"error": "BoardId should be numeric."}, 400
-
-    board_obj = Board.query.filter(Board.id == board_id).one_or_none()
-    if board_obj is not None:
-        for task_obj in board_obj.board_tasks:
-            if task_obj.task_status != "COMPLETE":
-                message = f'Cannot close this board as TaskId {task_obj.id} is not completed.'
-                return {"message" : message}, 405
-        
-        board_obj.board_status = "CLOSED"
+    board_id = board_id_json.get("id")
 
+    # The counters are checked by the UPDATE itself, so a task added
+    # or reopened concurrently can never be left on a closed board.
+    board_table = Board.__table__
+    result = db.session.execute(board_table.update()
+                                           .where(board_table.c.id == board_id)
+                                           .where(board_table.c.board_open_tasks == 0)
+                                           .where(board_table.c.board_in_progress_tasks == 0)
+                                           .values(board_status="CLOSED", board_end_time=datetime.utcnow()))
+    if result.rowcount == 1:
+        table_versions.bump("board")
         # Saving the updated Board to DB
-        db.session.add(board_obj)
         db.session.commit()
         message = f'BoardId {board_id} is now closed.'
         return {"message" : message}, 200
 
+    if queries.by_id(Board, board_id) is None:
+        error_message = f'BoardId {board_id} does not exits.'
+        return {"error": error_message}, 404
+
+    # The pending task is looked up only to report it
+    pending_task_id = db.session.query(Task.id) \
+                                .filter(Task.task_board_id == board_id) \
+                                .filter(Task.task_status != "COMPLETE") \
+                                .limit(1).scalar()
+    if pending_task_id is None:
+        message = 'Cannot close this board as its tasks are being updated, please try again.'
+    else:
+        message = f'Cannot close this board as TaskId {pending_task_id} is not completed.'
+    return {"message" : message}, 405
+
+
+"""
+A method to summarize a board with its task counts by status.
+
+:request: A JSON string with the board id.
+    Eg. {   "id" : <board_id>}
+:return:
+    Eg. {   "id" : <board_id>,
+            "name" : <board_name>,
+            "status" : <OPEN/CLOSED>,
+            "tasks" : { "OPEN" : 2, "IN_PROGRESS" : 1, "COMPLETE" : 4, "TOTAL" : 7 }
+        }
+"""
+@table_versions.conditional("board")
+def board_summary(board_id_json):
+    board_id = board_id_json.get("id")
+
+    board_obj = queries.by_id(Board, board_id)
+    if board_obj is not None:
+        board_dict = serialize_object(board_obj)
+        board_dict["status"] = board_obj.board_status
+        task_counts = {status: getattr(board_obj, column) for status, column in BOARD_COUNTER_COLUMNS.items()}
+        task_counts["TOTAL"] = sum(task_counts.values())
+        board_dict["tasks"] = task_counts
+        return board_dict, 200
     else:
         error_message = f'BoardId {board_id} does not exits.'
         return {"error": error_message}, 404
 
 
+"""
+A method to recompute the task status counters of every board from the task table.
+
+:rebuild: True to overwrite the counters, False to only report the mismatches
+:return: A list of the mismatching boards
+    Eg. [{ "id" : <board_id>, "stored" : {...}, "actual" : {...} }]
+"""
+def rebuild_board_counters(rebuild=True):
+    actual_counts = {}
+    for board_id, status, count in db.session.query(Task.task_board_id, Task.task_status, func.count(Task.id)) \
+                                             .group_by(Task.task_board_id, Task.task_status):
+        actual_counts.setdefault(board_id, {})[status] = count
+
+    counter_columns = [getattr(Board, column) for column in BOARD_COUNTER_COLUMNS.values()]
+    mismatches = []
+    for (board_id, *stored) in db.session.query(Board.id, *counter_columns).order_by(Board.id):
+        stored = dict(zip(BOARD_COUNTER_COLUMNS, stored))
+        actual = {status: actual_counts.get(board_id, {}).get(status, 0) for status in BOARD_COUNTER_COLUMNS}
+        if stored != actual:
+            mismatches.append({"id": board_id, "stored": stored, "actual": actual})
+
+    if rebuild and mismatches:
+        shift_board_counters({x["id"]: {status: x["actual"][status] - x["stored"][status]
+                                        for status in BOARD_COUNTER_COLUMNS}
+                              for x in mismatches})
+        table_versions.bump("board")
+        db.session.commit()
+    return mismatches
+
+
 """
 A method to list all the boards of a team
 
-:request: A JSON string with the team identifier
-        Eg. {   "id" : <team_id>}
+:request: A JSON string with the team identifier,
+          optionally with the page window (after_id/cursor, limit)
+        Eg. {   "id" : <team_id>, "limit" : 10}
 
 :return: A JSON list of all boards of the team.
+         The cursor of the next page is returned in the X-Next-Cursor header.
         Eg. [
                 {   "id" : <board_id>,
                     "name" : <board_name>
                 }
             ]
 """
+@table_versions.conditional("board")
 def list_boards(team_id_json):
-    try: 
-        team_id = int(team_id_json.get("id"))
-    except ValueError as ve:
-        return {"message": "TeamId should be numeric."}, 400
+    team_id = team_id_json.get("id")
     
-    boards_obj_list = Board.query.join(Team).filter_by(id=team_id).all()
-    return serialize_objects_list(boards_obj_list)
+    window = pagination.page_window(team_id_json.get("after_id"), team_id_json.get("cursor"),
+                                    team_id_json.get("limit"))
+    if isinstance(window, str):
+        return {"message": window}, 400
+
+    boards_query = read_models.boards_query().filter(Board.board_team_id == team_id)
+    boards_obj_list, next_cursor = pagination.paginate(boards_query, Board.id, *window)
+    return pagination.page_response(serialize_objects_list(boards_obj_list), next_cursor)
 
 
 """
 Export a board to the out folder.
-The output will be a txt file. We want you to be creative. 
+The output is written chunk by chunk, so large boards use little memory,
+& cached until the board changes, see export_cache.
 Output a presentable view of the board and its tasks with the available data.
 
-:request: A JSON string with the board id to close.
-    Eg. {   "id" : <board_id>}
+:request: A JSON string with the board id to export.
+    Eg. {   "id" : <board_id>,
+            "format" : <json/jsonl/csv/txt>,     (Optional, defaults to json)
+            "compress" : <true/false>,           (Optional, gzip the output)
+            "stream" : <true/false>              (Optional, send the export in the response)
+        }
 
 :return:
     Eg. { "out_file" : <name of the file created>}
+    or the export itself, when streamed.
 """
 def export_board(board_id_json):
+    # The export machinery is only loaded by the first export, keeping it out of the startup
+    import board_export
+    import export_cache
     board_id = board_id_json.get("id")
-    board_obj = Board.query.filter(Board.id == board_id).one_or_none()
-    if board_obj is not None:
-        
-        board_dict = {}
-        board_dict["boardId"] = board_obj.id
-        board_dict["boardName"] = board_obj.board_name
-        board_dict["boardDescription"] = board_obj.board_desc
-        board_dict["boardTeamId"] = board_obj.board_team_id
-        board_dict["boardStatus"] = board_obj.board_status
-        board_dict["boardCreatedTime"] = str(board_obj.board_creation_time)
-        board_dict["boardClosedTime"] = str(board_obj.board_end_time)
+    export_format = board_id_json.get("format") or "json"
+    compress = bool(board_id_json.get("compress"))
+    if export_format not in board_export.FORMATS:
+        return {"error": "Format can be either " + ", ".join(board_export.FORMATS) + "."}, 400
 
-    
-        tasks_list = []
-        for task_obj in board_obj.board_tasks:
-            task_dict = {}
-            task_dict["taskId"] = task_obj.id
-            task_dict["taskTitle"] = task_obj.task_title
-            task_dict["taskDescription"] = task_obj.task_desc
-            task_dict["taskUserId"] = task_obj.task_user_id
-            task_dict["taskCreated"] = str(task_obj.task_creation_time)
-            tasks_list.append(task_dict)
-
-        # Adding user to Board
-        board_dict["tasks"] = tasks_list
-
-        # Saving the Python dict to a file
-        base_dir = Path.cwd()
-        file_name = "export_board_" + datetime.now().strftime("%Y_%m_%d-%I:%M:%S_%p") + ".txt"
-        with open(base_dir / 'out'/ file_name, "w") as outfile:
-            json.dump(board_dict, outfile, indent = 6)
-        
-        return {"out_file" : file_name}
-
-        
+    # A closed board can no longer change, its cached export is served without any query
+    file_name = export_cache.lookup_closed(board_id, export_format, compress)
+    if file_name is None:
+        board_obj = queries.board_row(board_id)
+        if board_obj is None:
+            error_message = f'BoardId {board_id} does not exits.'
+            return {"error": error_message}, 404
+
+        if board_id_json.get("stream"):
+            file_name = board_export.export_file_name(board_id, export_format, compress)
+            return Response(stream_with_context(board_export.stream_board_export(board_obj, export_format, compress)),
+                            mimetype=board_export.export_mimetype(export_format, compress),
+                            headers={"Content-Disposition": f'attachment; filename="{file_name}"'})
+
+        file_name = export_cache.export_board(board_obj, export_format, compress)
+
+    if board_id_json.get("stream"):
+        return send_file(export_cache.out_dir() / file_name, as_attachment=True, download_name=file_name,
+                         mimetype=board_export.export_mimetype(export_format, compress))
+    return {"out_file" : file_name}
+
+
+"""
+A method to submit the export of a board as a background job.
+The export runs in a pool of workers, poll export_status to follow it.
+
+:request: A JSON string with the board id to export.
+    Eg. {   "id" : <board_id>,
+            "format" : <json/jsonl/csv/txt>,     (Optional, defaults to json)
+            "compress" : <true/false>            (Optional, gzip the output)
+        }
+:return:
+    Eg. { "job_id" : <job id>, "status" : "QUEUED" }
+"""
+def export_board_async(board_id_json):
+    import board_export
+    import export_jobs
+    board_id = board_id_json.get("id")
+    export_format = board_id_json.get("format") or "json"
+    if export_format not in board_export.FORMATS:
+        return {"error": "Format can be either " + ", ".join(board_export.FORMATS) + "."}, 400
+
+    board_obj = queries.board_row(board_id)
+    if board_obj is not None:
+        total_tasks = sum(getattr(board_obj, column) for column in BOARD_COUNTER_COLUMNS.values())
+        job = export_jobs.submit_board_export(board_obj.id, export_format, bool(board_id_json.get("compress")),
+                                              total_tasks)
+        if job is None:
+            return {"error": "Too many exports are pending. Please try again later."}, 503
+        return {"job_id": job["id"], "status": job["status"]}, 202
     else:
         error_message = f'BoardId {board_id} does not exits.'
         return {"error": error_message}, 404
+
+
+"""
+A method to submit the export of every board of a team, in parallel, into one zip archive.
+
+:request: A JSON string with the team id.
+    Eg. {   "id" : <team_id>,
+            "format" : <json/jsonl/csv/txt>,     (Optional, defaults to json)
+            "compress" : <true/false>            (Optional, gzip each board's output)
+        }
+:return:
+    Eg. { "job_id" : <job id>, "status" : "QUEUED" }
+"""
+def export_team_boards(team_id_json):
+    import board_export
+    import export_jobs
+    team_id = team_id_json.get("id")
+    export_format = team_id_json.get("format") or "json"
+    if export_format not in board_export.FORMATS:
+        return {"error": "Format can be either " + ", ".join(board_export.FORMATS) + "."}, 400
+
+    team_obj = team_resource.does_team_exists(team_id)
+    if isinstance(team_obj, Team):
+        board_ids = [board_id for (board_id,) in db.session.query(Board.id)
+                                                           .filter(Board.board_team_id == team_id)
+                                                           .order_by(Board.id)]
+        job = export_jobs.submit_team_export(team_id, board_ids, export_format,
+                                             bool(team_id_json.get("compress")))
+        if job is None:
+            return {"error": "Too many exports are pending. Please try again later."}, 503
+        return {"job_id": job["id"], "status": job["status"]}, 202
+    else:
+        return {"error" : team_obj}, 404
+
+
+"""
+A method to get the status & progress of an export job.
+
+:request: A JSON string with the job id.
+    Eg. {   "job_id" : <job id>}
+:return:
+    Eg. {   "id" : <job id>,
+            "status" : <QUEUED/RUNNING/DONE/FAILED>,
+            "progress" : { "done" : 500, "total" : 1200 },
+            "out_file" : <name of the file created, once DONE>,
+            ...
+        }
+"""
+def export_status(job_json):
+    import export_jobs
+    job = export_jobs.get_job(job_json.get("job_id"))
+    if job is not None:
+        return job, 200
+    else:
+        return {"error": f'Export job {job_json.get("job_id")} does not exits.'}, 404
+
+
+"""
+A method to download the file produced by a finished export job.
+
+:request: A JSON string with the job id.
+    Eg. {   "job_id" : <job id>}
+:return: The exported file
+"""
+def export_result(job_json):
+    import export_jobs
+    job = export_jobs.get_job(job_json.get("job_id"))
+    if job is None:
+        return {"error": f'Export job {job_json.get("job_id")} does not exits.'}, 404
+    if job["status"] != "DONE":
+        return {"error": f'Export job {job["id"]} is {job["status"]}.', "job": job}, 409
+
+    result_path = export_jobs.result_path(job)
+    if not result_path.is_file():
+        return {"error": f'The output of export job {job["id"]} is no longer available.'}, 410
+    return send_file(result_path, as_attachment=True, download_name=job["out_file"])
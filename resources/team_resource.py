@@ -1,10 +1,15 @@
 """
 This is module supports all the REST actions for querying Teams data/details.
 """
-from sqlalchemy import func
 from app_config import db
 from models import Team, User, teams_m2m_users
 from resources import user_resource
+import db_backend
+import entity_cache
+import pagination
+import queries
+import read_models
+import table_versions
 
 
 """
@@ -43,10 +48,7 @@ from a JSON string and save to the DB.
 :return:  A JSON string as {"id" : <team_id>}
 """
 def create_team(team_json):
-    try: 
-        admin_id_from_user = int(team_json.get("admin"))
-    except ValueError as ve:
-        return {"message": "adminId should be numeric."}, 400
+    admin_id_from_user = team_json.get("admin")
 
     if admin_id_from_user is not None:
 
@@ -60,15 +62,15 @@ def create_team(team_json):
                 team_admin=admin_id_from_user
             )
 
-            # Saving the new Team to DB
+            # Saving the new Team to DB, the flush assigns its primary key
             db.session.add(team_obj)
-            db.session.commit()
-
-            # 3 Gets the new team_id
-            team_id = db.session.query(func.max(Team.id)).scalar()
+            db.session.flush()
+            team_id = team_obj.id
 
-            # 4 Add the admin as a team user
-            add_user_to_team(team_id, admin_id_from_user)
+            # Add the admin as a team user, in the same transaction
+            insert_team_users(team_id, [admin_id_from_user])
+            table_versions.bump("team", "teams_users")
+            db.session.commit()
 
             return { "id": team_id}, 201
         else:
@@ -79,10 +81,11 @@ def create_team(team_json):
 
 """
 A helper method to check if a team exists in DB or not.
+The lookup goes through the entity cache, see entity_cache.py
 :return: team_obj if exists, else an error message
 """
 def does_team_exists(team_id):
-  team_obj = Team.query.filter(Team.id == team_id).one_or_none()
+  team_obj = entity_cache.cache_for(Team).get(team_id)
   if team_obj is None:
     error_message = f'TeamId {team_id} does not exits.'
     return error_message
@@ -90,27 +93,63 @@ def does_team_exists(team_id):
     return team_obj
 
 
+"""
+A helper method to count the members of a team with a single COUNT,
+instead of loading every member through Team.team_users.
+"""
+def count_team_users(team_id):
+    return queries.count_team_users(team_id)
+
+
+"""
+A helper method to look up a set of user ids in one IN query.
+:return: A dict {user_id: True/False}, where the flag tells
+         if the user is already a member of the team.
+         Users not existing in the DB are not part of the dict.
+"""
+def lookup_team_candidates(team_id, user_ids):
+    if not user_ids:
+        return {}
+    membership = queries.team_candidates(team_id, set(user_ids))
+    return {user_id: member_team_id is not None for user_id, member_team_id in membership}
+
+
+"""
+A helper method to insert the membership rows of a team in one multi-row INSERT.
+A row added meanwhile by a concurrent request is skipped (ON CONFLICT DO NOTHING).
+Note: The caller is responsible for the commit.
+"""
+def insert_team_users(team_id, user_ids):
+    if user_ids:
+        db_backend.insert_ignoring_duplicates(teams_m2m_users,
+                                              [{"team_id": team_id, "user_id": user_id} for user_id in user_ids])
+
+
 """
 A helper method to add user to a team.
 """
 def add_user_to_team(team_id, user_id):
     team_obj = does_team_exists(team_id)
     if isinstance(team_obj, Team):
-        user_obj = user_resource.does_user_exists(user_id)
-        if isinstance(user_obj, User):
-            team_obj.team_users.append(user_obj)
-            # Saving to DB
-            db.session.add(team_obj)    
-            db.session.commit()
+        candidates = lookup_team_candidates(team_id, [user_id])
+        if user_id in candidates:
+            if not candidates[user_id]:
+                insert_team_users(team_id, [user_id])
+                table_versions.bump("teams_users")
+                # Saving to DB
+                db.session.commit()
+                entity_cache.cache_for(Team).invalidate(team_id)
             message = f'UserId {user_id} added to the team.'
             return {"message": message}, 200
         else:
-            return {"message" : user_obj}, 404
+            return {"message" : f'UserId {user_id} does not exits.'}, 404
     else:
         return {"message" : team_obj}, 404
 
 """
 A method to add users to the team.
+All the users are looked up with one query,
+inserted with one multi-row INSERT & saved with one commit.
 
 request: A JSON string with the team details
         Eg. {
@@ -124,29 +163,33 @@ request: A JSON string with the team details
 def add_users_to_team(team_users_json):
     MAX_USERS = 10
     
-    try: 
-        team_id = int(team_users_json.get("id"))
-    except ValueError as ve:
-        return {"message": "TeamId should be numeric."}, 400
+    team_id = team_users_json.get("id")
 
     team_obj = does_team_exists(team_id)
     if isinstance(team_obj, Team):
-        existing_users_count = len(team_obj.team_users)
+        existing_users_count = count_team_users(team_id)
         users_id_list = team_users_json.get("users")
         if MAX_USERS >= existing_users_count+len(users_id_list):
             if users_id_list:
+                candidates = lookup_team_candidates(team_id, users_id_list)
                 added_users = []
                 failed_users = []
+                new_member_ids = []
                 for user_id in users_id_list:
-                    try:
-                        status = add_user_to_team(int(team_id), int(user_id))
-                    except ValueError as ve:
-                        pass
-                    if status[1] == 200:
+                    if user_id in candidates:
                         added_users.append(user_id)
+                        if not candidates[user_id] and user_id not in new_member_ids:
+                            new_member_ids.append(user_id)
                     else:
                         failed_users.append(user_id)
 
+                # Saving all the new members to DB at once
+                if new_member_ids:
+                    insert_team_users(team_id, new_member_ids)
+                    table_versions.bump("teams_users")
+                    db.session.commit()
+                    entity_cache.cache_for(Team).invalidate(team_id)
+
                 success_users_str = ""
                 if added_users:
                     success_users_str = ', '.join([str(x) for x in added_users])
@@ -176,6 +219,8 @@ def add_users_to_team(team_users_json):
 
 """
 A method to display all the teams.
+Supports keyset pagination through `after_id`/`cursor` & `limit`,
+the cursor of the next page is returned in the X-Next-Cursor header.
 
 :return: A JSON list with user details from DB
       Eg.
@@ -186,9 +231,14 @@ A method to display all the teams.
             },
           ]
 """
-def list_teams(_limit=None):
-  teams_obj_list = db.session.query(Team).order_by(Team.id).limit(_limit).all()
-  return serialize_objects_list(teams_obj_list)
+@table_versions.conditional("team")
+def list_teams(_limit=None, limit=None, after_id=None, cursor=None):
+  window = pagination.page_window(after_id, cursor, limit if limit is not None else _limit)
+  if isinstance(window, str):
+    return {"message": window}, 400
+
+  teams_obj_list, next_cursor = pagination.paginate(read_models.teams_query(), Team.id, *window)
+  return pagination.page_response(serialize_objects_list(teams_obj_list), next_cursor)
 
 
 """
@@ -205,11 +255,9 @@ A method to get details of a single team.
             "admin": <id of a user>
         }
 """
+@table_versions.conditional("team")
 def describe_team(team_id_json):
-    try: 
-        team_id = int(team_id_json.get("id"))
-    except ValueError as ve:
-        return {"message": "TeamId should be numeric."}, 400
+    team_id = team_id_json.get("id")
 
     team_obj = does_team_exists(team_id)
     if isinstance(team_obj, Team):
@@ -236,17 +284,11 @@ A method to update team details.
             * Description can be max 128 characters
 """
 def update_team(new_details_json):
-    try: 
-        team_id = int(new_details_json.get("id"))
-    except ValueError as ve:
-        return {"message": "TeamId should be numeric."}, 400
+    team_id = new_details_json.get("id")
     new_team_name = new_details_json.get("team").get("name")
     new_team_desc = new_details_json.get("team").get("description")
 
-    try: 
-        new_team_admin = int(new_details_json.get("team").get("admin"))
-    except ValueError as ve:
-        return {"message": "adminId should be numeric."}, 400
+    new_team_admin = new_details_json.get("team").get("admin")
     
     team_obj = does_team_exists(team_id)
     if isinstance(team_obj, Team):
@@ -257,7 +299,9 @@ def update_team(new_details_json):
             team_obj.team_admin = new_team_admin
             # Saving updated team details  
             db.session.add(team_obj)
+            table_versions.bump("team")
             db.session.commit()
+            entity_cache.cache_for(Team).invalidate(team_id)
 
             # Add the new admin as a team user
             add_user_to_team(team_id, new_team_admin)
@@ -272,6 +316,8 @@ def update_team(new_details_json):
 
 """
 A method to remove users to the team.
+All the users are looked up with one query,
+deleted with one DELETE & saved with one commit.
 
 request: A JSON string with the team details
         Eg. {
@@ -283,10 +329,7 @@ request: A JSON string with the team details
         * Cap the max users that can be added to 50
 """
 def remove_users_from_team(team_users_json):
-    try: 
-        team_id = int(team_users_json.get("id"))
-    except ValueError as ve:
-        return {"message": "TeamId should be numeric."}, 400
+    team_id = team_users_json.get("id")
     
     team_obj = does_team_exists(team_id)
     users_id_list = team_users_json.get("users")
@@ -294,29 +337,27 @@ def remove_users_from_team(team_users_json):
     invalid_users = []
     if isinstance(team_obj, Team):
         if users_id_list:
-            removed_users = []
-            invalid_users = []
+            candidates = lookup_team_candidates(team_id, users_id_list)
+            team_admin_id = team_obj.team_admin
+            removed_member_ids = set()
             for user_id in users_id_list:
-                try:
-                    user_obj = db.session.query(User).get(int(user_id))
-                except ValueError as ve:
-                    invalid_users.append(user_id)
-
-                if user_obj:
-                    team_admin_id = team_obj.team_admin
-                    if user_obj.id == team_admin_id:
+                if user_id in candidates:
+                    if user_id == team_admin_id:
+                        # Users listed before the admin are still removed
+                        delete_team_users(team_id, removed_member_ids)
                         message = f'User {team_admin_id} is an admin & cannot be removed. To remove, update admin first.'
                         return {"error" : message, "extra": "Other users, if valid may have been removed."}, 400
-                    team_user_ids = [x.id for x in team_obj.team_users]
-                    if user_obj.id in team_user_ids:
-                        team_obj.team_users.remove(user_obj)    # Deleteing the user from team
-                        db.session.commit()
+                    if candidates[user_id] and user_id not in removed_member_ids:
+                        removed_member_ids.add(user_id)
                         removed_users.append(user_id)
                     else:
                         invalid_users.append(user_id)           # For users not part of Team
                 else:
                     invalid_users.append(user_id)               # For users not existing
-            
+
+            # Deleteing all the users from team at once
+            delete_team_users(team_id, removed_member_ids)
+
             removed_users_str = ""
             if removed_users:
                 removed_users_str = ', '.join([str(x) for x in removed_users])
@@ -336,13 +377,27 @@ def remove_users_from_team(team_users_json):
     else:
         return {"message" : team_obj}, 404
 
+
+"""
+A helper method to delete the membership rows of a team in one DELETE & commit.
+"""
+def delete_team_users(team_id, user_ids):
+    if user_ids:
+        db.session.execute(teams_m2m_users.delete()
+                                          .where(teams_m2m_users.c.team_id == team_id)
+                                          .where(teams_m2m_users.c.user_id.in_(user_ids)))
+        table_versions.bump("teams_users")
+        db.session.commit()
+        entity_cache.cache_for(Team).invalidate(team_id)
+
    
 """
 A method to list all users of the team.
-request: A JSON string with the team details
+request: A JSON string with the team id,
+         optionally with the page window (after_id/cursor, limit)
         Eg. {
                 "id" : <team_id>,
-                "users" : ["user_id 1", "user_id2"]
+                "limit" : 10
             }
 :return:
         [
@@ -352,11 +407,14 @@ request: A JSON string with the team details
           }
         ]
 """
+@table_versions.conditional("user", "teams_users")
 def list_team_users(team_id_json):
-    try: 
-        team_id = int(team_id_json.get("id"))
-    except ValueError as ve:
-        return {"message": "TeamId should be numeric."}, 400
+    team_id = team_id_json.get("id")
     
-    users_obj_list = User.query.join(teams_m2m_users).filter_by(team_id=team_id).all()
-    return user_resource.serialize_objects_list(users_obj_list), 200
+    window = pagination.page_window(team_id_json.get("after_id"), team_id_json.get("cursor"),
+                                    team_id_json.get("limit"))
+    if isinstance(window, str):
+        return {"message": window}, 400
+
+    users_obj_list, next_cursor = queries.team_users_page(team_id, *window)
+    return pagination.page_response(user_resource.serialize_objects_list(users_obj_list), next_cursor)
@@ -2,10 +2,15 @@
 This is module supports all the REST actions for querying Users data/details.
 """
 
-from sqlalchemy import func
 from app_config import db
-from models import Team, User, teams_m2m_users
+from models import User
 from resources import team_resource
+import db_backend
+import entity_cache
+import pagination
+import queries
+import read_models
+import table_versions
 
 """
 A helper method to convert JSON To Python Objects & save to DB
@@ -17,8 +22,10 @@ def db_add(user_json, user_obj=None, user_id=None):
         user_obj.user_disp_name = user_json.get("user").get("display_name")
         user_obj.user_desc = user_json.get("user").get("description")
         db.session.add(user_obj)
+        table_versions.bump("user")
         db.session.commit()
-        return User.query.filter(User.id == user_id).one_or_none()  # Returns the updated user
+        entity_cache.cache_for(User).invalidate(user_id)
+        return queries.by_id(User, user_id)  # Returns the updated user
     # To add a new user
     else:
         
@@ -28,10 +35,12 @@ def db_add(user_json, user_obj=None, user_id=None):
                           user_desc=user_json.get("description"),
                         )
         
-        # Saving the new User to DB
+        # Saving the new User to DB, the flush assigns its primary key
         db.session.add(user_obj)
+        db.session.flush()
+        new_user_id = user_obj.id
+        table_versions.bump("user")
         db.session.commit()
-        new_user_id = db.session.query(func.max(User.id)).scalar()
         return new_user_id  # Returns the new user_id
 
 
@@ -46,6 +55,68 @@ def create_user(user_json):
   return { "id": db_add(user_json)}, 201
 
 
+"""
+A helper method to validate the details of a new user.
+:return: An error message if invalid, else None
+"""
+def validate_new_user(user_json):
+  user_name = user_json.get("name")
+  if not user_name or not user_json.get("display_name"):
+    return "User name & display name must be specified."
+  if len(user_name) > 64 or len(user_json.get("display_name")) > 64:
+    return "User name & display name can be max 64 characters."
+  if len(user_json.get("description") or "") > 128:
+    return "Description can be max 128 characters."
+  return None
+
+
+"""
+A method to take in a list of users' details
+and save them to the DB in a single transaction.
+All users are validated up front & inserted with one executemany INSERT.
+
+:request: A JSON list with the users' details
+      Eg. [{ "name" : "<user_name>",
+             "display_name" : "<display name>",
+             "description" : "<description>"
+          }]
+:return:  A JSON list with the result of each user, in the same order
+      Eg. [{ "id" : <user_id> }, { "error" : "<why it was not created>" }]
+"""
+def create_users(users_json):
+  user_names = {user_json.get("name") for user_json in users_json}
+  existing_names = {name for (name,) in db.session.query(User.user_name)
+                                                  .filter(User.user_name.in_(user_names))}
+
+  results = []
+  new_users = []
+  for user_json in users_json:
+    error_message = validate_new_user(user_json)
+    if error_message is None and user_json.get("name") in existing_names:
+      error_message = f'User name {user_json.get("name")} already exists.'
+    if error_message is None:
+      existing_names.add(user_json.get("name"))
+      new_users.append({"user_name": user_json.get("name"),
+                        "user_disp_name": user_json.get("display_name"),
+                        "user_desc": user_json.get("description")})
+      results.append({"name": user_json.get("name")})
+    else:
+      results.append({"error": error_message})
+
+  if not new_users:
+    return results, 400
+
+  # Saving all the new users to DB in one transaction
+  new_user_ids = db_backend.insert_returning_ids(User.__table__, new_users, "user_name")
+  table_versions.bump("user")
+  db.session.commit()
+
+  for result in results:
+    if "name" in result:
+      result["id"] = new_user_ids[result.pop("name")]
+  return results, 201
+
+
 """
 A method to serialize a objects' list into
 JSON compatible string, i.e Python dict{}
@@ -71,10 +142,11 @@ def serialize_object(user_obj):
 
 """
 A helper method to check if an user exists in DB or not.
+The lookup goes through the entity cache, see entity_cache.py
 :return: user_obj if exists, else an error message
 """
 def does_user_exists(user_id):
-  user_obj = User.query.filter(User.id == user_id).one_or_none()
+  user_obj = entity_cache.cache_for(User).get(user_id)
   if user_obj is None:
     error_message = f'UserId {user_id} does not exits.'
     return error_message
@@ -84,6 +156,8 @@ def does_user_exists(user_id):
 
 """
 A method to display all the user details.
+Supports keyset pagination through `after_id`/`cursor` & `limit`,
+the cursor of the next page is returned in the X-Next-Cursor header.
 
 :return: A JSON list with user details from DB
       Eg.
@@ -93,9 +167,14 @@ A method to display all the user details.
             },
           ]
 """
-def list_users(_limit=None):
-  users_obj_list = db.session.query(User).order_by(User.id).limit(_limit).all()
-  return serialize_objects_list(users_obj_list)
+@table_versions.conditional("user")
+def list_users(_limit=None, limit=None, after_id=None, cursor=None):
+  window = pagination.page_window(after_id, cursor, limit if limit is not None else _limit)
+  if isinstance(window, str):
+    return {"message": window}, 400
+
+  users_obj_list, next_cursor = pagination.paginate(read_models.users_query(), User.id, *window)
+  return pagination.page_response(serialize_objects_list(users_obj_list), next_cursor)
 
 
 """
@@ -111,11 +190,9 @@ A method to get details of a single user.
           }
 
 """
+@table_versions.conditional("user")
 def describe_user(user_id_json):
-  try: 
-        user_id = int(user_id_json.get("id"))
-  except ValueError as ve:
-    return {"message": "userId should be numeric."}, 400
+  user_id = user_id_json.get("id")
 
   user_obj = does_user_exists(user_id)
   if isinstance(user_obj, User):
@@ -141,10 +218,7 @@ A method to update user details.
             * display name can be max 128 characters
 """
 def update_user(new_details_json):
-  try: 
-      user_id = int(new_details_json.get("id"))
-  except ValueError as ve:
-    return {"message": "userId should be numeric."}, 400
+  user_id = new_details_json.get("id")
 
   user_obj = does_user_exists(new_details_json.get("id"))
   if isinstance(user_obj, User):
@@ -158,8 +232,9 @@ def update_user(new_details_json):
 A method to get all the teams,
 which the user is part of.
 
-:request: A JSON string with the desired user_id
-      Eg. { "id" : <user_id> }
+:request: A JSON string with the desired user_id,
+          optionally with the page window (after_id/cursor, limit)
+      Eg. { "id" : <user_id>, "limit" : 10 }
 
 :return: A JSON list of all the teams.
       Eg.
@@ -170,13 +245,16 @@ which the user is part of.
           ]
 
 """
+@table_versions.conditional("team", "teams_users")
 def get_user_teams(user_id_json):  
-  try: 
-        user_id = int(user_id_json.get("id"))
-  except ValueError as ve:
-    return {"message": "userId should be numeric."}, 400
+  user_id = user_id_json.get("id")
+
+  window = pagination.page_window(user_id_json.get("after_id"), user_id_json.get("cursor"),
+                                  user_id_json.get("limit"))
+  if isinstance(window, str):
+    return {"message": window}, 400
 
-  teams_obj_list = Team.query.join(teams_m2m_users).filter_by(user_id=user_id).all()
-  return team_resource.serialize_objects_list(teams_obj_list)
+  teams_obj_list, next_cursor = queries.user_teams_page(user_id, *window)
+  return pagination.page_response(team_resource.serialize_objects_list(teams_obj_list), next_cursor)
 
 
@@ -0,0 +1,204 @@
+"""
+Slow-query log, a usable alternative to SQLALCHEMY_ECHO in production.
+
+Two kinds of JSON Lines records go to the "planner.slow_queries" logger,
+written to SLOW_QUERY_LOG_FILE (stderr by default):
+
+    slow        - A statement taking more than SLOW_QUERY_THRESHOLD_MS, with its
+                  SQL, bound parameters, query plan (SQLite's EXPLAIN QUERY PLAN,
+                  PostgreSQL's EXPLAIN), the calling resource function & the
+                  request's operationId
+    repeated    - A statement shape sent SLOW_QUERY_REPEAT_THRESHOLD times or more
+                  within one request, the mark of an N+1 pattern (a query per item
+                  of a list), with its count, total time & the calling function.
+                  Only a SLOW_QUERY_SAMPLE_RATE fraction of the requests is checked
+
+With SLOW_QUERY_REDACT_PARAMS, the parameters are logged by type only, eg. "<str>",
+keeping the user data out of the log. A threshold set to None turns its check off.
+"""
+
+import json
+import logging
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import request_metrics
+
+logger = logging.getLogger("planner.slow_queries")
+
+PROJECT_DIR = Path(__file__).resolve().parent
+RESOURCES_DIR = PROJECT_DIR / "resources"
+
+# Eg. "IN (?, ?, ?)" or "VALUES (%(a)s, %(b)s), (%(c)s, %(d)s)", whose number of
+# placeholders changes with the number of items, not with the shape of the statement
+PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*,?)+\)(?:\s*,\s*\((?:\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*,?)+\))*')
+
+_settings = None
+
+
+"""
+A method to start logging the slow & repeated statements, as set in the config of the Flask `app`.
+"""
+def init_app(app):
+    global _settings
+    _settings = {"threshold": app.config["SLOW_QUERY_THRESHOLD_MS"],
+                 "repeat_threshold": app.config["SLOW_QUERY_REPEAT_THRESHOLD"],
+                 "sample_rate": app.config["SLOW_QUERY_SAMPLE_RATE"],
+                 "redact": app.config["SLOW_QUERY_REDACT_PARAMS"]}
+    if _settings["threshold"] is None and _settings["repeat_threshold"] is None:
+        return
+
+    if not logger.handlers:
+        log_file = app.config["SLOW_QUERY_LOG_FILE"]
+        handler = logging.FileHandler(log_file) if log_file else logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    if _settings["repeat_threshold"] is not None:
+        app.before_request(start_request)
+        app.teardown_request(log_repeated_statements)
+    if not event.contains(Engine, "after_cursor_execute", after_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+
+
+def start_request():
+    if random.random() < _settings["sample_rate"]:
+        g.slow_query_shapes = {}    # {shape: [count, seconds, caller, parameters]}
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["slow_query_started"] = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("slow_query_started", None)
+    if started is None:
+        return
+    # The statement ran already: a failure of its logging is reported, never raised to its caller
+    try:
+        observe_statement(conn, statement, parameters, executemany, time.perf_counter() - started)
+    except Exception:
+        logger.exception("Failed to log a statement.")
+
+
+def observe_statement(conn, statement, parameters, executemany, seconds):
+    threshold = _settings["threshold"]
+    if threshold is not None and seconds * 1000 > threshold:
+        log_statement("slow", statement, parameters, seconds, caller=calling_function(),
+                      plan=query_plan(conn, statement, parameters, executemany))
+
+    if has_request_context() and "slow_query_shapes" in g:
+        shape = statement_shape(statement)
+        seen = g.slow_query_shapes.get(shape)
+        if seen is None:
+            g.slow_query_shapes[shape] = seen = [0, 0.0, None, parameters]
+        seen[0] += 1
+        seen[1] += seconds
+        if seen[0] == _settings["repeat_threshold"]:
+            seen[2] = calling_function()
+
+
+def log_repeated_statements(exception=None):
+    shapes = g.pop("slow_query_shapes", None)
+    if not shapes:
+        return
+    try:
+        for shape, (count, seconds, caller, parameters) in shapes.items():
+            if count >= _settings["repeat_threshold"]:
+                log_statement("repeated", shape, parameters, seconds, caller=caller, count=count)
+    except Exception:
+        logger.exception("Failed to log the repeated statements.")
+
+
+"""
+A helper method to give the statement with its lists of placeholders collapsed & its
+whitespace normalized, the same for the statements sent for each item of a list.
+"""
+def statement_shape(statement):
+    return PLACEHOLDER_LIST.sub("(...)", " ".join(statement.split()))
+
+
+"""
+A helper method to give the function of the project calling into SQLAlchemy,
+preferring a resource function over the helper modules it calls.
+:return: Eg. "resources/team_resource.py:191 add_users_to_team", or None
+"""
+def calling_function():
+    frame = sys._getframe(1)
+    first = None
+    while frame is not None:
+        path = Path(frame.f_code.co_filename)
+        if PROJECT_DIR in path.parents and "site-packages" not in path.parts and path.name != "slow_query_log.py":
+            where = f'{path.relative_to(PROJECT_DIR)}:{frame.f_lineno} {frame.f_code.co_name}'
+            if RESOURCES_DIR in path.parents:
+                return where
+            first = first or where
+        frame = frame.f_back
+    return first
+
+
+"""
+A helper method to explain a statement on its connection, within the same transaction,
+through a separate DB-API cursor so the results of the statement are left to its caller.
+:return: A list of the plan's lines, or the error explaining it
+"""
+def query_plan(conn, statement, parameters, executemany):
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect == "postgresql":
+        prefix = "EXPLAIN "
+    else:
+        return None
+    if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+        return None
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    # A failed statement aborts a PostgreSQL transaction, unless rolled back to a savepoint
+    savepoint = dialect == "postgresql"
+    cursor = conn.connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute("SAVEPOINT slow_query_plan")
+        cursor.execute(prefix + statement, parameters)
+        plan = [str(row[-1]) for row in cursor.fetchall()]
+        if savepoint:
+            cursor.execute("RELEASE SAVEPOINT slow_query_plan")
+        return plan
+    except Exception as error:
+        if savepoint:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_plan")
+        return [f'EXPLAIN failed: {error}']
+    finally:
+        cursor.close()
+
+
+def redacted(parameters):
+    if isinstance(parameters, dict):
+        return {name: f'<{type(value).__name__}>' for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redacted(value) if isinstance(value, (list, tuple, dict)) else f'<{type(value).__name__}>'
+                for value in parameters]
+    return f'<{type(parameters).__name__}>'
+
+
+def log_statement(kind, statement, parameters, seconds, **details):
+    operation = None
+    if has_request_context():
+        view_function = request_metrics.current_view_function()
+        operation = view_function.__name__ if view_function is not None else request_metrics.UNMATCHED
+    record = {"kind": kind,
+              "ms": round(seconds * 1000, 3),
+              "operation": operation,
+              "statement": " ".join(statement.split()),
+              "parameters": redacted(parameters) if _settings["redact"] else parameters}
+    record.update(details)
+    logger.info(json.dumps(record, default=str))
@@ -0,0 +1,99 @@
+"""
+Disk cache of the parsed swagger spec, keyed by the hash of the spec file.
+
+Adding the API parses swagger.yaml, then validates it against the Swagger 2.0
+schema: most of the time a worker takes to start. Once validated, the parsed
+spec is saved as JSON under SPEC_CACHE_DIR, named after the SHA-256 of the
+spec file, eg. `swagger.3f2a...c1.json`. The next start reads it back & skips
+both the parsing & the validation. An edited swagger.yaml has another hash,
+so it is parsed & validated anew, & its cached spec replaces the old one.
+
+    spec = spec_cache.load_spec(connex_app, "swagger.yaml")
+    spec_cache.add_api(connex_app, spec, strict_validation=True)
+
+With SPEC_CACHE_DIR set to None, the spec is parsed & validated on every start.
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+import yaml
+from connexion.spec import Specification, Swagger2Specification
+
+
+"""
+A helper method to give the path of the cached spec of a spec file's content.
+"""
+def cache_path(cache_dir, file_name, content):
+    digest = hashlib.sha256(content).hexdigest()
+    return Path(cache_dir) / f'{Path(file_name).stem}.{digest}.json'
+
+
+"""
+A helper method to save a spec, replacing the file atomically so a worker
+starting meanwhile never reads a half written spec. The cached specs of the
+older versions of the spec file are removed.
+"""
+def save(path, spec):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f'{path.name}.{uuid.uuid4().hex}.tmp')
+    with open(temp_path, "w") as spec_file:
+        json.dump(spec, spec_file)
+    os.replace(temp_path, path)
+    stem = path.name.split(".", 1)[0]
+    for old_path in path.parent.glob(f'{stem}.*.json'):
+        if old_path != path:
+            old_path.unlink(missing_ok=True)
+
+
+"""
+A method to load a spec file of the connexion app, from the cache when its content was seen before.
+A spec parsed anew is validated, and then cached.
+
+:return: The spec as a dict, validated
+:raises: connexion.exceptions.InvalidSpecification if the spec is invalid
+"""
+def load_spec(connex_app, file_name):
+    cache_dir = connex_app.app.config["SPEC_CACHE_DIR"]
+    content = (Path(connex_app.specification_dir) / file_name).read_bytes()
+    path = cache_path(cache_dir, file_name, content) if cache_dir else None
+    if path is not None and path.is_file():
+        try:
+            with open(path) as spec_file:
+                return json.load(spec_file)
+        except ValueError:     # A cached spec cut short, eg. by a full disk, is parsed again
+            pass
+
+    # The keys of JSON objects are strings, as connexion makes them anyway, eg. the status codes
+    spec = json.loads(json.dumps(yaml.safe_load(content)))
+    Specification.from_dict(spec)      # Validates a copy of the spec, as connexion does
+
+    if path is not None:
+        save(path, spec)
+    return spec
+
+
+"""
+A helper context manager turning off connexion's validation of the specs,
+which it runs again whenever it builds a spec from a dict.
+"""
+@contextmanager
+def validation_skipped():
+    validate_spec = Swagger2Specification.__dict__["_validate_spec"]
+    Swagger2Specification._validate_spec = classmethod(lambda cls, spec: None)
+    try:
+        yield
+    finally:
+        Swagger2Specification._validate_spec = validate_spec
+
+
+"""
+A method to add the API of a spec given by load_spec(), which validated it already,
+with the options of connexion.App.add_api.
+"""
+def add_api(connex_app, spec, **options):
+    with validation_skipped():
+        return connex_app.add_api(spec, **options)
@@ -0,0 +1,92 @@
+"""
+Timing of the startup of the app, phase by phase, and of its first request.
+
+app.py imports this module first, then marks the end of each phase of the
+startup: the imports, the loading of the spec, the adding of the API... The
+first request is timed too, as it pays for what is still loaded lazily, eg.
+the export machinery. Two JSON Lines records go to the "planner.startup"
+logger, written to stderr:
+
+    startup         - The milliseconds of each phase, & their total
+    first_request   - The operationId & the milliseconds of the first request
+
+Under uWSGI, the app starts once in the master process, and each worker
+reports its own first request.
+"""
+
+import time
+
+# When the startup began: app.py imports this module before any other, so its imports are timed too
+STARTED = time.perf_counter()
+
+import json
+import logging
+import os
+import sys
+from flask import g
+import request_metrics
+
+logger = logging.getLogger("planner.startup")
+
+# [(phase, seconds)] in their order, see mark()
+_phases = []
+_last_mark = STARTED
+_first_request = None
+
+
+"""
+A method to end a phase of the startup, begun at the end of the previous one.
+"""
+def mark(phase):
+    global _last_mark
+    now = time.perf_counter()
+    _phases.append((phase, now - _last_mark))
+    _last_mark = now
+
+
+"""
+A method to give the timings recorded so far.
+:return: {"phases": {phase: milliseconds}, "total": milliseconds, "first_request": {...} or None}
+"""
+def report():
+    return {"phases": {phase: round(seconds * 1000, 1) for phase, seconds in _phases},
+            "total": round((_last_mark - STARTED) * 1000, 1),
+            "first_request": _first_request}
+
+
+def log(record):
+    logger.info(json.dumps(dict(record, pid=os.getpid())))
+
+
+"""
+A method to log the startup of the Flask `app`, once its last phase is marked,
+and to time its first request.
+"""
+def init_app(app):
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    startup = report()
+    log({"event": "startup", "phases": startup["phases"], "total": startup["total"]})
+    app.before_request(start_first_request)
+    app.after_request(record_first_request)
+
+
+def start_first_request():
+    if _first_request is None:
+        g.startup_first_request = time.perf_counter()
+
+
+def record_first_request(response):
+    global _first_request
+    started = g.pop("startup_first_request", None)
+    if started is not None and _first_request is None:
+        view_function = request_metrics.current_view_function()
+        _first_request = {"operation": view_function.__name__ if view_function is not None else request_metrics.UNMATCHED,
+                          "milliseconds": round((time.perf_counter() - started) * 1000, 1)}
+        log(dict(_first_request, event="first_request"))
+    return response
@@ -0,0 +1,157 @@
+"""
+Synthetic datasets of any size for load & benchmark runs, and their JSON Lines
+files. See `python3 db_initializer.py synthetic --help` to generate & load one.
+
+Every table is drawn from random generators seeded with the dataset's seed,
+those of the team members & the tasks also with the team's id. A dataset is then
+the same on every run, and each table streams on its own, without keeping the
+other tables in memory.
+
+The records have the fields of the API requests, plus their ids:
+    users       {"id", "name", "display_name", "description"}
+    teams       {"id", "name", "description", "admin"}
+    team_users  {"team_id", "user_id"}
+    boards      {"id", "name", "description", "team_id"}
+    tasks       {"id", "title", "description", "board_id", "user_id", "status"}
+"""
+import json
+import random
+from pathlib import Path
+from models import TASK_STATUSES
+
+# The tables of a dataset in load order, each in a <name>.jsonl file
+TABLE_NAMES = ("users", "teams", "team_users", "boards", "tasks")
+
+# The max members of a team, as capped by team_resource.add_users_to_team
+MAX_TEAM_SIZE = 10
+
+DEFAULT_STATUS_MIX = {"OPEN": 50, "IN_PROGRESS": 30, "COMPLETE": 20}
+
+JOB_TITLES = ["Account Executive", "Recruiter", "Software Engineer", "Product Manager", "Data Analyst",
+              "Designer", "Support Engineer", "Quality Engineer", "Technical Writer", "Sales Manager"]
+DEPARTMENTS = ["Research and Development", "Legal", "Marketing", "Sales", "Engineering",
+               "Support", "Finance", "Human Resources", "Operations", "Training"]
+TASK_KINDS = ["Design", "Build", "Review", "Test", "Document", "Deploy", "Estimate", "Plan"]
+
+
+class SyntheticDataset:
+    def __init__(self, users=1000, teams=100, team_size=MAX_TEAM_SIZE, boards_per_team=5,
+                 tasks_per_board=20, status_mix=None, seed=0):
+        if not 1 <= team_size <= min(users, MAX_TEAM_SIZE):
+            raise ValueError(f'team_size should be from 1 to {min(users, MAX_TEAM_SIZE)}.')
+        status_mix = status_mix or DEFAULT_STATUS_MIX
+        if set(status_mix) - set(TASK_STATUSES) or sum(status_mix.values()) <= 0:
+            raise ValueError(f'status_mix should weigh some of {", ".join(TASK_STATUSES)}.')
+
+        self.user_count = users
+        self.team_count = teams
+        self.team_size = team_size
+        self.boards_per_team = boards_per_team
+        self.tasks_per_board = tasks_per_board
+        self.statuses = list(status_mix)
+        self.status_weights = list(status_mix.values())
+        self.seed = seed
+
+    def rng(self, kind, record_id):
+        return random.Random(f'{self.seed}:{kind}:{record_id}')
+
+    """
+    The user ids of a team, its admin first.
+    """
+    def team_members(self, team_id):
+        return self.rng("team", team_id).sample(range(1, self.user_count + 1), self.team_size)
+
+    def users(self):
+        rng = self.rng("users", 0)
+        for user_id in range(1, self.user_count + 1):
+            yield {"id": user_id,
+                   "name": f'user_{user_id:09d}',
+                   "display_name": f'User {user_id}',
+                   "description": rng.choice(JOB_TITLES)}
+
+    def teams(self):
+        rng = self.rng("teams", 0)
+        for team_id in range(1, self.team_count + 1):
+            yield {"id": team_id,
+                   "name": f'team_{team_id:09d}',
+                   "description": rng.choice(DEPARTMENTS),
+                   "admin": self.team_members(team_id)[0]}
+
+    def team_users(self):
+        for team_id in range(1, self.team_count + 1):
+            for user_id in sorted(self.team_members(team_id)):
+                yield {"team_id": team_id, "user_id": user_id}
+
+    def boards(self):
+        for team_id in range(1, self.team_count + 1):
+            for index in range(self.boards_per_team):
+                board_id = (team_id - 1) * self.boards_per_team + index + 1
+                yield {"id": board_id,
+                       "name": f'board_{board_id:09d}',
+                       "description": f'Board {index + 1} of team {team_id}',
+                       "team_id": team_id}
+
+    """
+    The tasks of each board, given to the members of the board's team,
+    with statuses drawn from the status mix.
+    """
+    def tasks(self):
+        task_id = 0
+        for team_id in range(1, self.team_count + 1):
+            members = self.team_members(team_id)
+            rng = self.rng("tasks", team_id)
+            for index in range(self.boards_per_team):
+                board_id = (team_id - 1) * self.boards_per_team + index + 1
+                statuses = rng.choices(self.statuses, weights=self.status_weights, k=self.tasks_per_board)
+                user_ids = rng.choices(members, k=self.tasks_per_board)
+                for status, user_id in zip(statuses, user_ids):
+                    task_id += 1
+                    yield {"id": task_id,
+                           "title": f'task_{task_id:09d}',
+                           "description": f'{TASK_KINDS[task_id % len(TASK_KINDS)]} #{task_id}',
+                           "board_id": board_id,
+                           "user_id": user_id,
+                           "status": status}
+
+    """
+    :return: A list of (table name, iterator of its records), in load order
+    """
+    def tables(self):
+        return [(name, getattr(self, name)()) for name in TABLE_NAMES]
+
+
+"""
+A method to write a dataset's tables to <out_dir>/<table name>.jsonl files.
+:tables: A list of (table name, iterator of its records), eg. SyntheticDataset.tables()
+:return: A dict {table name: records written}
+"""
+def write_jsonl(tables, out_dir):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    counts = {}
+    for name, records in tables:
+        count = 0
+        with open(out_dir / f'{name}.jsonl', "w") as jsonl_file:
+            for record in records:
+                jsonl_file.write(json.dumps(record) + "\n")
+                count += 1
+        counts[name] = count
+    return counts
+
+
+def iter_jsonl(path):
+    with open(path) as jsonl_file:
+        for line in jsonl_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+"""
+A method to stream the tables of a dataset from <in_dir>/<table name>.jsonl files,
+a missing file being an empty table.
+:return: A list of (table name, iterator of its records), in load order
+"""
+def read_jsonl(in_dir):
+    in_dir = Path(in_dir)
+    return [(name, iter_jsonl(in_dir / f'{name}.jsonl')) for name in TABLE_NAMES
+            if (in_dir / f'{name}.jsonl').exists()]
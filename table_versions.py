@@ -0,0 +1,124 @@
+"""
+Per-table version counters & the conditional GET (ETag / If-None-Match)
+support built on them.
+
+Every write path bumps the versions of the tables it writes, in the same
+transaction as the write. A read endpoint derives its ETag from the
+versions of the tables it reads & from its own parameters, so a client
+polling an unchanged listing gets a 304 Not Modified, answered after a
+single read of the version table, before any query of the listing itself.
+
+Known cost: a table's counter is a single row, so on PostgreSQL the writers
+of a table queue on its row lock, from their bump until their commit. Every
+write path thus bumps last, right before its commit, holding the lock for the
+commit alone. The bump is kept in the transaction of the write nonetheless: a
+bump committed after it, or a sequence (whose nextval is seen before the write
+commits), would let a reader pair a version with the rows of another one,
+& answer 304s or cache entries that are stale until the next write. On SQLite,
+whose write lock serializes the writers anyway, the row costs nothing more.
+
+Tables: user, team, teams_users, board, task
+"""
+
+import functools
+import hashlib
+import json
+import random
+from flask import g, request
+from werkzeug.http import quote_etag
+from app_config import db
+from models import TableVersion
+import queries
+
+TABLES = ("user", "team", "teams_users", "board", "task")
+
+
+"""
+A method to create the missing counters. Each one starts from a random number,
+so the ETags of a recreated DB do not repeat the ones handed out before.
+Note: The caller is responsible for the commit.
+"""
+def ensure_rows(tables=TABLES):
+    existing = {name for (name,) in db.session.query(TableVersion.table_name)
+                                              .filter(TableVersion.table_name.in_(tables))}
+    missing = [name for name in tables if name not in existing]
+    if missing:
+        db.session.execute(TableVersion.__table__.insert(),
+                           [{"table_name": name, "version": random.randrange(2 ** 31)} for name in missing])
+
+
+"""
+A method to bump the versions of the tables written, with one UPDATE.
+Note: Call it within the transaction of the write, as its last statement
+right before the caller commits: the rows stay locked until the commit.
+"""
+def bump(*tables):
+    version_table = TableVersion.__table__
+    result = db.session.execute(version_table.update()
+                                             .where(version_table.c.table_name.in_(tables))
+                                             .values(version=version_table.c.version + 1))
+    if result.rowcount < len(set(tables)):
+        ensure_rows(tables)
+
+
+"""
+A method to read the versions of some tables with one SELECT.
+:return: A dict {table_name: version}
+"""
+def current(*tables):
+    versions = dict(queries.table_version_rows(tables))
+    return {name: versions.get(name, 0) for name in tables}
+
+
+"""
+A helper method to derive the ETag of a response
+from the operation, its parameters & the versions of the tables read.
+"""
+def make_etag(operation, args, kwargs, versions):
+    key = json.dumps([operation, args, kwargs, versions], sort_keys=True, default=str)
+    return hashlib.sha1(key.encode()).hexdigest()[:32]
+
+
+"""
+A helper method to add a header to a resource function's response,
+which may be a body alone or a (body, status[, headers]) tuple.
+"""
+def with_header(response, name, value):
+    if not isinstance(response, tuple):
+        response = (response, 200)
+    body, status = response[0], response[1]
+    headers = dict(response[2]) if len(response) > 2 else {}
+    headers[name] = value
+    return body, status, headers
+
+
+"""
+A decorator for the read endpoints, making them conditional on the versions of `tables`.
+* A GET or HEAD request whose If-None-Match matches the current ETag gets a 304, the
+  endpoint is not run. The POST reads (eg. describe_user) always run: a 304 answers a GET only.
+* Else the endpoint's 200 response carries the ETag.
+
+The versions are read before the endpoint runs, so a write racing the read
+can only leave an older ETag on a newer body, which the next request refreshes.
+They are kept in `g.table_versions` for the entity cache, which then only
+serves entries cached at those versions, see entity_cache.py.
+"""
+def conditional(*tables):
+    def decorator(function):
+        operation = f'{function.__module__}.{function.__name__}'
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            versions = current(*tables)
+            g.table_versions = versions
+            etag = make_etag(operation, args, kwargs, versions)
+            if request and request.method in ("GET", "HEAD") and request.if_none_match.contains_weak(etag):
+                return None, 304, {"ETag": quote_etag(etag)}
+
+            response = function(*args, **kwargs)
+            status = response[1] if isinstance(response, tuple) else 200
+            if status == 200:
+                response = with_header(response, "ETag", quote_etag(etag))
+            return response
+        return wrapper
+    return decorator
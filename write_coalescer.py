@@ -0,0 +1,151 @@
+"""
+Group commit of small, frequent writes, eg. the task status updates.
+
+SQLite commits one transaction at a time, through its single write lock, and
+each commit costs a journal write (& an fsync, depending on the pragmas). A
+burst of single-row updates is thus bound by the commits, not by the updates.
+A WriteCoalescer applies the writes arriving together in one transaction:
+
+    leader      The first writer with no batch in progress leads the next
+                one: it waits up to the window (in ms) for more writes, or
+                until the max batch size is queued, then applies the queued
+                writes in its own session & commits them all at once
+    followers   The writers arriving meanwhile are queued, & wait for the
+                commit of their batch. Those beyond the max batch size, or
+                arriving during a commit, make the next batch: its first
+                writer leads it once the commit in progress is done
+
+Each writer gets its own result, once the commit of its batch returned. A
+failed batch is rolled back, & its error raised to each of its writers.
+
+The batches are per process: a worker coalesces the writes of its own threads,
+or of its requests in flight in the async serving mode (see async_serving.py),
+where the waits hand the event loop back to the other requests.
+"""
+
+import asyncio
+import threading
+from sqlalchemy.util import await_only
+from app_config import app, db
+import async_serving
+
+
+"""
+A helper method to make an event to wait on: of asyncio on the event loop of the async mode, else of threading.
+"""
+def new_event():
+    return asyncio.Event() if async_serving.in_event_loop() else threading.Event()
+
+
+"""
+A helper method to wait on an event, up to `timeout` seconds if given.
+:return: False on a timeout
+"""
+def wait(event, timeout=None):
+    if isinstance(event, threading.Event):
+        return event.wait(timeout)
+    try:
+        await_only(asyncio.wait_for(event.wait(), timeout))
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+"""
+A write queued for the next batch: its result, or error, is set once the batch is committed.
+"""
+class QueuedWrite:
+    def __init__(self, item):
+        self.item = item
+        self.done = new_event()
+        self.leads = False
+        self.result = None
+        self.error = None
+
+
+"""
+A coalescer of the writes applied by `apply_batch`, with the window & the max
+batch size given by the config keys `window_key` & `max_batch_key`.
+`apply_batch(items)` applies the items in the current session, commits them
+& returns the result of each, in the same order.
+"""
+class WriteCoalescer:
+    def __init__(self, apply_batch, window_key, max_batch_key):
+        self.apply_batch = apply_batch
+        self.window_key = window_key
+        self.max_batch_key = max_batch_key
+        self.lock = threading.Lock()
+        self.queue = []
+        self.leading = False
+        self.batch_full = None
+        self.batches = 0
+        self.writes = 0
+
+    """
+    Whether the writes are coalesced: a window is set, 0 batching only the writes queued during a commit.
+    """
+    def enabled(self):
+        return app.config[self.window_key] is not None
+
+    """
+    A method to apply a write in the next batch, waiting until it is committed.
+    :return: The result of the write, given by apply_batch
+    :raises: The error of the batch, rolled back
+    """
+    def submit(self, item):
+        write = QueuedWrite(item)
+        with self.lock:
+            self.queue.append(write)
+            if not self.leading:
+                self.leading = write.leads = True
+            elif self.batch_full is not None and len(self.queue) >= app.config[self.max_batch_key]:
+                self.batch_full.set()
+        if not write.leads:
+            wait(write.done)
+        # Either led from the start, or handed over by the leader of the previous batch
+        if write.leads:
+            self.lead()
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    """
+    A helper method to collect, apply & commit the next batch, then hand the lead over to the writes left queued.
+    """
+    def lead(self):
+        window = app.config[self.window_key] / 1000
+        max_batch = app.config[self.max_batch_key]
+        batch_full = None
+        with self.lock:
+            if window and len(self.queue) < max_batch:
+                batch_full = self.batch_full = new_event()
+        if batch_full is not None:
+            wait(batch_full, window)
+
+        with self.lock:
+            self.batch_full = None
+            batch, self.queue = self.queue[:max_batch], self.queue[max_batch:]
+        # The lead is handed over & the writers woken up whatever fails, else they would wait forever
+        try:
+            results = self.apply_batch([write.item for write in batch])
+            for write, result in zip(batch, results):
+                write.result = result
+        except Exception as e:
+            for write in batch:
+                write.error = e
+            db.session.rollback()
+        finally:
+            with self.lock:
+                self.batches += 1
+                self.writes += len(batch)
+                if self.queue:
+                    self.queue[0].leads = True
+                    self.queue[0].done.set()
+                else:
+                    self.leading = False
+            for write in batch:
+                write.done.set()
+
+    def stats(self):
+        with self.lock:
+            return {"batches": self.batches, "writes": self.writes}